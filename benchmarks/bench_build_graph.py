@@ -0,0 +1,99 @@
+# benchmarks/bench_build_graph.py
+"""
+Time the vectorized build_graph against the original iterrows version on
+a synthetic MeSH-like ontology, checking both produce the same edge set.
+Sampled sibling mode has no legacy equivalent; it reports edge count,
+edge_index size and peak RSS next to the full mode instead.
+
+    python -m benchmarks.bench_build_graph --concepts 100000
+    python -m benchmarks.bench_build_graph --concepts 20000 --siblings full
+    python -m benchmarks.bench_build_graph --concepts 100000 --siblings sampled --no-legacy
+"""
+import argparse
+import ast
+import os
+import resource
+import tempfile
+import time
+from collections import defaultdict
+
+import pandas as pd
+import torch
+
+from benchmarks.synthetic import make_ontology_csv
+from data.graph.build_graph import build_graph
+
+
+def legacy_edges(vocab_path: str, add_sibling_edges: bool) -> set:
+    """Edge construction as build_graph originally did it (node labels/colors omitted)."""
+    df = pd.read_csv(vocab_path)
+    df["parents"] = df["parents"].apply(ast.literal_eval)
+    df["descendants"] = df["descendants"].apply(ast.literal_eval)
+    cui_to_idx = {cui: idx for idx, cui in enumerate(df["cui"])}
+
+    edges = []
+    for idx, row in df.iterrows():
+        for parent in row["parents"]:
+            parent_cui = parent.split(", ")[-1].strip("}")
+            if parent_cui in cui_to_idx:
+                edges.append((cui_to_idx[parent_cui], idx))
+        for desc in row["descendants"]:
+            desc_cui = desc.split(", ")[-1].strip("}")
+            if desc_cui in cui_to_idx:
+                edges.append((idx, cui_to_idx[desc_cui]))
+
+    if add_sibling_edges:
+        parent_to_children = defaultdict(list)
+        for idx, row in df.iterrows():
+            for parent in row["parents"]:
+                parent_cui = parent.split(", ")[-1].strip("}")
+                if parent_cui in cui_to_idx:
+                    parent_to_children[parent_cui].append(idx)
+        for siblings in parent_to_children.values():
+            for i in range(len(siblings)):
+                for j in range(i + 1, len(siblings)):
+                    edges.append((siblings[i], siblings[j]))
+                    edges.append((siblings[j], siblings[i]))
+
+    edge_index = torch.tensor(edges, dtype=torch.long).t().contiguous()
+    return set(map(tuple, edge_index.t().tolist())), edge_index.size(1)
+
+
+def run(concepts: int = 100_000, siblings: str = "none", legacy: bool = True, workdir: str = None) -> dict:
+    workdir = workdir or tempfile.mkdtemp(prefix="vizmed-bench-")
+    vocab_path = make_ontology_csv(os.path.join(workdir, "ontology.csv"), concepts=concepts)
+    graph_path = os.path.join(workdir, "graph.pt")
+    mode = False if siblings == "none" else siblings
+
+    start = time.perf_counter()
+    graph = build_graph(vocab_path, add_sibling_edges=mode, include_ancestors=False, output_path=graph_path,
+                        features_dir=None)
+    t_new = time.perf_counter() - start
+    edges = graph.edge_index.size(1)
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    result = {"concepts": concepts, "siblings": siblings, "vectorized_s": t_new, "edges": edges,
+              "edge_index_mb": graph.edge_index.numel() * 8 / 2**20, "peak_rss_mb": peak_mb}
+    print(
+        f"concepts={concepts} siblings={siblings}: vectorized {t_new:.2f}s, {edges} unique edges "
+        f"({result['edge_index_mb']:.1f} MiB edge_index), peak RSS {peak_mb:.0f} MiB"
+    )
+
+    if legacy and siblings != "sampled":
+        start = time.perf_counter()
+        old_edges, old_count = legacy_edges(vocab_path, siblings == "full")
+        t_old = time.perf_counter() - start
+
+        new_edges = set(map(tuple, graph.edge_index.t().tolist()))
+        assert new_edges == old_edges, "edge sets differ"
+        print(f"  iterrows {t_old:.2f}s ({old_count} edges incl. duplicates), {t_old / t_new:.1f}x, parity ok")
+        result.update({"iterrows_s": t_old, "speedup": t_old / t_new})
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concepts", type=int, default=100_000)
+    parser.add_argument("--siblings", choices=["none", "full", "sampled"], default="none")
+    parser.add_argument("--no-legacy", dest="legacy", action="store_false", help="skip the iterrows parity run")
+    args = parser.parse_args()
+    run(args.concepts, args.siblings, args.legacy)
@@ -0,0 +1,76 @@
+# benchmarks/bench_gnn.py
+"""
+CPU forward latency of OntologyGNN on a synthetic ontology graph:
+  per-call   GCNConv renormalizes edge_index in every layer (original path)
+  cached     normalized CSR adjacency built once and shared by all layers
+  propagated first layer's A·x precomputed once for inference (SGC-style)
+Outputs of all three paths are checked against each other.
+
+    python -m benchmarks.bench_gnn --concepts 100000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import torch
+
+from benchmarks.synthetic import make_ontology_csv
+from data.graph.build_graph import build_graph
+from models.gnn.ontology_gnn import OntologyGNN
+
+
+def _best(fn, repeat: int):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run(concepts: int = 100_000, in_dim: int = 768, repeat: int = 5, threads: int = None, workdir: str = None) -> dict:
+    if threads:
+        torch.set_num_threads(threads)
+    workdir = workdir or tempfile.mkdtemp(prefix="vizmed-bench-")
+    vocab_path = make_ontology_csv(os.path.join(workdir, "ontology.csv"), concepts=concepts)
+    graph = build_graph(vocab_path, add_sibling_edges="sampled", include_ancestors=False,
+                        output_path=os.path.join(workdir, "graph"), features_dir=None)
+    edge_index = graph.edge_index.contiguous()
+    x = torch.randn(graph.num_nodes, in_dim)
+
+    torch.manual_seed(0)
+    baseline = OntologyGNN(in_dim=in_dim).eval()
+    cached = OntologyGNN(in_dim=in_dim, cached_adjacency=True).eval()
+    cached.load_state_dict(baseline.state_dict())
+
+    with torch.inference_mode():
+        t_base, out_base = _best(lambda: baseline(x, edge_index), repeat)
+        t_build, _ = _best(lambda: cached.precompute(x, edge_index), 1)  # builds the adjacency once
+        t_cached, out_cached = _best(lambda: cached(x, edge_index), repeat)
+        t_pre, ax = _best(lambda: cached.precompute(x, edge_index), 1)
+        t_prop, out_prop = _best(lambda: cached(ax, edge_index, propagated=True), repeat)
+
+    for out in (out_cached, out_prop):
+        assert torch.allclose(out, out_base, atol=1e-4, rtol=1e-4), "outputs differ"
+
+    print(
+        f"nodes={graph.num_nodes} edges={edge_index.size(1)} in_dim={in_dim} threads={torch.get_num_threads()}\n"
+        f"  per-call normalization {t_base * 1000:.0f} ms/forward\n"
+        f"  cached adjacency       {t_cached * 1000:.0f} ms/forward ({t_base / t_cached:.1f}x; "
+        f"one-time build + A·x {t_build * 1000:.0f} ms)\n"
+        f"  precomputed A·x        {t_prop * 1000:.0f} ms/forward ({t_base / t_prop:.1f}x; "
+        f"one-time A·x {t_pre * 1000:.0f} ms), parity ok"
+    )
+    return {"nodes": graph.num_nodes, "edges": edge_index.size(1), "per_call_s": t_base,
+            "cached_s": t_cached, "propagated_s": t_prop, "precompute_s": t_pre}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concepts", type=int, default=100_000)
+    parser.add_argument("--in-dim", type=int, default=768)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--threads", type=int, default=None)
+    args = parser.parse_args()
+    run(args.concepts, args.in_dim, args.repeat, args.threads)
@@ -0,0 +1,111 @@
+# benchmarks/bench_gnn_sampling.py
+"""
+Peak memory and throughput of OntologyGNN training and inference paths on a
+synthetic ontology graph with sampled sibling edges:
+  full-train       one full-batch forward + backward step
+  sampled-train    one epoch of CSR neighbor-sampled mini-batches
+  full-infer       full-graph forward without grad (per-edge messages)
+  layerwise-infer  OntologyGNN.inference over the sparse adjacency
+Each mode runs in a fresh process; max RSS is reported next to the RSS
+after loading the graph and features, so the difference is the mode's own.
+
+    python -m benchmarks.bench_gnn_sampling --concepts 100000
+"""
+import argparse
+import multiprocessing as mp
+import os
+import resource
+import tempfile
+import time
+
+MODES = ("full-train", "sampled-train", "full-infer", "layerwise-infer")
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _child(mode: str, graph_dir: str, in_dim: int, fanout, batch_size: int, num_workers: int, queue):
+    import torch
+    import torch.nn.functional as F
+    from data.graph.graph_store import load_graph
+    from models.gnn.ontology_gnn import OntologyGNN
+    from models.gnn.sampling import CSRNeighborLoader, train_sampled
+
+    torch.manual_seed(0)
+    graph = load_graph(graph_dir, mmap=False)
+    graph.x = torch.randn(graph.num_nodes, in_dim)
+    graph.y = graph.node_colors
+    num_classes = int(graph.y.max()) + 1
+    model = OntologyGNN(in_dim=in_dim, out_dim=num_classes)
+    optimizer = torch.optim.Adam(model.parameters(), lr=1e-3)
+    base = _rss_mb()
+
+    start = time.perf_counter()
+    if mode == "full-train":
+        optimizer.zero_grad()
+        loss = F.cross_entropy(model(graph.x, graph.edge_index), graph.y)
+        loss.backward()
+        optimizer.step()
+    elif mode == "sampled-train":
+        loader = CSRNeighborLoader(graph, fanout, batch_size=batch_size, shuffle=True, num_workers=num_workers)
+        train_sampled(model, loader, optimizer, lambda out, batch: F.cross_entropy(out, batch.y[:batch.batch_size]))
+    elif mode == "full-infer":
+        with torch.no_grad():
+            model(graph.x, graph.edge_index)
+    elif mode == "layerwise-infer":
+        model.inference(graph.x, graph.edge_index)
+    seconds = time.perf_counter() - start
+
+    queue.put({"seconds": seconds, "nodes_per_s": graph.num_nodes / seconds,
+               "base_rss_mb": base, "max_rss_mb": _peak_rss_mb()})
+
+
+def measure(mode: str, *args) -> dict:
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_child, args=(mode, *args, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def run(concepts: int = 100_000, in_dim: int = 768, fanout=(10, 10), batch_size: int = 1024,
+        num_workers: int = 0, workdir: str = None) -> dict:
+    from benchmarks.synthetic import make_ontology_csv
+    from data.graph.build_graph import build_graph
+
+    workdir = workdir or tempfile.mkdtemp(prefix="vizmed-bench-")
+    vocab_path = make_ontology_csv(os.path.join(workdir, "ontology.csv"), concepts=concepts)
+    graph_dir = os.path.join(workdir, "graph")
+    graph = build_graph(vocab_path, add_sibling_edges="sampled", include_ancestors=False, output_path=graph_dir,
+                        features_dir=None)
+    print(f"nodes={graph.num_nodes} edges={graph.edge_index.size(1)} in_dim={in_dim} fanout={list(fanout)}")
+
+    results = {}
+    for mode in MODES:
+        r = measure(mode, graph_dir, in_dim, list(fanout), batch_size, num_workers)
+        results[mode] = r
+        print(
+            f"  {mode:16s} {r['seconds']:7.2f}s  {r['nodes_per_s']:>10,.0f} nodes/s  "
+            f"max RSS {r['max_rss_mb']:7.0f} MiB (+{r['max_rss_mb'] - r['base_rss_mb']:.0f} over loaded graph)"
+        )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concepts", type=int, default=100_000)
+    parser.add_argument("--in-dim", type=int, default=768)
+    parser.add_argument("--fanout", type=int, nargs="+", default=[10, 10])
+    parser.add_argument("--batch-size", type=int, default=1024)
+    parser.add_argument("--workers", type=int, default=0)
+    args = parser.parse_args()
+    run(args.concepts, args.in_dim, args.fanout, args.batch_size, args.workers)
@@ -0,0 +1,81 @@
+# benchmarks/bench_graph_io.py
+"""
+Compare the graph directory format (data/graph/graph_store) with pickling
+the Data object via torch.save, on a synthetic ontology graph: size on
+disk and load time, checking both round-trip to the same graph.
+
+    python -m benchmarks.bench_graph_io --concepts 100000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import torch
+
+from benchmarks.synthetic import make_ontology_csv
+from data.graph.build_graph import build_graph
+from data.graph.graph_store import load_graph
+
+
+def _size_mb(path: str) -> float:
+    if os.path.isfile(path):
+        return os.path.getsize(path) / 2**20
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)) / 2**20
+
+
+def _best(fn, repeat: int):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def assert_same(a, b):
+    assert torch.equal(a.edge_index, b.edge_index), "edge_index differs"
+    assert torch.equal(a.edge_type, b.edge_type), "edge_type differs"
+    assert torch.equal(a.node_colors, b.node_colors), "node_colors differ"
+    assert torch.equal(a.row_hashes, b.row_hashes), "row_hashes differ"
+    assert list(a.node_labels) == list(b.node_labels), "node_labels differ"
+    assert list(a.cuis) == list(b.cuis), "cuis differ"
+    assert a.build_info == b.build_info, "build_info differs"
+
+
+def run(concepts: int = 100_000, repeat: int = 3, workdir: str = None) -> dict:
+    workdir = workdir or tempfile.mkdtemp(prefix="vizmed-bench-")
+    vocab_path = make_ontology_csv(os.path.join(workdir, "ontology.csv"), concepts=concepts)
+    graph_dir = os.path.join(workdir, "graph")
+    pickle_path = os.path.join(workdir, "graph.pt")
+
+    graph = build_graph(vocab_path, add_sibling_edges="sampled", include_ancestors=False, output_path=graph_dir,
+                        features_dir=None)
+    torch.save(graph, pickle_path)
+
+    t_pickle, from_pickle = _best(lambda: torch.load(pickle_path, weights_only=False), repeat)
+    t_mmap, from_mmap = _best(lambda: load_graph(graph_dir), repeat)
+    t_eager, from_eager = _best(lambda: load_graph(graph_dir, mmap=False), repeat)
+    for loaded in (from_pickle, from_mmap, from_eager):
+        assert_same(graph, loaded)
+
+    result = {
+        "concepts": concepts, "edges": graph.edge_index.size(1),
+        "pickle_mb": _size_mb(pickle_path), "store_mb": _size_mb(graph_dir),
+        "torch_load_s": t_pickle, "load_graph_mmap_s": t_mmap, "load_graph_eager_s": t_eager,
+    }
+    print(
+        f"concepts={concepts} edges={result['edges']}: torch.save {result['pickle_mb']:.1f} MiB, "
+        f"graph store {result['store_mb']:.1f} MiB\n"
+        f"  torch.load {t_pickle:.3f}s, load_graph mmap {t_mmap:.3f}s ({t_pickle / t_mmap:.1f}x), "
+        f"eager {t_eager:.3f}s ({t_pickle / t_eager:.1f}x), parity ok"
+    )
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concepts", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.concepts, args.repeat)
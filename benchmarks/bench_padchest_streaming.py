@@ -0,0 +1,76 @@
+# benchmarks/bench_padchest_streaming.py
+"""
+Peak memory of full vs. chunked PadChest ingestion on synthetic CSVs.
+Each mode runs in a fresh process and reports the peak of traced Python
+and NumPy allocations plus the process's max RSS, so growth with input
+size is directly visible.
+
+    python -m benchmarks.bench_padchest_streaming --rows 50000 200000
+"""
+import argparse
+import multiprocessing as mp
+import os
+import resource
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.synthetic import make_padchest_csv
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _child(mode: str, csv_path: str, chunksize: int, out_path: str, queue):
+    import pandas as pd
+    from preprocess.padchest_parser import iter_padchest, load_padchest
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    rows = 0
+    if mode == "full":
+        df = pd.read_csv(csv_path, low_memory=False)  # what the parser used to do
+        rows = len(load_padchest(csv_path, image_dir="img"))
+        del df
+    elif mode == "usecols":
+        rows = len(load_padchest(csv_path, image_dir="img"))
+    elif mode == "stream":
+        for i, chunk in enumerate(iter_padchest(csv_path, image_dir="img", chunksize=chunksize)):
+            chunk.to_csv(out_path, mode="w" if i == 0 else "a", header=i == 0)
+            rows += len(chunk)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    queue.put({"rows": rows, "seconds": seconds, "peak_mb": peak / 2**20, "max_rss_mb": _peak_rss_mb()})
+
+
+def measure(mode: str, csv_path: str, chunksize: int, out_path: str) -> dict:
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_child, args=(mode, csv_path, chunksize, out_path, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def run(sizes=(50_000, 200_000), chunksize: int = 20_000, workdir: str = None) -> dict:
+    workdir = workdir or tempfile.mkdtemp(prefix="vizmed-bench-")
+    results = {}
+    for rows in sizes:
+        csv_path = make_padchest_csv(os.path.join(workdir, f"padchest_{rows}.csv"), rows=rows)
+        size_mb = os.path.getsize(csv_path) / 2**20
+        for mode in ("full", "usecols", "stream"):
+            r = measure(mode, csv_path, chunksize, os.path.join(workdir, "out.csv"))
+            results[f"{mode}/{rows}"] = {**r, "csv_mb": size_mb}
+            print(f"{mode:8s} rows={rows:>8d} csv={size_mb:7.1f} MiB  traced peak {r['peak_mb']:7.1f} MiB  max RSS {r['max_rss_mb']:7.1f} MiB  {r['seconds']:6.2f}s")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[50_000, 200_000])
+    parser.add_argument("--chunksize", type=int, default=20_000)
+    args = parser.parse_args()
+    run(args.rows, args.chunksize)
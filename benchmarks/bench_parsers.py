@@ -0,0 +1,127 @@
+# benchmarks/bench_parsers.py
+"""
+Compare the column-wise CheXpert/PadChest parsers against the original
+row-wise implementations on synthetic CSVs, checking that both produce
+the same output.
+
+    python -m benchmarks.bench_parsers --rows 200000
+"""
+import argparse
+import ast
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from benchmarks.synthetic import make_chexpert_csv, make_padchest_csv
+from preprocess.chexpert_parser import load_chexpert
+from preprocess.padchest_parser import load_padchest
+from preprocess.utils.cui_mappings import CHEXPERT_CUI_MAP
+
+
+# === Original row-wise implementations (reference for parity)
+def legacy_chexpert(file_path: str, root: str) -> pd.DataFrame:
+    df = pd.read_csv(file_path, quoting=3, escapechar="\\")
+    df = df[df["Report"].notna() & df["Report"].str.strip().ne("")]
+
+    def extract_cuis(row):
+        cuis = []
+        for label, cui in CHEXPERT_CUI_MAP.items():
+            value = row.get(label, 0)
+            if value in [1, -1]:
+                cuis.append(cui)
+        return list(set(cuis))
+
+    def resolve_image_path(row):
+        return os.path.join(root, row["Path"])
+
+    return pd.DataFrame({
+        "image_path": df.apply(resolve_image_path, axis=1),
+        "concepts": df.apply(extract_cuis, axis=1),
+        "report": df["Report"].tolist(),
+        "source": "chexpert"
+    })
+
+
+def legacy_padchest(csv_path: str, image_dir: str) -> pd.DataFrame:
+    df = pd.read_csv(csv_path, low_memory=False)
+
+    def extract_cuis(row):
+        label_cui_raw = row.get("labelCUIS")
+        labels_raw = row.get("Labels")
+        if pd.isna(label_cui_raw) or str(label_cui_raw).strip() in ["", "[]"]:
+            try:
+                labels = ast.literal_eval(labels_raw)
+                if isinstance(labels, list) and "normal" in [l.lower() for l in labels]:
+                    return ["C0205307"]
+            except Exception:
+                pass
+            return []
+        try:
+            cell = str(label_cui_raw).replace("'", '"').replace(' ', ', ')
+            cuis = list(set(ast.literal_eval(cell)))
+            return cuis if cuis else []
+        except Exception:
+            return []
+
+    def resolve_image_path(row):
+        return os.path.join(image_dir, str(row["ImageDir"]), row["ImageID"])
+
+    return pd.DataFrame({
+        "image_path": df.apply(resolve_image_path, axis=1),
+        "concepts": df.apply(extract_cuis, axis=1),
+        "report": df["Report"].fillna("").astype(str),
+        "source": "padchest"
+    })
+
+
+def assert_parity(new: pd.DataFrame, old: pd.DataFrame, name: str):
+    """Same rows, index and values; concept lists compared as sets (the old code used set order)."""
+    assert list(new.columns) == list(old.columns), f"{name}: columns differ"
+    assert new.index.equals(old.index), f"{name}: index differs"
+    for col in ("image_path", "report", "source"):
+        assert new[col].astype(str).tolist() == old[col].astype(str).tolist(), f"{name}: {col} differs"
+    mismatched = sum(set(a) != set(b) or len(a) != len(b) for a, b in zip(new["concepts"], old["concepts"]))
+    assert mismatched == 0, f"{name}: {mismatched} concept lists differ"
+
+
+def timed(fn, *args, repeat: int = 1, **kwargs):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run(rows: int = 200_000, repeat: int = 1, workdir: str = None) -> dict:
+    workdir = workdir or tempfile.mkdtemp(prefix="vizmed-bench-")
+    chexpert_root = os.path.join(workdir, "CheXpert")
+    padchest_csv = os.path.join(workdir, "PadChest", "padchest.csv")
+    make_chexpert_csv(os.path.join(chexpert_root, "train.csv"), rows=rows)
+    make_padchest_csv(padchest_csv, rows=rows)
+
+    results = {}
+    for name, new_fn, old_fn, args in [
+        ("chexpert", load_chexpert, legacy_chexpert, None),
+        ("padchest", load_padchest, legacy_padchest, None),
+    ]:
+        if name == "chexpert":
+            t_new, new = timed(new_fn, "train", root=chexpert_root, repeat=repeat)
+            t_old, old = timed(old_fn, os.path.join(chexpert_root, "train.csv"), chexpert_root, repeat=repeat)
+        else:
+            t_new, new = timed(new_fn, padchest_csv, image_dir=os.path.dirname(padchest_csv), repeat=repeat)
+            t_old, old = timed(old_fn, padchest_csv, os.path.dirname(padchest_csv), repeat=repeat)
+        assert_parity(new, old, name)
+        results[name] = {"rows": len(new), "row_wise_s": t_old, "vectorized_s": t_new, "speedup": t_old / t_new}
+        print(f"{name:9s} rows={len(new):>7d}  row-wise {t_old:6.2f}s  vectorized {t_new:6.2f}s  ({t_old / t_new:.1f}x, parity ok)")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+    run(rows=args.rows, repeat=args.repeat)
@@ -0,0 +1,185 @@
+# benchmarks/run.py
+"""
+End-to-end offline benchmark of the pipeline steps main.py runs, on
+synthetic data and the stub UTS server (benchmarks/stub_umls), so no
+dataset or UMLS API key is needed:
+  load_padchest, load_chexpert     parsing synthetic label CSVs
+  build_cui_vocabs                 vocab + one metadata fetch for both datasets
+  enrich_metadata_cache            climbing the parent hierarchy over HTTP
+  build_graph                      enriched metadata, and a synthetic MeSH-like ontology
+                                   (including hashing-encoder node features)
+  gnn_forward                      OntologyGNN forward pass on the synthetic ontology graph
+
+The run report (utils/profiling: per-stage wall/CPU time and peak RSS,
+per-endpoint HTTP stats) is written as JSON, tagged with the commit, so
+runs can be compared across commits:
+
+    python -m benchmarks.run --scale small
+    python -m benchmarks.run --scale medium --latency 0.05 --compare benchmarks/results/<old>.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import tempfile
+import time
+
+import torch
+
+from benchmarks.stub_umls import StubUMLS
+from benchmarks.synthetic import make_chexpert_csv, make_ontology_csv, make_padchest_csv
+from data.cui_vocab import build_cui_vocabs
+from data.graph.build_graph import build_graph
+from data.graph.node_features import HashingEncoder
+from data.umls.enrich_cache import enrich_metadata_cache
+from data.umls.metadata_store import MetadataStore
+from data.umls.source_ui_cache import SourceUICache
+from models.gnn.ontology_gnn import OntologyGNN
+from preprocess.chexpert_parser import load_chexpert
+from preprocess.padchest_parser import load_padchest
+from utils.profiling import RunProfiler, stage
+
+RESULTS_DIR = os.path.join("benchmarks", "results")
+
+SCALES = {
+    "small": dict(padchest_rows=20_000, chexpert_rows=20_000, labels=100, concepts=20_000),
+    "medium": dict(padchest_rows=160_000, chexpert_rows=200_000, labels=500, concepts=100_000),
+    "large": dict(padchest_rows=500_000, chexpert_rows=500_000, labels=2000, concepts=300_000),
+}
+
+
+def git_revision() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": "unknown", "dirty": False}
+    return {"commit": commit, "dirty": dirty}
+
+
+def _mib(value) -> str:
+    return f"{value:7.0f}" if value is not None else "    n/a"
+
+
+def compare(report: dict, baseline_path: str):
+    """Print per-stage wall time and peak RSS against an earlier report."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    before = {s["stage"]: s for s in baseline["stages"]}
+    print(f"\n=== vs {baseline['meta'].get('commit', '?')} ({baseline_path}) ===")
+    for s in report["stages"]:
+        old = before.get(s["stage"])
+        if old is None:
+            print(f"  {s['stage']:28s} {s['wall_s']:8.2f}s  (new stage)")
+            continue
+        ratio = s["wall_s"] / old["wall_s"] if old["wall_s"] > 0 else float("inf")
+        print(
+            f"  {s['stage']:28s} {old['wall_s']:8.2f}s -> {s['wall_s']:8.2f}s ({ratio:5.2f}x)  "
+            f"peak {_mib(old['peak_rss_mb'])} -> {_mib(s['peak_rss_mb'])} MiB"
+        )
+
+
+def pipeline(workdir: str, padchest_rows: int, chexpert_rows: int, labels: int, concepts: int,
+             in_dim: int, repeat: int) -> dict:
+    with stage("generate"):
+        padchest_csv = make_padchest_csv(os.path.join(workdir, "PadChest", "padchest.csv"),
+                                         rows=padchest_rows, extra_labels=labels)
+        chexpert_root = os.path.join(workdir, "CheXpert")
+        make_chexpert_csv(os.path.join(chexpert_root, "train.csv"), rows=chexpert_rows)
+        ontology_csv = make_ontology_csv(os.path.join(workdir, "ontology.csv"), concepts=concepts)
+
+    with stage("load_padchest"):
+        padchest_df = load_padchest(padchest_csv, image_dir=os.path.dirname(padchest_csv))
+    with stage("load_chexpert"):
+        chexpert_df = load_chexpert("train", root=chexpert_root)
+
+    # Every cache lives in the workdir, so runs start cold and never touch the real caches
+    store = MetadataStore(os.path.join(workdir, "cui_metadata.sqlite"), legacy_csv=None)
+    source_ui_cache = SourceUICache(os.path.join(workdir, "source_ui_cache.sqlite"))
+    vocab_dir = os.path.join(workdir, "vocab")
+    with stage("build_cui_vocabs"):
+        build_cui_vocabs({"padchest": padchest_df, "chexpert": chexpert_df}, output_dir=vocab_dir,
+                         api_key="stub", store=store, source_ui_cache=source_ui_cache)
+    with stage("enrich_metadata_cache"):
+        added = enrich_metadata_cache(api_key="stub", store=store,
+                                      checkpoint_path=os.path.join(workdir, "enrich_frontier.json"),
+                                      source_ui_cache=source_ui_cache)
+    source_ui_cache.close()
+
+    metadata_csv = store.export_csv(os.path.join(workdir, "cui_metadata_cache.csv"))
+    encoder, features_dir = HashingEncoder(in_dim), os.path.join(workdir, "embeddings")
+    with stage("build_graph_enriched"):
+        enriched = build_graph(metadata_csv, add_sibling_edges="sampled", include_ancestors=True,
+                               output_path=os.path.join(workdir, "enriched_graph"),
+                               encoder=encoder, features_dir=features_dir)
+    with stage("build_graph_synthetic"):
+        graph = build_graph(ontology_csv, add_sibling_edges="sampled", include_ancestors=True,
+                            output_path=os.path.join(workdir, "synthetic_graph"),
+                            encoder=encoder, features_dir=features_dir)
+
+    torch.manual_seed(0)
+    model = OntologyGNN(in_dim=in_dim, cached_adjacency=True).eval()
+    with torch.inference_mode():
+        with stage("gnn_forward_first"):
+            model(graph.x, graph.edge_index)  # includes building the normalized adjacency
+        with stage("gnn_forward"):
+            for _ in range(repeat):
+                model(graph.x, graph.edge_index)
+
+    return {
+        "padchest_rows": len(padchest_df), "chexpert_rows": len(chexpert_df),
+        "metadata_concepts": len(store), "enriched_concepts": added,
+        "enriched_graph": {"nodes": enriched.num_nodes, "edges": enriched.edge_index.size(1)},
+        "synthetic_graph": {"nodes": graph.num_nodes, "edges": graph.edge_index.size(1)},
+        "gnn_forward_repeat": repeat,
+    }
+
+
+def run(scale: str = "small", latency: float = 0.02, fail_rate: float = 0.0, branching: int = 8,
+        in_dim: int = 768, repeat: int = 3, output: str = None, baseline: str = None,
+        workdir: str = None, **overrides) -> dict:
+    params = dict(SCALES[scale])
+    params.update({key: value for key, value in overrides.items() if value is not None})
+    revision = git_revision()
+    output = output or os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{revision['commit']}-{scale}.json")
+    workdir = workdir or tempfile.mkdtemp(prefix="vizmed-bench-")
+
+    meta = dict(revision, scale=scale, latency=latency, fail_rate=fail_rate, branching=branching,
+                in_dim=in_dim, torch_threads=torch.get_num_threads(), **params)
+    with StubUMLS(latency=latency, fail_rate=fail_rate, size=params["concepts"], branching=branching):
+        profiler = RunProfiler(meta=meta)
+        with profiler:
+            profiler.meta["sizes"] = pipeline(workdir, in_dim=in_dim, repeat=repeat, **params)
+        profiler.write(output)
+    report = profiler.report()
+
+    print(f"\n=== {scale} @ {revision['commit']}{' (dirty)' if revision['dirty'] else ''} ===")
+    for s in report["stages"]:
+        print(f"  {s['stage']:28s} {s['wall_s']:8.2f}s  cpu {s['cpu_s']:8.2f}s  peak {_mib(s['peak_rss_mb'])} MiB")
+    total = report["http_total"]
+    print(f"  HTTP: {total['count']} calls, {total['bytes'] / 2**20:.1f} MiB, {total['total_s']:.1f}s summed latency")
+    print(f"[✓] Results written to {output}")
+    if baseline:
+        compare(report, baseline)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--padchest-rows", type=int, default=None)
+    parser.add_argument("--chexpert-rows", type=int, default=None)
+    parser.add_argument("--labels", type=int, default=None, help="Extra synthetic PadChest findings (CUI vocab width)")
+    parser.add_argument("--concepts", type=int, default=None, help="Synthetic ontology size (also the stub's tree size)")
+    parser.add_argument("--latency", type=float, default=0.02, help="Mean stub latency per request, seconds")
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--branching", type=int, default=8)
+    parser.add_argument("--in-dim", type=int, default=768)
+    parser.add_argument("--repeat", type=int, default=3, help="Timed GNN forward passes")
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--compare", default=None, help="Earlier results JSON to compare against")
+    args = parser.parse_args()
+    run(args.scale, args.latency, args.fail_rate, args.branching, args.in_dim, args.repeat, args.output,
+        args.compare, padchest_rows=args.padchest_rows, chexpert_rows=args.chexpert_rows,
+        labels=args.labels, concepts=args.concepts)
@@ -0,0 +1,188 @@
+# benchmarks/stub_umls.py
+"""
+Local stand-in for the UTS endpoints UMLSClient uses (CAS ticket auth,
+CUI content, definitions, atoms, MSH source parents/descendants and
+sourceUi search), with a configurable per-request latency and failure rate.
+
+Concepts form a deterministic MeSH-like tree: descriptor D<n> has parent
+D<n // branching> and children D<n * branching + j>, and CUI C<n> maps to
+D<n>. Any CUI is accepted; ids above `size` wrap into the tree, so the
+synthetic dataset CUIs all climb to a handful of roots.
+
+Run it in a child process from Python (StubUMLS), or standalone and point
+main.py at it through UMLS_AUTH_URL / UMLS_API_BASE:
+
+    python -m benchmarks.stub_umls --port 8085 --latency 0.05
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import random
+import socket
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+SEMANTIC_TYPES = ("Disease or Syndrome", "Finding", "Body Part, Organ, or Organ Component", "Pathologic Function")
+
+
+def _make_handler(base: str, latency: float, fail_rate: float, size: int, branching: int, seed: int):
+    rng = random.Random(seed)
+
+    def descriptor(n: int) -> str:
+        return f"D{n:07d}"
+
+    def node(ui: str) -> int:
+        # CUIs and descriptors share the numbering; out-of-range ids wrap into 1..size
+        return (int(ui[1:]) - 1) % size + 1
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Buffer the headers and body into one write per response (flushed by the server after each request)
+        wbufsize = -1
+
+        def setup(self):
+            super().setup()
+            # Without this, keep-alive requests stall on Nagle + delayed ACK (~40 ms each)
+            self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status: int, body, headers: dict = None):
+            data = body.encode() if isinstance(body, str) else json.dumps(body).encode()
+            self.send_response(status)
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _delay(self) -> bool:
+            """Sleep for the configured latency; True if this request should fail."""
+            if latency > 0:
+                time.sleep(latency * rng.uniform(0.5, 1.5))
+            return fail_rate > 0 and rng.random() < fail_rate
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if self._delay():
+                return self._send(503, "busy", {"Retry-After": "0"})
+            path = urlparse(self.path).path
+            if path == "/cas/v1/api-key":
+                return self._send(201, "", {"location": f"{base}/cas/v1/api-key/TGT-{rng.randrange(10**9)}-cas"})
+            if path.startswith("/cas/v1/api-key/TGT-"):
+                return self._send(200, f"ST-{rng.randrange(10**12)}-cas")
+            return self._send(404, "not found")
+
+        def do_GET(self):
+            if self._delay():
+                return self._send(503, {"error": "busy"}, {"Retry-After": "0"})
+            url = urlparse(self.path)
+            parts = url.path.strip("/").split("/")
+
+            # /rest/content/current/CUI/<cui>[/definitions|/atoms]
+            if parts[:4] == ["rest", "content", "current", "CUI"] and len(parts) >= 5:
+                cui, n = parts[4], node(parts[4])
+                concept_url = f"{base}/rest/content/current/CUI/{cui}"
+                if len(parts) == 5:
+                    return self._send(200, {"result": {
+                        "ui": cui,
+                        "name": f"Concept {n}",
+                        "semanticTypes": [{"name": SEMANTIC_TYPES[n % len(SEMANTIC_TYPES)]}],
+                        "definitions": f"{concept_url}/definitions",
+                        "atoms": f"{concept_url}/atoms",
+                    }})
+                if parts[5] == "definitions":
+                    return self._send(200, {"result": [
+                        {"rootSource": "NCI", "value": f"NCI definition of concept {n}"},
+                        {"rootSource": "MSH", "value": f"MeSH definition of concept {n}"},
+                    ]})
+                if parts[5] == "atoms":
+                    source = f"{base}/rest/content/current/source/MSH/{descriptor(n)}"
+                    return self._send(200, {"result": [
+                        {"rootSource": "MSH", "obsolete": "false", "language": "ENG", "sourceDescriptor": source},
+                    ]})
+
+            # /rest/content/current/source/MSH/<descriptor>/(parents|descendants)
+            if parts[:4] == ["rest", "content", "current", "source"] and len(parts) == 7:
+                n = node(parts[5])
+                if parts[6] == "parents":
+                    ids = [n // branching] if n // branching > 0 else []
+                else:
+                    ids = [c for c in range(n * branching, n * branching + branching) if 0 < c <= size]
+                return self._send(200, {"result": [
+                    {"ui": descriptor(i), "name": f"Concept {i}", "rootSource": "MSH"} for i in ids
+                ]})
+
+            if url.path == "/rest/search/current":
+                ui = parse_qs(url.query).get("string", ["D0"])[0]
+                n = node(ui)
+                return self._send(200, {"result": {"results": [{"ui": f"C{n:07d}", "name": f"Concept {n}"}]}})
+
+            return self._send(404, {"error": "not found"})
+
+    return Handler
+
+
+def serve(port: int = 0, latency: float = 0.02, fail_rate: float = 0.0, size: int = 100_000,
+          branching: int = 8, seed: int = 0, ready=None):
+    server = ThreadingHTTPServer(("127.0.0.1", port), None)
+    server.daemon_threads = True
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    server.RequestHandlerClass = _make_handler(base, latency, fail_rate, size, branching, seed)
+    if ready is not None:
+        ready.put(base)
+    else:
+        print(f"[i] Stub UTS listening on {base}")
+        print(f"    UMLS_AUTH_URL={base}/cas/v1/api-key UMLS_API_BASE={base}/rest")
+    server.serve_forever()
+
+
+class StubUMLS:
+    """
+    The stub in a child process, so its request handling doesn't share the
+    GIL with the code being timed. Sets UMLS_AUTH_URL / UMLS_API_BASE for
+    UMLSClient while open.
+    """
+
+    def __init__(self, latency: float = 0.02, fail_rate: float = 0.0, size: int = 100_000,
+                 branching: int = 8, seed: int = 0):
+        self.options = dict(latency=latency, fail_rate=fail_rate, size=size, branching=branching, seed=seed)
+        self._process = None
+        self._saved_env = {}
+
+    def __enter__(self) -> "StubUMLS":
+        ready = mp.get_context("spawn").Queue()
+        self._process = mp.get_context("spawn").Process(
+            target=serve, kwargs=dict(self.options, ready=ready), daemon=True
+        )
+        self._process.start()
+        self.base = ready.get(timeout=30)
+        self.auth_url = f"{self.base}/cas/v1/api-key"
+        self.api_base = f"{self.base}/rest"
+        for key, value in (("UMLS_AUTH_URL", self.auth_url), ("UMLS_API_BASE", self.api_base)):
+            self._saved_env[key] = os.environ.get(key)
+            os.environ[key] = value
+        return self
+
+    def __exit__(self, *exc):
+        for key, value in self._saved_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        self._process.terminate()
+        self._process.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8085)
+    parser.add_argument("--latency", type=float, default=0.02, help="Mean seconds per request")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument("--size", type=int, default=100_000, help="Number of concepts in the tree")
+    parser.add_argument("--branching", type=int, default=8)
+    args = parser.parse_args()
+    serve(args.port, args.latency, args.fail_rate, args.size, args.branching)
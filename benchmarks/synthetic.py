@@ -0,0 +1,121 @@
+# benchmarks/synthetic.py
+"""Synthetic stand-ins for the PadChest and CheXpert label CSVs."""
+import os
+import numpy as np
+import pandas as pd
+
+from preprocess.utils.cui_mappings import CHEXPERT_CUI_MAP
+
+# A handful of real PadChest label/CUI pairs; the rest are made up
+PADCHEST_LABELS = {
+    "pleural effusion": "C0032227",
+    "cardiomegaly": "C0018800",
+    "pneumonia": "C0032285",
+    "atelectasis": "C0004144",
+    "nodule": "C0028259",
+    "scoliosis": "C0036439",
+    "aortic elongation": "C0240951",
+    "chronic changes": "C0742362",
+}
+WORDS = "no evidence of focal consolidation effusion or pneumothorax heart size normal stable changes".split()
+
+
+def _reports(rng, n: int) -> np.ndarray:
+    lengths = rng.integers(4, 16, size=n)
+    vocab = np.array(WORDS)
+    return np.array([" ".join(vocab[rng.integers(0, len(vocab), size=k)]) for k in lengths], dtype=object)
+
+
+def make_padchest_csv(path: str, rows: int = 200_000, extra_columns: int = 30, extra_labels: int = 0, seed: int = 0) -> str:
+    """
+    Write a PadChest-shaped CSV (numpy-style labelCUIS cells, Python-list
+    Labels). `extra_labels` adds made-up findings to widen the CUI vocab.
+    """
+    rng = np.random.default_rng(seed)
+    label_cuis_map = dict(PADCHEST_LABELS)
+    label_cuis_map.update({f"finding {i}": f"C8{i:06d}" for i in range(extra_labels)})
+    names = np.array(list(label_cuis_map) + ["normal"], dtype=object)
+    cuis = np.array(list(label_cuis_map.values()), dtype=object)
+
+    labels, label_cuis = [], []
+    for k, normal in zip(rng.integers(0, 4, size=rows), rng.random(rows) < 0.3):
+        if normal:
+            labels.append("['normal']")
+            label_cuis.append("[]" if rng.random() < 0.5 else np.nan)
+            continue
+        picks = rng.choice(len(cuis), size=max(k, 1), replace=True)
+        labels.append(str([names[p] for p in picks]))
+        label_cuis.append("[" + " ".join(f"'{cuis[p]}'" for p in picks) + "]")
+
+    df = pd.DataFrame({
+        "ImageID": [f"{i:08d}.png" for i in range(rows)],
+        "ImageDir": rng.integers(0, 55, size=rows),
+        "Labels": labels,
+        "labelCUIS": label_cuis,
+        "Report": _reports(rng, rows),
+    })
+    for j in range(extra_columns):
+        df[f"extra_{j}"] = rng.integers(0, 1000, size=rows)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    df.to_csv(path, index=False)
+    return path
+
+
+def make_chexpert_csv(path: str, rows: int = 200_000, seed: int = 0) -> str:
+    """Write a CheXpert-shaped split CSV (label columns in {1, 0, -1, blank})."""
+    rng = np.random.default_rng(seed)
+    reports = _reports(rng, rows)
+    reports[rng.random(rows) < 0.02] = ""
+
+    df = pd.DataFrame({
+        "Path": [f"CheXpert-v1.0/train/patient{i // 3:05d}/study1/view{i % 3 + 1}_frontal.jpg" for i in range(rows)],
+        "Sex": rng.choice(["Male", "Female"], size=rows),
+        "Age": rng.integers(18, 90, size=rows),
+        "Report": reports,
+    })
+    values = np.array([1.0, 0.0, -1.0, np.nan])
+    for label in CHEXPERT_CUI_MAP:
+        df[label] = values[rng.choice(4, size=rows, p=[0.1, 0.2, 0.05, 0.65])]
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    df.to_csv(path, index=False)
+    return path
+
+
+def make_ontology_csv(path: str, concepts: int = 100_000, max_parents: int = 3, dangling: float = 0.05, seed: int = 0) -> str:
+    """
+    Write a MeSH-like metadata CSV: each concept gets 1..max_parents parents
+    among earlier concepts (a random DAG with a few deep chains and broad
+    hubs), descendants mirror the parent links, and a fraction of entries
+    point at CUIs outside the file like a partially enriched cache.
+    """
+    rng = np.random.default_rng(seed)
+    cuis = [f"C{i:07d}" for i in range(concepts)]
+    names = [f"Concept {i}" for i in range(concepts)]
+    semantic_types = np.array(["Disease or Syndrome", "Body Part, Organ, or Organ Component", "Finding", "Pathologic Function"])
+
+    parents = [[] for _ in range(concepts)]
+    children = [[] for _ in range(concepts)]
+    for i in range(1, concepts):
+        k = rng.integers(1, max_parents + 1)
+        # Bias towards low ids so a few hubs get many children
+        for p in set((i * rng.random(k) ** 2).astype(int).tolist()):
+            parents[i].append(p)
+            children[p].append(i)
+
+    def entries(ids):
+        out = [f"{{({names[j]}), {cuis[j]}}}" for j in ids]
+        if rng.random() < dangling:
+            out.append(f"{{(Outside concept), C9{rng.integers(0, 10**6):06d}}}")
+        return str(out)
+
+    df = pd.DataFrame({
+        "cui": cuis,
+        "name": names,
+        "definition": "Synthetic definition",
+        "semantic_type": semantic_types[rng.integers(0, len(semantic_types), size=concepts)],
+        "parents": [entries(p) for p in parents],
+        "descendants": [entries(c) for c in children],
+    })
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    df.to_csv(path, index=False)
+    return path
@@ -0,0 +1,115 @@
+# data/columnar.py
+"""
+Small helpers for memory-mappable columnar caches: NumPy .npy arrays plus
+string tables (int64 offsets + one UTF-8 blob) and source-file stamps.
+"""
+import hashlib
+import json
+import os
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+
+def save_array(path: str, array) -> str:
+    np.save(path, np.ascontiguousarray(array), allow_pickle=False)
+    return path
+
+
+def load_array(path: str, mmap: bool = True) -> np.ndarray:
+    return np.load(path, mmap_mode="r" if mmap else None, allow_pickle=False)
+
+
+def load_blob(path: str, mmap: bool = True) -> np.ndarray:
+    """Raw uint8 blob; np.memmap can't map empty files, so those become an empty array."""
+    if os.path.getsize(path) == 0:
+        return np.empty(0, dtype=np.uint8)
+    if mmap:
+        return np.memmap(path, dtype=np.uint8, mode="r")
+    return np.fromfile(path, dtype=np.uint8)
+
+
+class StringTableWriter:
+    """Appends strings to `<prefix>.bin` and records their end offsets for `<prefix>.offsets.npy`."""
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self._blob = open(f"{prefix}.bin", "wb")
+        self._ends = []
+        self._size = 0
+
+    def extend(self, strings: Iterable[str]):
+        encoded = [s.encode("utf-8") for s in strings]
+        if not encoded:
+            return
+        lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded))
+        self._ends.append(self._size + np.cumsum(lengths))
+        self._size += int(lengths.sum())
+        self._blob.write(b"".join(encoded))
+
+    def abort(self):
+        self._blob.close()
+
+    def close(self) -> int:
+        self._blob.close()
+        ends = np.concatenate(self._ends) if self._ends else np.empty(0, dtype=np.int64)
+        save_array(f"{self.prefix}.offsets.npy", np.concatenate([[0], ends]).astype(np.int64))
+        return len(ends)
+
+
+def write_string_table(prefix: str, strings: Iterable[str]) -> int:
+    writer = StringTableWriter(prefix)
+    writer.extend(strings)
+    return writer.close()
+
+
+def read_string_table(prefix: str, mmap: bool = True) -> List[str]:
+    offsets = load_array(f"{prefix}.offsets.npy", mmap=mmap)
+    blob = load_blob(f"{prefix}.bin", mmap=mmap)
+    bounds = offsets.tolist()
+    # Decode straight from the (mapped) blob; a memoryview slices without copying
+    data = memoryview(blob)
+    if len(blob) == 0 or blob.max() < 0x80:
+        # Pure ASCII: byte offsets are character offsets, so slice the decoded text directly
+        text = str(data, "ascii")
+        return [text[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+    return [str(data[start:end], "utf-8") for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def file_sha1(path: str, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_stamp(path: str) -> dict:
+    """Identity of a source file: size, mtime and content hash."""
+    stat = os.stat(path)
+    return {"path": path, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha1": file_sha1(path)}
+
+
+def stamp_matches(stamp: Optional[dict], path: str) -> bool:
+    """Cheap size/mtime check first; only hash the file when its mtime moved."""
+    if not stamp or not os.path.exists(path):
+        return False
+    stat = os.stat(path)
+    if stat.st_size != stamp.get("size"):
+        return False
+    if stat.st_mtime_ns == stamp.get("mtime_ns"):
+        return True
+    return file_sha1(path) == stamp.get("sha1")
+
+
+def write_manifest(directory: str, manifest: dict):
+    with open(os.path.join(directory, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def read_manifest(directory: str) -> Optional[dict]:
+    path = os.path.join(directory, "manifest.json")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
@@ -1,100 +1,122 @@
 # data/cui_vocab.py
-import os, ast
+import itertools
+import os
+import numpy as np
 import pandas as pd
-from collections import Counter
+from typing import Dict, Optional
 from data.umls.uts_client import UMLSClient
-import json
-
-def build_cui_vocab(
-    df: pd.DataFrame,
-    source: str,
+from data.umls.metadata_store import MetadataStore
+from data.umls.source_ui_cache import SourceUICache
+
+VOCAB_COLUMNS = ["cui", "name", "definition", "semantic_type", "parents", "descendants", "count", "source"]
+
+
+def cui_frequencies(concepts: pd.Series) -> pd.Series:
+    """CUI -> occurrences in a `concepts` list column; non-list rows and blank CUIs are ignored."""
+    # Flattening with chain beats Series.explode on list columns; value_counts does the counting
+    flat = np.fromiter(itertools.chain.from_iterable(row for row in concepts if isinstance(row, list)), dtype=object)
+    counts = pd.Series(flat, dtype=object).value_counts()
+    # Validate each distinct key once instead of every occurrence
+    valid = [isinstance(cui, str) and bool(cui.strip()) for cui in counts.index]
+    return counts[valid].sort_index()
+
+
+def _vocab_frame(freq: pd.Series, cache: Dict[str, dict], source) -> pd.DataFrame:
+    known = [cui for cui in freq.index if cui in cache]
+    metas = [cache[cui] for cui in known]
+    sources = source if isinstance(source, pd.Series) else pd.Series(source, index=freq.index)
+    return pd.DataFrame({
+        "cui": known,
+        "name": [meta["name"] for meta in metas],
+        "definition": [meta["definition"] for meta in metas],
+        "semantic_type": [meta["semantic_type"] for meta in metas],
+        "parents": [str(meta["parents"]) for meta in metas],
+        "descendants": [str(meta["descendants"]) for meta in metas],
+        "count": freq[known].to_numpy(),
+        "source": sources[known].to_numpy(),
+    }, columns=VOCAB_COLUMNS)
+
+
+def build_cui_vocabs(
+    frames: Dict[str, pd.DataFrame],
     umls_lookup: dict = None,
     output_dir: str = "data/vocab",
-    api_key: str = None
-):
+    api_key: str = None,
+    store: MetadataStore = None,
+    combined: Optional[str] = "combined",
+    source_ui_cache: SourceUICache = None,
+) -> Dict[str, pd.DataFrame]:
+    """
+    Vocab CSVs for several sources ({source: frame with a `concepts` column})
+    in one pass: CUI counts per source, one UMLS fetch for the union of
+    CUIs missing from the store, one metadata read, then
+    `<source>_vocab.csv` per source plus `<combined>_vocab.csv` with summed
+    counts and the sources each CUI occurs in (skipped if `combined` is None).
+    Returns the vocab frames keyed like the written files. `source_ui_cache`
+    defaults to the client's persistent cache.
+    """
     os.makedirs(output_dir, exist_ok=True)
 
-    # === Extract CUIs ===
-    valid_cuis = []
-    for row in df["concepts"]:
-        if isinstance(row, list):
-            valid_cuis.extend([c for c in row if isinstance(c, str) and c.strip()])
-
-    unique_cuis = sorted(set(valid_cuis))
-    freq = Counter(valid_cuis)
-
-    # === Load cache file ===
-    cache_path = os.path.join("data/umls", "cui_metadata_cache.csv")
-    if os.path.exists(cache_path):
-        cache_df = pd.read_csv(cache_path, dtype=str).fillna("")
-    else:
-        cache_df = pd.DataFrame(columns=["cui", "name", "definition", "semantic_type", "parents", "descendants"])
-
-    cache = {}
-    for _, row in cache_df.iterrows():
-        cache[row["cui"]] = {
-            "cui": row["cui"],
-            "name": row["name"],
-            "definition": row["definition"],
-            "semantic_type": row["semantic_type"],
-            "parents": ast.literal_eval(row["parents"]) if row["parents"] else [],
-            "descendants": ast.literal_eval(row["descendants"]) if row["descendants"] else [],
-        }
-
-    # === Fetch missing CUIs incrementally ===
+    # === Count CUIs ===
+    freqs = {source: cui_frequencies(df["concepts"]) for source, df in frames.items()}
+    unique_cuis = sorted(set().union(*(freq.index for freq in freqs.values())))
+
+    # === Open metadata store (only the rows for this vocab are loaded) ===
+    store = store if store is not None else MetadataStore()
+
+    # === Fetch missing CUIs once for all sources ===
     if umls_lookup is None:
         if not api_key:
             raise ValueError("UMLS API key is required if no lookup is passed.")
-        umls = UMLSClient(api_key)
-
-        for i, cui in enumerate(unique_cuis):
-            if cui in cache:
-                continue
-
-            try:
-                meta = umls.get_concept_metadata(cui)
-                cache[cui] = meta
-
-                # --- Save immediately after each CUI ---
-                new_row = {
-                    "cui": cui,
-                    "name": meta["name"],
-                    "definition": meta["definition"],
-                    "semantic_type": meta["semantic_type"],
-                    "parents": str(meta["parents"]),
-                    "descendants": str(meta["descendants"]),
-                }
-                pd.DataFrame([new_row]).to_csv(
-                    cache_path, mode="a", header=not os.path.exists(cache_path), index=False
-                )
-
-            except Exception as e:
-                print(f"[!] Failed to fetch {cui}: {e}")
-
-            if (i + 1) % 10 == 0:
-                print(f"  ...processed {i+1}/{len(unique_cuis)}")
-
-    # === Build final vocab DataFrame (merge with cache) ===
-    vocab_rows = []
+        missing = store.missing(unique_cuis)
+        umls = UMLSClient(api_key, source_ui_cache=source_ui_cache) if missing else None
+
+        with store.writer() as writer:
+            for i, (cui, meta, err) in enumerate(umls.iter_concept_metadata(missing) if umls else []):
+                if err is not None:
+                    print(f"[!] Failed to fetch {cui}: {err}")
+                else:
+                    writer.put(meta)
+
+                if (i + 1) % 10 == 0:
+                    print(f"  ...processed {i+1}/{len(missing)}")
+
+        if umls is not None:
+            print(f"[i] UMLS {umls.summary()}")
+            umls.close()
+
+    cache = store.get_many(unique_cuis)
+    if umls_lookup:
+        cache.update({cui: umls_lookup[cui] for cui in unique_cuis if cui not in cache and cui in umls_lookup})
     for cui in unique_cuis:
-        meta = cache[cui]
-        vocab_rows.append({
-            "cui": cui,
-            "name": meta["name"],
-            "definition": meta["definition"],
-            "semantic_type": meta["semantic_type"],
-            "parents": str(meta["parents"]),
-            "descendants": str(meta["descendants"]),
-            "count": freq[cui],
-            "source": source
-        })
-
-    vocab_df = pd.DataFrame(vocab_rows)
-
-    # Save vocab CSV
-    csv_path = os.path.join(output_dir, f"{source}_vocab.csv")
-    vocab_df.to_csv(csv_path, index=False)
-
-    print(f"[✓] Saved enriched vocab CSV to {csv_path}")
-
-    return vocab_df
\ No newline at end of file
+        if cui not in cache:
+            print(f"[!] No metadata for {cui}; skipping")
+
+    # === Build vocab DataFrames (merged with the metadata) and save them ===
+    vocabs = {source: _vocab_frame(freq, cache, source) for source, freq in freqs.items()}
+    if combined is not None:
+        counts = pd.concat(freqs, axis=1).fillna(0).astype("int64")
+        total = counts.sum(axis=1).sort_index()
+        sources = counts.gt(0).apply(lambda row: ";".join(counts.columns[row.to_numpy()]), axis=1)
+        vocabs[combined] = _vocab_frame(total, cache, sources)
+
+    for name, vocab_df in vocabs.items():
+        csv_path = os.path.join(output_dir, f"{name}_vocab.csv")
+        vocab_df.to_csv(csv_path, index=False)
+        print(f"[✓] Saved enriched vocab CSV to {csv_path} ({len(vocab_df)} CUIs)")
+
+    return vocabs
+
+
+def build_cui_vocab(
+    df: pd.DataFrame,
+    source: str,
+    umls_lookup: dict = None,
+    output_dir: str = "data/vocab",
+    api_key: str = None,
+    store: MetadataStore = None,
+):
+    """Single-source build_cui_vocabs(); writes only `<source>_vocab.csv`."""
+    return build_cui_vocabs(
+        {source: df}, umls_lookup=umls_lookup, output_dir=output_dir, api_key=api_key, store=store, combined=None
+    )[source]
@@ -1,96 +1,396 @@
 # data/graph/build_graph.py
+import hashlib
 import os
+import time
+from itertools import chain
+from typing import Optional
+
+import numpy as np
 import torch
 from torch_geometric.data import Data
+from torch_geometric.utils import coalesce
 import pandas as pd
-import ast
-from collections import defaultdict
 
-GRAPH_CACHE = "data/graph/ontology_graph.pt"
+from data.graph.graph_store import load_graph, save_graph
+from data.graph.node_features import EMBEDDING_DIR, concept_features, concept_texts, load_encoder, text_keys
+
+GRAPH_CACHE = "data/graph/ontology_graph"
+
+# Bump when the graph layout or edge construction changes, so cached graphs are rebuilt
+GRAPH_CACHE_VERSION = 2
+# graph.edge_type values; an edge built for several reasons keeps the lowest
+HIERARCHY, ANCESTOR, SIBLING = 0, 1, 2
+EDGE_TYPES = ("hierarchy", "ancestor", "sibling")
+# Metadata columns that determine the graph; changes elsewhere (e.g. definitions) don't invalidate it
+GRAPH_COLUMNS = ("cui", "name", "semantic_type", "parents", "descendants", "ancestors")
+
+# Relation columns hold stringified lists of "{(name), CUI}" entries; capture the CUI
+RELATION_CUI = r"\), ([^,'\"{}]*)\}"
+
+
+def relation_targets(column: pd.Series):
+    """Parse a relation column in one regex pass into flat (row, target CUI) arrays."""
+    matches = column.fillna("").astype(str).str.findall(RELATION_CUI).tolist()
+    counts = np.fromiter(map(len, matches), dtype=np.int64, count=len(matches))
+    rows = np.repeat(np.arange(len(matches), dtype=np.int64), counts)
+    targets = np.array(list(chain.from_iterable(matches)), dtype=str)
+    return rows, targets
+
+
+class CUIIndex:
+    """Vectorized CUI -> node index lookup via np.searchsorted (-1 for unknown CUIs)."""
+
+    def __init__(self, cuis):
+        cuis = np.asarray(cuis, dtype=str)
+        # Like a dict built in row order, duplicates resolve to their last row
+        keys, first_from_end = np.unique(cuis[::-1], return_index=True)
+        self.keys = keys
+        self.positions = len(cuis) - 1 - first_from_end
+
+    def __call__(self, targets) -> np.ndarray:
+        targets = np.asarray(targets, dtype=str)
+        if len(self.keys) == 0 or len(targets) == 0:
+            return np.full(len(targets), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.keys, targets), len(self.keys) - 1)
+        return np.where(self.keys[pos] == targets, self.positions[pos], -1)
+
+
+def _membership(parent: np.ndarray, child: np.ndarray):
+    """Sort (parent, child) links by parent; return the order, children and each link's group start/size/position."""
+    order = np.argsort(parent, kind="stable")
+    parent, child = parent[order], child[order]
+    _, starts, sizes = np.unique(parent, return_index=True, return_counts=True)
+    group_start = np.repeat(starts, sizes)
+    group_size = np.repeat(sizes, sizes)
+    position = np.arange(len(child)) - group_start
+    return order, child, group_start, group_size, position
+
+
+def sibling_stats(parent: np.ndarray, child: np.ndarray, max_siblings: int = None) -> dict:
+    """Edge counts and edge_index memory for each sibling mode, without materializing any edges."""
+    _, sizes = np.unique(parent, return_counts=True)
+    sizes = sizes.astype(np.int64)
+    full = int((sizes * (sizes - 1)).sum())
+    stats = {
+        "parents_with_siblings": int((sizes > 1).sum()),
+        "max_children": int(sizes.max()) if len(sizes) else 0,
+        "full_edges": full,
+        "full_mb": full * 16 / 2**20,  # two int64 rows per edge
+    }
+    if max_siblings is not None:
+        # Small families keep their full pairs; large ones draw the cap per child, mirrored
+        sampled = int(np.minimum(sizes * (sizes - 1), 2 * sizes * max_siblings).sum())
+        stats.update({"sampled_edges_max": sampled, "sampled_mb_max": sampled * 16 / 2**20})
+    return stats
+
 
-def build_graph(vocab_path: str, add_sibling_edges: bool = True, include_ancestors: bool = True):
+def sibling_pairs(parent: np.ndarray, child: np.ndarray, num_nodes: int) -> np.ndarray:
+    """
+    All ordered (child, child) pairs that share a parent, without self-pairs,
+    computed as the sparse product A·Aᵀ of the child x parent incidence matrix.
+    """
+    if len(parent) == 0:
+        return np.empty((2, 0), dtype=np.int64)
+    incidence = torch.sparse_coo_tensor(
+        torch.from_numpy(np.stack([child, parent])),
+        torch.ones(len(parent)),
+        (num_nodes, num_nodes),
+    ).coalesce()
+    product = torch.sparse.mm(incidence, incidence.t()).coalesce().indices()
+    return product[:, product[0] != product[1]].numpy()
+
+
+def sampled_sibling_pairs(
+    parent: np.ndarray,
+    child: np.ndarray,
+    max_siblings: int,
+    seed: int = 0,
+    only: np.ndarray = None,
+) -> np.ndarray:
+    """
+    Sibling pairs capped at `max_siblings` per child per parent: small families
+    keep every pair, large ones draw random siblings. The result is symmetrized
+    and free of duplicates. `only` is an optional mask of the links to draw
+    siblings for.
+    """
+    order, child, group_start, group_size, position = _membership(parent, child)
+    counts = np.minimum(group_size - 1, max_siblings)
+    drawing = np.ones(len(child), dtype=bool) if only is None else only[order]
+    counts = np.where(drawing, counts, 0)
+    total = int(counts.sum())
+    if total == 0:
+        return np.empty((2, 0), dtype=np.int64)
+
+    rng = np.random.default_rng(seed)
+    size = np.repeat(group_size, counts)
+    small = np.repeat(group_size - 1 <= max_siblings, counts)
+    within = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    offset = np.where(small, within + 1, rng.integers(1, np.maximum(size, 2)))
+    src = np.repeat(child, counts)
+    target = np.repeat(group_start, counts) + (np.repeat(position, counts) + offset) % size
+    dst = child[target]
+
+    # A small family's pair comes out in both directions when both links draw,
+    # so only random draws, and pairs whose partner doesn't draw, are mirrored
+    mirror = ~small | ~drawing[target]
+    src, dst = np.concatenate([src, dst[mirror]]), np.concatenate([dst, src[mirror]])
+    # Random draws can repeat a sibling or coincide with a mirrored pair
+    n = np.int64(child.max()) + 1
+    keys = np.unique(src[src != dst].astype(np.int64) * n + dst[src != dst])
+    return np.stack([keys // n, keys % n])
+
+
+def ancestor_pairs(parent: np.ndarray, child: np.ndarray, num_nodes: int, max_hops: int = None) -> np.ndarray:
+    """
+    Transitive (ancestor, node) pairs two or more hops up the parent graph.
+
+    Equivalent to summing powers of the parent adjacency matrix, done as a
+    frontier join: each hop extends the newest pairs by one parent link and
+    keeps only pairs not seen before, so cycles terminate and every pair is
+    produced once. `max_hops` bounds the distance (None = full closure).
+    """
+    # CSR of each node's parents
+    order = np.argsort(child, kind="stable")
+    parents_of = parent[order].astype(np.int64)
+    ptr = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(child, minlength=num_nodes), out=ptr[1:])
+
+    n = np.int64(num_nodes)
+    seen = np.unique(parent.astype(np.int64) * n + child)
+    frontier_anc, frontier_node = parent.astype(np.int64), child.astype(np.int64)
+    blocks, hops = [], 1
+
+    while len(frontier_anc) and (max_hops is None or hops < max_hops):
+        counts = ptr[frontier_anc + 1] - ptr[frontier_anc]
+        starts = np.repeat(ptr[frontier_anc], counts)
+        within = np.arange(int(counts.sum())) - np.repeat(np.cumsum(counts) - counts, counts)
+        keys = np.unique(parents_of[starts + within] * n + np.repeat(frontier_node, counts))
+        # `seen` stays sorted, so membership and insertion are binary searches rather than re-sorts
+        pos = np.searchsorted(seen, keys)
+        known = seen[np.minimum(pos, len(seen) - 1)] == keys
+        # Drop known pairs and self-pairs from cycles
+        keep = ~known & (keys // n != keys % n)
+        keys, pos = keys[keep], pos[keep]
+        if len(keys) == 0:
+            break
+        seen = np.insert(seen, pos, keys)
+        frontier_anc, frontier_node = keys // n, keys % n
+        blocks.append(np.stack([frontier_anc, frontier_node]))
+        hops += 1
+
+    return np.concatenate(blocks, axis=1) if blocks else np.empty((2, 0), dtype=np.int64)
+
+
+def _ancestor_cache_path(output_path: str) -> str:
+    return f"{os.path.splitext(output_path)[0]}_ancestors.npz"
+
+
+def cached_ancestor_pairs(parent_edges: np.ndarray, num_nodes: int, max_hops: int, cache_path: str) -> np.ndarray:
+    """ancestor_pairs(), reused from `cache_path` while the parent edges and max_hops are unchanged."""
+    digest = hashlib.sha1(np.ascontiguousarray(parent_edges, dtype=np.int64).tobytes())
+    digest.update(f"{num_nodes}:{max_hops}".encode())
+    key = digest.hexdigest()
+
+    if cache_path and os.path.exists(cache_path):
+        with np.load(cache_path, allow_pickle=False) as cached:
+            if str(cached["key"]) == key:
+                print(f"[✓] Loaded {cached['edges'].shape[1]} ancestor edges from {cache_path}")
+                return cached["edges"]
+
+    edges = ancestor_pairs(parent_edges[0], parent_edges[1], num_nodes, max_hops)
+    if cache_path:
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        np.savez(cache_path, key=np.array(key), edges=edges)
+    return edges
+
+
+def metadata_row_hashes(df: pd.DataFrame) -> np.ndarray:
+    """Per-row hash of the columns the graph is built from."""
+    columns = [col for col in GRAPH_COLUMNS if col in df.columns]
+    return pd.util.hash_pandas_object(df[columns].astype(str), index=False).to_numpy(dtype=np.uint64, copy=True)
+
+
+def _cache_plan(graph, cuis: list, row_hashes: np.ndarray, options: dict) -> str:
+    """
+    "reuse" if the cached graph was built from the same rows and options,
+    "extend" if rows were only appended since, otherwise "rebuild".
+    """
+    info = getattr(graph, "build_info", None) if graph is not None else None
+    if not info or info.get("version") != GRAPH_CACHE_VERSION or info.get("options") != options:
+        return "rebuild"
+    old_hashes = graph.row_hashes.numpy().view(np.uint64)
+    old_n = len(old_hashes)
+    if old_n > len(row_hashes) or graph.cuis != cuis[:old_n]:
+        return "rebuild"
+    if not np.array_equal(old_hashes, row_hashes[:old_n]):
+        return "rebuild"
+    return "reuse" if old_n == len(row_hashes) else "extend"
+
+
+def _relation_edges(df: pd.DataFrame, lookup: CUIIndex, column: str, reverse: bool = False) -> np.ndarray:
+    """(target -> row) edges for a relation column, or (row -> target) with `reverse`; unknown CUIs dropped."""
+    rows, targets = relation_targets(df[column])
+    idx = lookup(targets)
+    found = idx >= 0
+    if reverse:
+        return np.stack([rows[found], idx[found]])
+    return np.stack([idx[found], rows[found]])
+
+
+def build_graph(
+    vocab_path: str,
+    add_sibling_edges=True,
+    include_ancestors: bool = True,
+    output_path: str = GRAPH_CACHE,
+    max_siblings: int = 16,
+    seed: int = 0,
+    max_ancestor_hops: int = None,
+    incremental: bool = True,
+    encoder=None,
+    features_dir: Optional[str] = EMBEDDING_DIR,
+):
     """
     Build ontology graph with dense connections (parent/descendant/ancestor/sibling).
     Saves node labels and semantic type colors.
+
+    add_sibling_edges: False for none, True/"full" for every sibling pair, or
+    "sampled" for at most `max_siblings` random siblings per child per parent.
+
+    include_ancestors: add edges from every ancestor two or more hops up
+    (at most `max_ancestor_hops`), taken from an `ancestors` column when the
+    vocab has one and otherwise computed from the parent edges and cached
+    next to the graph.
+
+    With `incremental`, the graph at `output_path` is reused when neither the
+    metadata rows nor the options changed. If rows were only appended (as
+    enrichment does), the new nodes and their edges are added while existing
+    node indices and edges stay as they were.
+
+    Node features (graph.x) are name + definition embeddings from `encoder`
+    (default: load_encoder()), kept in the embedding store under
+    `features_dir`, so only new or edited texts are encoded. With
+    `features_dir=None` the graph has no features.
     """
+    sibling_mode = {False: None, None: None, True: "full"}.get(add_sibling_edges, add_sibling_edges)
+    if sibling_mode not in (None, "full", "sampled"):
+        raise ValueError(f"Unknown sibling mode: {add_sibling_edges!r}")
+    options = {
+        "siblings": sibling_mode,
+        "max_siblings": max_siblings if sibling_mode == "sampled" else None,
+        "seed": seed if sibling_mode == "sampled" else None,
+        "ancestors": include_ancestors,
+        "max_ancestor_hops": max_ancestor_hops if include_ancestors else None,
+    }
+    if features_dir is not None:
+        encoder = encoder if encoder is not None else load_encoder()
+        options["features"] = encoder.name
 
     # --- Load vocab ---
-    df = pd.read_csv(vocab_path)
-    df["parents"] = df["parents"].apply(ast.literal_eval)
-    df["descendants"] = df["descendants"].apply(ast.literal_eval)
-
-    # Ancestors may not exist in dataset-specific vocab (check metadata if needed)
-    if "ancestors" in df.columns:
-        df["ancestors"] = df["ancestors"].apply(ast.literal_eval)
-    else:
-        df["ancestors"] = [[] for _ in range(len(df))]
+    df = pd.read_csv(vocab_path).reset_index(drop=True)
+    num_nodes = len(df)
+    cuis = df["cui"].astype(str).tolist()
+    row_hashes = metadata_row_hashes(df)
+    lookup = CUIIndex(cuis)
 
-    # --- Map CUI to index ---
-    cui_to_idx = {cui: idx for idx, cui in enumerate(df["cui"])}
+    cached = load_graph(output_path, features_dir=features_dir) if incremental else None
+    plan = _cache_plan(cached, cuis, row_hashes, options)
+    if plan == "reuse":
+        if features_dir is not None:
+            # Definitions aren't part of the row hashes, so edited texts only change the features
+            keys = text_keys(concept_texts(df))
+            if cached.x is None or not np.array_equal(cached.text_keys.numpy().view(np.uint64), keys):
+                cached.x = concept_features(df, encoder, features_dir)
+                cached.text_keys = torch.from_numpy(keys.view(np.int64))
+                save_graph(cached, output_path)
+        print(f"[✓] Ontology graph at {output_path} is up to date ({num_nodes} nodes)")
+        return cached
+    old_n = cached.num_nodes if plan == "extend" else 0
 
     # --- Build edges (parent, descendant, ancestor) ---
-    edges = []
-
-    for idx, row in df.iterrows():
-        # Parent edges
-        for parent in row["parents"]:
-            parent_cui = parent.split(", ")[-1].strip("}")
-            if parent_cui in cui_to_idx:
-                edges.append((cui_to_idx[parent_cui], idx))
-
-        # Ancestor edges
-        if include_ancestors:
-            for anc in row["ancestors"]:
-                anc_cui = anc.split(", ")[-1].strip("}")
-                if anc_cui in cui_to_idx:
-                    edges.append((cui_to_idx[anc_cui], idx))
-
-        # Descendant edges
-        for desc in row["descendants"]:
-            desc_cui = desc.split(", ")[-1].strip("}")
-            if desc_cui in cui_to_idx:
-                edges.append((idx, cui_to_idx[desc_cui]))
+    parent_edges = _relation_edges(df, lookup, "parents")
+    desc_edges = _relation_edges(df, lookup, "descendants", reverse=True)
+    # Old rows are unchanged, so only links touching an appended node are new
+    new_parent = (parent_edges >= old_n).any(axis=0)
+    edge_blocks = [parent_edges[:, new_parent], desc_edges[:, (desc_edges >= old_n).any(axis=0)]]
+    type_blocks = [HIERARCHY, HIERARCHY]
+
+    if include_ancestors and "ancestors" in df.columns:
+        edge_blocks.append(_relation_edges(df, lookup, "ancestors"))
+        type_blocks.append(ANCESTOR)
+    elif include_ancestors:
+        # UMLS metadata only lists direct parents, so derive the closure locally.
+        # New parents can connect old nodes too, so the whole closure is merged in.
+        start = time.perf_counter()
+        ancestors = cached_ancestor_pairs(parent_edges, num_nodes, max_ancestor_hops, _ancestor_cache_path(output_path))
+        print(f"[i] {ancestors.shape[1]} ancestor edges ready in {time.perf_counter() - start:.2f}s")
+        edge_blocks.append(ancestors)
+        type_blocks.append(ANCESTOR)
 
     # --- Add sibling edges ---
-    if add_sibling_edges:
-        parent_to_children = defaultdict(list)
-        for idx, row in df.iterrows():
-            for parent in row["parents"]:
-                parent_cui = parent.split(", ")[-1].strip("}")
-                if parent_cui in cui_to_idx:
-                    parent_to_children[parent_cui].append(idx)
-
-        for siblings in parent_to_children.values():
-            for i in range(len(siblings)):
-                for j in range(i + 1, len(siblings)):
-                    edges.append((siblings[i], siblings[j]))
-                    edges.append((siblings[j], siblings[i]))
-
-    if not edges:
+    if sibling_mode is not None:
+        stats = sibling_stats(parent_edges[0], parent_edges[1], options["max_siblings"])
+        print(
+            f"[i] Siblings: {stats['parents_with_siblings']} parents with 2+ children "
+            f"(max {stats['max_children']}); full pairs would be {stats['full_edges']} edges "
+            f"({stats['full_mb']:.1f} MiB)"
+            + (f", sampled at most {stats['sampled_edges_max']} edges ({stats['sampled_mb_max']:.1f} MiB)"
+               if "sampled_edges_max" in stats else "")
+        )
+        if sibling_mode == "full":
+            siblings = sibling_pairs(parent_edges[0], parent_edges[1], num_nodes)
+        else:
+            # Existing samples are kept; only new links draw siblings
+            siblings = sampled_sibling_pairs(parent_edges[0], parent_edges[1], max_siblings, seed, only=new_parent)
+        print(f"[i] Added {siblings.shape[1]} {sibling_mode} sibling edges ({siblings.nbytes / 2**20:.1f} MiB)")
+        edge_blocks.append(siblings)
+        type_blocks.append(SIBLING)
+
+    types = [np.full(block.shape[1], t, dtype=np.int64) for block, t in zip(edge_blocks, type_blocks)]
+    if plan == "extend":
+        edge_blocks.insert(0, cached.edge_index.numpy())
+        types.insert(0, cached.edge_type.numpy().astype(np.int64))
+    edges = np.concatenate(edge_blocks, axis=1)
+    if edges.shape[1] == 0:
         raise ValueError("No edges built from vocab file.")
 
-    edge_index = torch.tensor(edges, dtype=torch.long).t().contiguous()
+    # Parent and descendant lists mirror each other, so drop duplicate edges
+    edge_index, edge_type = coalesce(
+        torch.from_numpy(edges).long(), torch.from_numpy(np.concatenate(types)), num_nodes=num_nodes, reduce="min"
+    )
 
-    # Placeholder node features
-    x = torch.arange(len(df), dtype=torch.float).unsqueeze(1)
+    # Node features, in node order (a zero-copy map of the embedding store)
+    x = concept_features(df, encoder, features_dir) if features_dir is not None else None
 
     # Node labels
-    node_labels = [f"{row['name']} ({row['cui']})" for _, row in df.iterrows()]
+    node_labels = (df["name"].fillna("N/A").astype(str) + " (" + df["cui"].astype(str) + ")").tolist()
 
-    # Semantic type colors
-    semantic_types = df["semantic_type"].fillna("Unknown").unique().tolist()
-    color_map = {stype: i for i, stype in enumerate(semantic_types)}
-    node_colors = [color_map[row["semantic_type"]] for _, row in df.iterrows()]
+    # Semantic type colors (in order of first appearance, so appended rows never recolor old ones)
+    node_colors, semantic_types = pd.factorize(df["semantic_type"].fillna("Unknown"))
 
     # Build graph object
     graph = Data(
         x=x,
         edge_index=edge_index,
         node_labels=node_labels,
-        node_colors=torch.tensor(node_colors, dtype=torch.long),
+        node_colors=torch.from_numpy(node_colors).long(),
     )
+    graph.edge_type = edge_type.to(torch.uint8)
+    graph.semantic_types = list(semantic_types)
+    graph.cuis = cuis
+    graph.row_hashes = torch.from_numpy(row_hashes.view(np.int64))
+    graph.num_nodes = num_nodes
+    graph.build_info = {"version": GRAPH_CACHE_VERSION, "options": options, "num_nodes": num_nodes}
+    if x is not None:
+        graph.text_keys = torch.from_numpy(text_keys(concept_texts(df)).view(np.int64))
+        graph.build_info["features"] = {"encoder": encoder.name, "dim": encoder.dim}
 
-    torch.save(graph, GRAPH_CACHE)
-    print(f"[✓] Saved ontology graph with dense edges to {GRAPH_CACHE}")
+    save_graph(graph, output_path)
+    if plan == "extend":
+        print(
+            f"[✓] Extended ontology graph by {num_nodes - old_n} nodes and "
+            f"{edge_index.size(1) - cached.edge_index.size(1)} edges; saved {edge_index.size(1)} edges to {output_path}"
+        )
+    else:
+        print(f"[✓] Saved ontology graph with {edge_index.size(1)} edges to {output_path}")
 
     return graph
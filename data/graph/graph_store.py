@@ -0,0 +1,95 @@
+# data/graph/graph_store.py
+"""
+On-disk format for the ontology graph, replacing a pickled torch.save of
+the Data object. A graph is a directory of plain arrays and string tables:
+  edge_index.npy                 int64 [2, num_edges]
+  edge_type.npy                  uint8 per edge (see build_graph.EDGE_TYPES)
+  node_colors.npy                int64 semantic type code per node
+  row_hashes.npy                 uint64 metadata row hash per node
+  text_keys.npy                  uint64 name + definition hash per node (graphs with features)
+  node_labels / cuis             string tables (offsets + UTF-8 blob), one entry per node
+  semantic_types                 string table, indexed by node_colors
+  manifest.json                  format version, sizes and build info
+Nothing is unpickled on load, and the arrays can be memory-mapped. Node
+features are not stored here: graph.x is mapped from the embedding store
+(data/graph/node_features) by the nodes' text keys.
+"""
+import os
+import shutil
+from typing import Optional
+
+import numpy as np
+import torch
+from torch_geometric.data import Data
+
+from data.columnar import read_manifest, read_string_table, save_array, write_manifest, write_string_table
+from data.graph.node_features import EMBEDDING_DIR, stored_features
+
+GRAPH_FORMAT_VERSION = 3
+
+
+def save_graph(graph: Data, directory: str) -> str:
+    """Write `graph` to `directory`, replacing it atomically."""
+    tmp_dir = f"{directory}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    save_array(os.path.join(tmp_dir, "edge_index.npy"), graph.edge_index.numpy())
+    save_array(os.path.join(tmp_dir, "edge_type.npy"), graph.edge_type.numpy())
+    save_array(os.path.join(tmp_dir, "node_colors.npy"), graph.node_colors.numpy())
+    save_array(os.path.join(tmp_dir, "row_hashes.npy"), graph.row_hashes.numpy().view(np.uint64))
+    if getattr(graph, "text_keys", None) is not None:
+        save_array(os.path.join(tmp_dir, "text_keys.npy"), graph.text_keys.numpy().view(np.uint64))
+    write_string_table(os.path.join(tmp_dir, "node_labels"), graph.node_labels)
+    write_string_table(os.path.join(tmp_dir, "cuis"), graph.cuis)
+    write_string_table(os.path.join(tmp_dir, "semantic_types"), graph.semantic_types)
+    write_manifest(tmp_dir, {
+        "version": GRAPH_FORMAT_VERSION,
+        "num_nodes": graph.num_nodes,
+        "num_edges": graph.edge_index.size(1),
+        "build_info": graph.build_info,
+    })
+
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp_dir, directory)
+    return directory
+
+
+def _load_tensor(path: str, mmap: bool, dtype=None) -> torch.Tensor:
+    # Copy-on-write maps are writable, so torch can wrap them without copying
+    array = np.load(path, mmap_mode="c" if mmap else None, allow_pickle=False)
+    return torch.from_numpy(array if dtype is None else array.view(dtype))
+
+
+def load_graph(directory: str, mmap: bool = True, features_dir: Optional[str] = EMBEDDING_DIR) -> Optional[Data]:
+    """
+    Load a graph saved by save_graph(); None if it is missing or in an older
+    format. graph.x is mapped from the embedding store under `features_dir`,
+    and is None if the graph was built without features, `features_dir` is
+    None, or the store no longer holds every node's text.
+    """
+    manifest = read_manifest(directory) if os.path.isdir(directory) else None
+    if manifest is None or manifest.get("version") != GRAPH_FORMAT_VERSION:
+        return None
+
+    graph = Data(
+        edge_index=_load_tensor(os.path.join(directory, "edge_index.npy"), mmap),
+        node_labels=read_string_table(os.path.join(directory, "node_labels"), mmap=mmap),
+        node_colors=_load_tensor(os.path.join(directory, "node_colors.npy"), mmap),
+    )
+    graph.edge_type = _load_tensor(os.path.join(directory, "edge_type.npy"), mmap)
+    graph.semantic_types = read_string_table(os.path.join(directory, "semantic_types"), mmap=mmap)
+    graph.cuis = read_string_table(os.path.join(directory, "cuis"), mmap=mmap)
+    graph.row_hashes = _load_tensor(os.path.join(directory, "row_hashes.npy"), mmap, np.int64)
+    graph.build_info = manifest["build_info"]
+    graph.num_nodes = manifest["num_nodes"]
+
+    features = graph.build_info.get("features")
+    if features:
+        graph.text_keys = _load_tensor(os.path.join(directory, "text_keys.npy"), mmap, np.int64)
+        if features_dir is not None:
+            keys = graph.text_keys.numpy().view(np.uint64)
+            graph.x = stored_features(keys, features["encoder"], features["dim"], features_dir)
+            if graph.x is None:
+                print(f"[!] {os.path.join(features_dir, features['encoder'])} lacks features for {directory}; rebuild the graph")
+    return graph
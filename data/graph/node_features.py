@@ -0,0 +1,282 @@
+# data/graph/node_features.py
+"""
+Text features for ontology nodes: each concept's name + definition is
+encoded into a fixed-size vector and kept in an on-disk embedding store,
+keyed by a hash of the text, so only new or changed concepts are encoded.
+
+A store is a directory per encoder:
+  vectors.bin      float32 [count, dim], appended in encoding order
+  keys.npy         uint64 text hash per row
+  manifest.json    format version, encoder name, dim and row count
+"""
+import hashlib
+import os
+import re
+import time
+import zlib
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+import torch
+
+from data.columnar import load_array, read_manifest, save_array, write_manifest
+
+EMBEDDING_DIR = os.path.join("data", "embeddings")
+EMBEDDING_DIM = 768
+EMBEDDING_STORE_VERSION = 1
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def concept_texts(frame: pd.DataFrame) -> List[str]:
+    """'name. definition' per concept (just the name when there is no definition)."""
+    names = frame["name"].fillna("").astype(str)
+    definitions = frame["definition"].fillna("").astype(str)
+    definitions = definitions.where(~definitions.isin(["", "N/A"]), "")
+    return np.where(definitions == "", names, names + ". " + definitions).tolist()
+
+
+def text_keys(texts: List[str]) -> np.ndarray:
+    """64-bit content hash per text."""
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(t.encode("utf-8"), digest_size=8).digest(), "little") for t in texts),
+        dtype=np.uint64,
+        count=len(texts),
+    )
+
+
+class HashingEncoder:
+    """
+    Deterministic bag of unigrams and bigrams hashed into `dim` signed
+    buckets, L2-normalized. Needs no model files.
+    """
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        rows, cols, signs = [], [], []
+        for i, text in enumerate(texts):
+            tokens = _TOKEN.findall(text.lower())
+            for feature in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]:
+                h = zlib.crc32(feature.encode("utf-8"))
+                rows.append(i)
+                cols.append(h % self.dim)
+                signs.append(1.0 if (h // self.dim) & 1 else -1.0)
+
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        np.add.at(out, (np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64)), signs)
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        return out / np.maximum(norms, 1e-12)
+
+
+class TransformerEncoder:
+    """Mean-pooled hidden states of a local Hugging Face model, on CPU, without network access."""
+
+    def __init__(self, model_path: str, max_length: int = 128, device: str = "cpu"):
+        from transformers import AutoModel, AutoTokenizer
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path, local_files_only=True)
+        self.model = AutoModel.from_pretrained(model_path, local_files_only=True).to(device).eval()
+        self.max_length = max_length
+        self.device = device
+        self.dim = self.model.config.hidden_size
+        self.name = f"hf-{os.path.basename(os.path.normpath(model_path))}"
+
+    @torch.inference_mode()
+    def encode(self, texts: List[str]) -> np.ndarray:
+        batch = self.tokenizer(
+            texts, padding=True, truncation=True, max_length=self.max_length, return_tensors="pt"
+        ).to(self.device)
+        hidden = self.model(**batch).last_hidden_state
+        mask = batch["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+        pooled = (hidden * mask).sum(1) / mask.sum(1).clamp(min=1)
+        return pooled.float().cpu().numpy()
+
+
+def load_encoder(model_path: Optional[str] = None, dim: int = EMBEDDING_DIM):
+    """
+    A TransformerEncoder for a local model directory, else the HashingEncoder
+    fallback (also used when `transformers` isn't installed; it is optional
+    and not in requirements.txt).
+    """
+    if model_path:
+        try:
+            return TransformerEncoder(model_path)
+        except ImportError as e:
+            print(f"[!] Can't load {model_path} ({e}); install transformers to use it. Using the hashing encoder.")
+    return HashingEncoder(dim)
+
+
+def _store_manifest(directory: str, dim: int) -> Optional[dict]:
+    manifest = read_manifest(directory) if os.path.isdir(directory) else None
+    if manifest is None or manifest.get("version") != EMBEDDING_STORE_VERSION or manifest.get("dim") != dim:
+        return None
+    return manifest
+
+
+class EmbeddingStore:
+    """
+    Append-only store of text vectors keyed by text hash, read through a
+    memory map. A `readonly` store never creates, resets or trims files, and
+    raises FileNotFoundError if there is no store for `dim`.
+    """
+
+    def __init__(self, directory: str, dim: int, readonly: bool = False):
+        self.directory = directory
+        self.dim = dim
+        self.readonly = readonly
+        self._vectors_path = os.path.join(directory, "vectors.bin")
+        self._keys_path = os.path.join(directory, "keys.npy")
+
+        manifest = _store_manifest(directory, dim)
+        if manifest is None:
+            if readonly:
+                raise FileNotFoundError(f"No {dim}-d embedding store at {directory}")
+            os.makedirs(directory, exist_ok=True)
+            self._reset()
+            manifest = read_manifest(directory)
+        self.count = manifest["count"]
+        self.keys = load_array(self._keys_path, mmap=False)[:self.count]
+        if not readonly:
+            # Rows appended after the last manifest write belong to an interrupted run
+            with open(self._vectors_path, "r+b") as f:
+                f.truncate(self.count * dim * 4)
+        self._index()
+
+    def _check_writable(self):
+        if self.readonly:
+            raise PermissionError(f"Embedding store {self.directory} was opened read-only")
+
+    def _reset(self):
+        open(self._vectors_path, "wb").close()
+        save_array(self._keys_path, np.empty(0, dtype=np.uint64))
+        self._write_manifest(0)
+
+    def _write_manifest(self, count: int):
+        write_manifest(self.directory, {"version": EMBEDDING_STORE_VERSION, "dim": self.dim, "count": count})
+
+    def _index(self):
+        # Sorted view for lookups, rebuilt lazily after appends
+        self._order, self._sorted = None, None
+
+    def __len__(self) -> int:
+        return self.count
+
+    def lookup(self, keys: np.ndarray) -> np.ndarray:
+        """Row of each key, -1 where it has not been encoded."""
+        keys = np.asarray(keys, dtype=np.uint64)
+        if self.count == 0:
+            return np.full(len(keys), -1, dtype=np.int64)
+        if self._sorted is None:
+            self._order = np.argsort(self.keys, kind="stable")
+            self._sorted = self.keys[self._order]
+        pos = np.minimum(np.searchsorted(self._sorted, keys), self.count - 1)
+        return np.where(self._sorted[pos] == keys, self._order[pos], -1).astype(np.int64)
+
+    def add(self, keys: np.ndarray, vectors: np.ndarray):
+        self._check_writable()
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if vectors.shape != (len(keys), self.dim):
+            raise ValueError(f"Expected vectors of shape ({len(keys)}, {self.dim}), got {vectors.shape}")
+        with open(self._vectors_path, "ab") as f:
+            f.write(vectors.tobytes())
+        self.keys = np.concatenate([self.keys, np.asarray(keys, dtype=np.uint64)])
+        self.count = len(self.keys)
+        save_array(self._keys_path, self.keys)
+        self._write_manifest(self.count)
+        self._index()
+
+    def vectors(self) -> np.ndarray:
+        """All vectors as a copy-on-write memory map (writable for torch, never written back)."""
+        if self.count == 0:
+            return np.empty((0, self.dim), dtype=np.float32)
+        return np.memmap(self._vectors_path, dtype=np.float32, mode="c", shape=(self.count, self.dim))
+
+    def compact(self, keys: np.ndarray):
+        """Rewrite the store to hold exactly `keys` (all already encoded), in that order."""
+        self._check_writable()
+        rows = self.lookup(keys)
+        if (rows < 0).any():
+            raise KeyError("compact() needs every key to be in the store")
+        tmp_path = f"{self._vectors_path}.tmp"
+        vectors = self.vectors()
+        with open(tmp_path, "wb") as f:
+            for start in range(0, len(rows), 8192):
+                f.write(np.ascontiguousarray(vectors[rows[start:start + 8192]]).tobytes())
+        del vectors
+        os.replace(tmp_path, self._vectors_path)
+        self.keys = np.asarray(keys, dtype=np.uint64).copy()
+        self.count = len(self.keys)
+        save_array(self._keys_path, self.keys)
+        self._write_manifest(self.count)
+        self._index()
+
+
+def concept_features(
+    frame: pd.DataFrame,
+    encoder=None,
+    store_dir: str = EMBEDDING_DIR,
+    batch_size: int = 256,
+) -> torch.Tensor:
+    """
+    Feature matrix for the concepts in `frame` (cui/name/definition rows in
+    node order). Texts not yet in the store are encoded in batches and
+    appended; the result is a zero-copy view of the store's memory map.
+    """
+    encoder = encoder if encoder is not None else load_encoder()
+    store = EmbeddingStore(os.path.join(store_dir, encoder.name), encoder.dim)
+
+    texts = concept_texts(frame)
+    keys = text_keys(texts)
+    rows = store.lookup(keys)
+    # Duplicate texts are encoded per node so that appended nodes stay contiguous in the store
+    todo = np.flatnonzero(rows < 0)
+
+    if len(todo):
+        print(f"[→] Encoding {len(todo)} of {len(texts)} concepts with {encoder.name}...")
+        start = time.perf_counter()
+        for i in range(0, len(todo), batch_size):
+            batch = todo[i:i + batch_size]
+            store.add(keys[batch], encoder.encode([texts[j] for j in batch]))
+        elapsed = time.perf_counter() - start
+        rate = len(todo) / elapsed if elapsed > 0 else float("inf")
+        print(f"[✓] Encoded {len(todo)} concepts in {elapsed:.1f}s ({rate:,.0f}/s)")
+        rows = store.lookup(keys)
+
+    # Appends keep node order, so the nodes are usually one contiguous run of the store;
+    # otherwise (edited or removed concepts) rewrite it in node order once
+    if _contiguous_start(store, keys, rows) is None:
+        print(f"[i] Compacting embedding store {store.directory} to node order")
+        store.compact(keys)
+    return _node_view(store, keys, store.lookup(keys))
+
+
+def stored_features(keys: np.ndarray, encoder_name: str, dim: int, store_dir: str = EMBEDDING_DIR) -> Optional[torch.Tensor]:
+    """
+    Features for nodes with these text keys from an existing store, without
+    encoding or rewriting anything; None if the store lacks any of them.
+    """
+    directory = os.path.join(store_dir, encoder_name)
+    if _store_manifest(directory, dim) is None:
+        return None
+    store = EmbeddingStore(directory, dim, readonly=True)
+    rows = store.lookup(keys)
+    if (rows < 0).any():
+        return None
+    return _node_view(store, keys, rows)
+
+
+def _contiguous_start(store: EmbeddingStore, keys: np.ndarray, rows: np.ndarray) -> Optional[int]:
+    start = int(rows[0]) if len(rows) else 0
+    return start if np.array_equal(store.keys[start:start + len(keys)], keys) else None
+
+
+def _node_view(store: EmbeddingStore, keys: np.ndarray, rows: np.ndarray) -> torch.Tensor:
+    """Zero-copy view when the nodes are one run of the store, else a gathered copy."""
+    start = _contiguous_start(store, keys, rows)
+    if start is None:
+        return torch.from_numpy(np.ascontiguousarray(store.vectors()[rows]))
+    return torch.from_numpy(store.vectors()[start:start + len(keys)])
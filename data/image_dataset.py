@@ -0,0 +1,258 @@
+# data/image_dataset.py
+"""
+Images + concept targets for training: a Dataset over the preprocessed
+frames (image_path, concepts) that decodes and resizes X-rays in DataLoader
+workers and turns concepts into multi-hot targets over the CUI vocab.
+
+Resized images can be packed once into an ImageShardStore, a directory of
+memory-mapped uint8 shards, so later epochs skip PNG decoding:
+  shard_00000.u8 ...   raw uint8 [n, 1, size, size] per shard
+  ok.npy               bool per image, False where decoding failed
+  manifest.json        image size, shard size, count and a hash of the paths
+"""
+import hashlib
+import os
+import shutil
+import time
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+import torch
+from torch.utils.data import DataLoader, Dataset
+
+from data.columnar import load_array, read_manifest, save_array, write_manifest
+
+IMAGE_SIZE = 224
+SHARD_SIZE = 4096
+SHARD_STORE_VERSION = 1
+
+
+def load_concept_vocab(vocab_paths: Iterable[str]) -> Dict[str, int]:
+    """CUI -> target index over one or more vocab CSVs from build_cui_vocabs, in order of appearance."""
+    cuis = pd.concat([pd.read_csv(path, usecols=["cui"])["cui"] for path in vocab_paths]).astype(str)
+    return {cui: i for i, cui in enumerate(cuis.drop_duplicates())}
+
+
+def concept_csr(concept_lists: Iterable[List[str]], vocab: Dict[str, int]):
+    """CSR (offsets, target ids) of each sample's concepts; CUIs outside the vocab are dropped."""
+    lists = pd.Series(list(concept_lists), dtype=object)
+    exploded = lists.explode()
+    ids = exploded.map(vocab)
+    known = ids.notna().to_numpy()
+    rows = np.asarray(exploded.index)[known]
+    counts = np.bincount(rows, minlength=len(lists))
+    offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+    return offsets, ids.to_numpy()[known].astype(np.int64)
+
+
+def decode_resize(path: str, size: int = IMAGE_SIZE) -> torch.Tensor:
+    """Decode a PNG/JPEG as grayscale and resize it to uint8 [1, size, size]."""
+    from torchvision.io import ImageReadMode, decode_image, read_file
+    from torchvision.transforms.v2 import functional as TF
+
+    image = decode_image(read_file(path), mode=ImageReadMode.GRAY)
+    # PadChest PNGs are 16-bit; scale them down to 8 bits
+    image = TF.to_dtype(image, torch.uint8, scale=True)
+    return TF.resize(image, [size, size], antialias=True)
+
+
+def _paths_key(paths: List[str]) -> str:
+    digest = hashlib.sha1()
+    for path in paths:
+        digest.update(path.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _as_list(items):
+    return items
+
+
+class _DecodeDataset(Dataset):
+    """(index, image, ok) per path; used to decode in parallel workers while packing shards."""
+
+    def __init__(self, paths: List[str], size: int):
+        self.paths = paths
+        self.size = size
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, i):
+        try:
+            return i, decode_resize(self.paths[i], self.size), True
+        except (OSError, RuntimeError) as e:
+            print(f"[!] Failed to decode {self.paths[i]}: {e}")
+            return i, torch.zeros(1, self.size, self.size, dtype=torch.uint8), False
+
+
+class ImageShardStore:
+    """Read side of a packed image store: shard-local memory maps indexed by frame row."""
+
+    def __init__(self, directory: str):
+        manifest = read_manifest(directory)
+        if manifest is None or manifest.get("version") != SHARD_STORE_VERSION:
+            raise FileNotFoundError(f"No image shard store at {directory}")
+        self.directory = directory
+        self.size = manifest["image_size"]
+        self.shard_size = manifest["shard_size"]
+        self.count = manifest["count"]
+        self.paths_key = manifest["paths_key"]
+        self.ok = load_array(os.path.join(directory, "ok.npy"))
+        self._shards = {}
+
+    def __len__(self):
+        return self.count
+
+    def matches(self, paths: List[str], size: int) -> bool:
+        return self.size == size and self.count == len(paths) and self.paths_key == _paths_key(paths)
+
+    def _shard(self, s: int) -> np.ndarray:
+        # Opened lazily per process, so DataLoader workers map their own views
+        if s not in self._shards:
+            n = min(self.shard_size, self.count - s * self.shard_size)
+            path = os.path.join(self.directory, f"shard_{s:05d}.u8")
+            self._shards[s] = np.memmap(path, dtype=np.uint8, mode="r", shape=(n, 1, self.size, self.size))
+        return self._shards[s]
+
+    def __getitem__(self, i: int) -> torch.Tensor:
+        shard, offset = divmod(i, self.shard_size)
+        return torch.from_numpy(np.array(self._shard(shard)[offset]))
+
+    def __getstate__(self):
+        # Don't ship open maps to workers
+        state = self.__dict__.copy()
+        state["_shards"] = {}
+        return state
+
+    @staticmethod
+    def pack(
+        paths: List[str],
+        directory: str,
+        size: int = IMAGE_SIZE,
+        shard_size: int = SHARD_SIZE,
+        num_workers: int = os.cpu_count() or 1,
+    ) -> "ImageShardStore":
+        """Decode and resize every image on `num_workers` processes and write the shards."""
+        paths = list(paths)
+        tmp_dir = f"{directory}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        loader = DataLoader(
+            _DecodeDataset(paths, size),
+            batch_size=256,
+            num_workers=num_workers,
+            collate_fn=_as_list,
+        )
+        ok = np.zeros(len(paths), dtype=bool)
+        shard, shard_file = -1, None
+        start = time.perf_counter()
+        # Batches arrive in order, so images are written sequentially
+        for batch in loader:
+            for i, image, decoded in batch:
+                if i // shard_size != shard:
+                    if shard_file is not None:
+                        shard_file.close()
+                    shard = i // shard_size
+                    shard_file = open(os.path.join(tmp_dir, f"shard_{shard:05d}.u8"), "wb")
+                shard_file.write(image.numpy().tobytes())
+                ok[i] = decoded
+        if shard_file is not None:
+            shard_file.close()
+        elapsed = time.perf_counter() - start
+
+        save_array(os.path.join(tmp_dir, "ok.npy"), ok)
+        write_manifest(tmp_dir, {
+            "version": SHARD_STORE_VERSION,
+            "image_size": size,
+            "shard_size": shard_size,
+            "count": len(paths),
+            "paths_key": _paths_key(paths),
+        })
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(tmp_dir, directory)
+
+        rate = len(paths) / elapsed if elapsed > 0 else float("inf")
+        print(
+            f"[✓] Packed {len(paths)} images into {directory} in {elapsed:.1f}s "
+            f"({rate:,.0f} decodes/s, {num_workers} workers); {int((~ok).sum())} failed"
+        )
+        return ImageShardStore(directory)
+
+
+class XRayDataset(Dataset):
+    """
+    (image uint8 [1, size, size], multi-hot float target) per row of a
+    preprocessed frame. Images come from `shards` when given and built
+    from the same paths, otherwise they are decoded on the fly.
+    """
+
+    def __init__(
+        self,
+        frame: pd.DataFrame,
+        vocab: Dict[str, int],
+        image_size: int = IMAGE_SIZE,
+        shards: Optional[ImageShardStore] = None,
+    ):
+        self.paths = frame["image_path"].astype(str).tolist()
+        self.offsets, self.target_ids = concept_csr(frame["concepts"], vocab)
+        self.num_classes = len(vocab)
+        self.image_size = image_size
+        if shards is not None and not shards.matches(self.paths, image_size):
+            print(f"[!] Image shards at {shards.directory} don't match this frame; decoding PNGs instead")
+            shards = None
+        self.shards = shards
+
+    def __len__(self):
+        return len(self.paths)
+
+    def target(self, i: int) -> torch.Tensor:
+        target = torch.zeros(self.num_classes)
+        target[torch.from_numpy(self.target_ids[self.offsets[i]:self.offsets[i + 1]])] = 1.0
+        return target
+
+    def image(self, i: int) -> torch.Tensor:
+        if self.shards is not None:
+            return self.shards[i]
+        try:
+            return decode_resize(self.paths[i], self.image_size)
+        except (OSError, RuntimeError) as e:
+            print(f"[!] Failed to decode {self.paths[i]}: {e}")
+            return torch.zeros(1, self.image_size, self.image_size, dtype=torch.uint8)
+
+    def __getitem__(self, i: int):
+        return self.image(i), self.target(i)
+
+
+def make_loader(
+    dataset: XRayDataset,
+    batch_size: int = 64,
+    shuffle: bool = True,
+    num_workers: int = os.cpu_count() or 1,
+    **kwargs,
+) -> DataLoader:
+    """DataLoader with decoding in persistent worker processes."""
+    return DataLoader(
+        dataset,
+        batch_size=batch_size,
+        shuffle=shuffle,
+        num_workers=num_workers,
+        persistent_workers=num_workers > 0,
+        prefetch_factor=4 if num_workers > 0 else None,
+        **kwargs,
+    )
+
+
+def measure_loader(loader: DataLoader, max_batches: Optional[int] = None, label: str = "loader") -> float:
+    """Iterate `loader` and report samples/s; returns the rate."""
+    samples, start = 0, time.perf_counter()
+    for b, (images, _) in enumerate(loader):
+        samples += images.size(0)
+        if max_batches is not None and b + 1 >= max_batches:
+            break
+    elapsed = time.perf_counter() - start
+    rate = samples / elapsed if elapsed > 0 else float("inf")
+    print(f"[i] {label}: {samples} samples in {elapsed:.1f}s ({rate:,.0f} samples/s)")
+    return rate
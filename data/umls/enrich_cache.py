@@ -1,73 +1,120 @@
+import json
 import os
-import pandas as pd
-import ast
+import time
 from data.umls.uts_client import UMLSClient
+from data.umls.metadata_store import MetadataStore
+from data.umls.source_ui_cache import SourceUICache
 
-CACHE_PATH = os.path.join("data", "umls", "cui_metadata_cache.csv")
+CHECKPOINT_PATH = os.path.join("data", "umls", "enrich_frontier.json")
 
 
-def enrich_metadata_cache(api_key: str):
+def _load_checkpoint(path: str):
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return None
+
+
+def _save_checkpoint(path: str, depth: int, frontier: list, added: int):
+    if not path:
+        return
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"depth": depth, "added": added, "frontier": frontier}, f)
+    os.replace(tmp_path, path)
+
+
+def enrich_metadata_cache(
+    api_key: str,
+    store: MetadataStore = None,
+    max_depth: int = None,
+    max_nodes: int = None,
+    max_workers: int = None,
+    checkpoint_path: str = CHECKPOINT_PATH,
+    source_ui_cache: SourceUICache = None,
+):
     """
-    Iteratively enrich cui_metadata_cache.csv by adding parent CUIs
-    not already present in the cache. Saves each new CUI incrementally.
-    Stops when no new parents are discovered.
+    Enrich the metadata store by climbing the parent hierarchy breadth-first.
+
+    Each level's missing parent CUIs are fetched concurrently, and only the
+    concepts added in that level are examined for the next frontier. Limits:
+    `max_depth` levels and `max_nodes` new concepts per call. The current
+    frontier is checkpointed before each level, so an interrupted run
+    resumes from that level. `source_ui_cache` defaults to the client's
+    persistent cache.
     """
-    if not os.path.exists(CACHE_PATH):
-        raise FileNotFoundError(f"Metadata cache not found: {CACHE_PATH}")
-
-    # Load cache as dictionary
-    cache_df = pd.read_csv(CACHE_PATH, dtype=str).fillna("")
-    cache = {}
-    for _, row in cache_df.iterrows():
-        cache[row["cui"]] = {
-            "cui": row["cui"],
-            "name": row["name"],
-            "definition": row["definition"],
-            "semantic_type": row["semantic_type"],
-            "parents": ast.literal_eval(row["parents"]) if row["parents"] else [],
-            "descendants": ast.literal_eval(row["descendants"]) if row["descendants"] else [],
-        }
-
-    client = UMLSClient(api_key)
-
-    # Iteratively add parents until no new CUIs
-    while True:
-        current_cuis = set(cache.keys())
-        new_cuis_to_add = set()
-
-        # Collect parent CUIs missing from cache
-        for cui, meta in cache.items():
-            for parent in meta["parents"]:
-                parent_cui = parent.split(", ")[-1].strip("}")
-                if parent_cui not in current_cuis and parent_cui != "N/A":
-                    new_cuis_to_add.add(parent_cui)
-
-        if not new_cuis_to_add:
-            print("[✓] No new parent CUIs found. Cache enrichment complete.")
-            break
-
-        print(f"[→] Found {len(new_cuis_to_add)} new parent CUIs. Fetching metadata...")
-
-        # Fetch and save each new CUI incrementally
-        for parent_cui in sorted(new_cuis_to_add):
-            if parent_cui in cache:
-                continue
-            try:
-                meta = client.get_concept_metadata(parent_cui)
-                cache[parent_cui] = meta
-
-                # Save immediately
-                new_row = {
-                    "cui": parent_cui,
-                    "name": meta["name"],
-                    "definition": meta["definition"],
-                    "semantic_type": meta["semantic_type"],
-                    "parents": str(meta["parents"]),
-                    "descendants": str(meta["descendants"]),
-                }
-                pd.DataFrame([new_row]).to_csv(
-                    CACHE_PATH, mode="a", header=False, index=False
-                )
-
-            except Exception as e:
-                print(f"[!] Failed to fetch metadata for {parent_cui}: {e}")
\ No newline at end of file
+    store = store if store is not None else MetadataStore()
+    if len(store) == 0:
+        raise FileNotFoundError(f"Metadata store is empty: {store.path}")
+
+    checkpoint = _load_checkpoint(checkpoint_path)
+    if checkpoint:
+        # Concepts stored since the checkpoint (before the interruption, or by other
+        # writers such as build_vocabs) still need their parents expanded; the anti-join
+        # over the whole store covers both, so a resumed run reaches the same fixed point
+        depth, added = checkpoint["depth"], checkpoint["added"]
+        frontier = sorted(set(store.missing(checkpoint["frontier"])) | set(store.missing_parents()))
+        print(f"[→] Resuming enrichment at level {depth + 1} with {len(frontier)} frontier CUIs")
+    else:
+        depth, added = 0, 0
+        frontier = store.missing_parents()
+
+    client = None
+    failed = set()
+    start = time.perf_counter()
+
+    try:
+        while frontier:
+            if max_depth is not None and depth >= max_depth:
+                print(f"[i] Reached max_depth={max_depth}; {len(frontier)} parent CUIs left unfetched.")
+                break
+            if max_nodes is not None and added >= max_nodes:
+                print(f"[i] Reached max_nodes={max_nodes}; {len(frontier)} parent CUIs left unfetched.")
+                break
+
+            level = frontier if max_nodes is None else frontier[:max_nodes - added]
+            _save_checkpoint(checkpoint_path, depth, frontier, added)
+            depth += 1
+
+            print(f"[→] Level {depth}: fetching {len(level)} parent CUIs...")
+            if client is None:
+                client = UMLSClient(api_key, source_ui_cache=source_ui_cache)
+
+            level_start = time.perf_counter()
+            fetched = []
+            with store.writer() as writer:
+                for i, (parent_cui, meta, err) in enumerate(client.iter_concept_metadata(level, max_workers=max_workers)):
+                    if err is not None:
+                        print(f"[!] Failed to fetch metadata for {parent_cui}: {err}")
+                        failed.add(parent_cui)
+                    else:
+                        writer.put(meta)
+                        fetched.append(parent_cui)
+                    if (i + 1) % 50 == 0:
+                        print(f"  ...processed {i+1}/{len(level)}")
+            added += len(fetched)
+            elapsed = time.perf_counter() - level_start
+
+            # Expand only the concepts added in this level
+            leftover = frontier[len(level):]
+            new_parents = [cui for cui in store.missing_parents(fetched) if cui not in failed]
+            frontier = sorted(set(leftover) | set(new_parents))
+
+            rate = len(level) / elapsed if elapsed > 0 else float("inf")
+            print(
+                f"[✓] Level {depth}: added {len(fetched)}/{len(level)} in {elapsed:.1f}s "
+                f"({rate:.1f} CUIs/s); {len(new_parents)} new parents discovered"
+            )
+    finally:
+        if client is not None:
+            print(f"[i] UMLS {client.summary()}")
+            client.close()
+
+    if not frontier:
+        print("[✓] No new parent CUIs found. Cache enrichment complete.")
+    print(f"[i] Enrichment added {added} concepts over {depth} levels in {time.perf_counter() - start:.1f}s")
+
+    if checkpoint_path and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    return added
@@ -0,0 +1,266 @@
+# data/umls/metadata_store.py
+import ast
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional
+
+import pandas as pd
+
+METADATA_DB_PATH = os.path.join("data", "umls", "cui_metadata.sqlite")
+METADATA_CSV_PATH = os.path.join("data", "umls", "cui_metadata_cache.csv")
+
+COLUMNS = ["cui", "name", "definition", "semantic_type", "parents", "descendants"]
+RELATIONS = ("parents", "descendants")
+
+# Relation entries are stored as "{(name), CUI}" strings
+_ENTRY_RE = re.compile(r"^\{\((.*)\), ([^,]*)\}$", re.S)
+
+# SQLite limits the number of bound parameters per statement
+_SQL_BATCH = 900
+
+
+def parse_entry(entry: str):
+    """Split "{(name), CUI}" into (name, CUI); (entry, None) if it doesn't match."""
+    m = _ENTRY_RE.match(entry)
+    return (m.group(1), m.group(2)) if m else (entry, None)
+
+
+def format_entry(name: str, target: Optional[str]) -> str:
+    return name if target is None else f"{{({name}), {target}}}"
+
+
+def _chunks(items: List[str], size: int = _SQL_BATCH):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class MetadataStore:
+    """
+    SQLite store for UMLS concept metadata (WAL mode).
+    Concepts keep their insertion order, like rows of the legacy CSV.
+
+    Concepts are indexed by CUI and their parent/descendant entries live in
+    normalized edge tables, so callers load only the rows they ask for.
+    Writes are batched into transactions. The legacy CSV cache is imported
+    automatically the first time the store is opened.
+    """
+
+    def __init__(self, path: str = METADATA_DB_PATH, legacy_csv: Optional[str] = METADATA_CSV_PATH):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS concepts ("
+                " cui TEXT PRIMARY KEY, name TEXT, definition TEXT, semantic_type TEXT)"
+            )
+            for rel in RELATIONS:
+                self._conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {rel} ("
+                    " cui TEXT NOT NULL, pos INTEGER NOT NULL, name TEXT NOT NULL, target TEXT,"
+                    " PRIMARY KEY (cui, pos)) WITHOUT ROWID"
+                )
+                self._conn.execute(f"CREATE INDEX IF NOT EXISTS {rel}_target ON {rel} (target)")
+
+        if legacy_csv and len(self) == 0 and os.path.exists(legacy_csv):
+            n = self.import_csv(legacy_csv)
+            print(f"[✓] Imported {n} concepts from {legacy_csv} into {path}")
+
+    # === Reads
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM concepts").fetchone()[0]
+
+    def __contains__(self, cui: str) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM concepts WHERE cui = ?", (cui,)).fetchone() is not None
+
+    def cuis(self) -> List[str]:
+        with self._lock:
+            return [r[0] for r in self._conn.execute("SELECT cui FROM concepts ORDER BY rowid")]
+
+    def missing(self, cuis: Iterable[str]) -> List[str]:
+        """Return the CUIs (in input order) that are not stored yet."""
+        wanted = list(dict.fromkeys(cuis))
+        present = set()
+        with self._lock:
+            for chunk in _chunks(wanted):
+                marks = ",".join("?" * len(chunk))
+                present.update(r[0] for r in self._conn.execute(
+                    f"SELECT cui FROM concepts WHERE cui IN ({marks})", chunk
+                ))
+        return [cui for cui in wanted if cui not in present]
+
+    def missing_parents(self, cuis: Optional[Iterable[str]] = None) -> List[str]:
+        """Parent CUIs referenced by stored concepts (or only by `cuis`) that are not stored themselves."""
+        query = (
+            "SELECT DISTINCT p.target FROM parents p"
+            " LEFT JOIN concepts c ON c.cui = p.target"
+            " WHERE c.cui IS NULL AND p.target IS NOT NULL AND p.target != 'N/A'"
+        )
+        found = set()
+        with self._lock:
+            if cuis is None:
+                found.update(r[0] for r in self._conn.execute(query))
+            else:
+                for chunk in _chunks(list(dict.fromkeys(cuis))):
+                    marks = ",".join("?" * len(chunk))
+                    found.update(r[0] for r in self._conn.execute(f"{query} AND p.cui IN ({marks})", chunk))
+        return sorted(found)
+
+    def _relations(self, rel: str, cuis: Optional[List[str]]) -> Dict[str, List[str]]:
+        out = {}
+        if cuis is None:
+            rows = self._conn.execute(f"SELECT cui, name, target FROM {rel} ORDER BY cui, pos")
+        else:
+            rows = []
+            for chunk in _chunks(cuis):
+                marks = ",".join("?" * len(chunk))
+                rows.extend(self._conn.execute(
+                    f"SELECT cui, name, target FROM {rel} WHERE cui IN ({marks}) ORDER BY cui, pos", chunk
+                ))
+        for cui, name, target in rows:
+            out.setdefault(cui, []).append(format_entry(name, target))
+        return out
+
+    def get_many(self, cuis: Optional[Iterable[str]] = None) -> Dict[str, dict]:
+        """Load metadata dicts for `cuis` (all concepts if None); unknown CUIs are skipped."""
+        wanted = None if cuis is None else list(dict.fromkeys(cuis))
+        with self._lock:
+            if wanted is None:
+                rows = list(self._conn.execute("SELECT cui, name, definition, semantic_type FROM concepts ORDER BY rowid"))
+            else:
+                rows = []
+                for chunk in _chunks(wanted):
+                    marks = ",".join("?" * len(chunk))
+                    rows.extend(self._conn.execute(
+                        f"SELECT cui, name, definition, semantic_type FROM concepts WHERE cui IN ({marks})", chunk
+                    ))
+            relations = {rel: self._relations(rel, wanted) for rel in RELATIONS}
+
+        found = {}
+        for cui, name, definition, semantic_type in rows:
+            found[cui] = {
+                "cui": cui,
+                "name": name,
+                "definition": definition,
+                "semantic_type": semantic_type,
+                "parents": relations["parents"].get(cui, []),
+                "descendants": relations["descendants"].get(cui, []),
+            }
+        if wanted is None:
+            return found
+        return {cui: found[cui] for cui in wanted if cui in found}
+
+    def get(self, cui: str) -> Optional[dict]:
+        return self.get_many([cui]).get(cui)
+
+    def to_frame(self, cuis: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        """Metadata as a DataFrame with list-valued parents/descendants columns."""
+        rows = list(self.get_many(cuis).values())
+        return pd.DataFrame(rows, columns=COLUMNS)
+
+    # === Writes
+    def put_many(self, metas: Iterable[dict]) -> int:
+        """Insert or replace concepts (and their edges) in one transaction."""
+        metas = list(metas)
+        if not metas:
+            return 0
+        cuis = [m["cui"] for m in metas]
+        concept_rows = [(m["cui"], m["name"], m["definition"], m["semantic_type"]) for m in metas]
+        edge_rows = {
+            rel: [
+                (m["cui"], pos, *parse_entry(entry))
+                for m in metas
+                for pos, entry in enumerate(m[rel])
+            ]
+            for rel in RELATIONS
+        }
+        with self._lock, self._conn:
+            for chunk in _chunks(cuis):
+                marks = ",".join("?" * len(chunk))
+                for rel in RELATIONS:
+                    self._conn.execute(f"DELETE FROM {rel} WHERE cui IN ({marks})", chunk)
+            self._conn.executemany(
+                "INSERT INTO concepts (cui, name, definition, semantic_type) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (cui) DO UPDATE SET"
+                " name = excluded.name, definition = excluded.definition, semantic_type = excluded.semantic_type",
+                concept_rows,
+            )
+            for rel in RELATIONS:
+                self._conn.executemany(
+                    f"INSERT INTO {rel} (cui, pos, name, target) VALUES (?, ?, ?, ?)", edge_rows[rel]
+                )
+        return len(metas)
+
+    def put(self, meta: dict):
+        self.put_many([meta])
+
+    def writer(self, batch_size: int = 50) -> "BatchWriter":
+        return BatchWriter(self, batch_size)
+
+    # === CSV compatibility
+    def import_csv(self, csv_path: str = METADATA_CSV_PATH, chunksize: int = 5000) -> int:
+        """Import a legacy cui_metadata_cache.csv (list columns stored as Python reprs)."""
+        total = 0
+        for chunk in pd.read_csv(csv_path, dtype=str, chunksize=chunksize):
+            chunk = chunk.fillna("").drop_duplicates("cui", keep="last")
+            metas = []
+            for rec in chunk.to_dict("records"):
+                for rel in RELATIONS:
+                    rec[rel] = ast.literal_eval(rec[rel]) if rec[rel] else []
+                metas.append(rec)
+            total += self.put_many(metas)
+        return total
+
+    def export_csv(self, csv_path: str = METADATA_CSV_PATH, cuis: Optional[Iterable[str]] = None) -> str:
+        """Write the legacy CSV layout (list columns as Python reprs) atomically."""
+        df = self.to_frame(cuis)
+        for rel in RELATIONS:
+            df[rel] = df[rel].apply(str)
+        tmp_path = f"{csv_path}.tmp"
+        df.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, csv_path)
+        return csv_path
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class BatchWriter:
+    """Buffers put() calls and commits them `batch_size` rows at a time."""
+
+    def __init__(self, store: MetadataStore, batch_size: int = 50):
+        self.store = store
+        self.batch_size = batch_size
+        self._buffer = []
+        self.written = 0
+
+    def put(self, meta: dict):
+        self._buffer.append(meta)
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        self.written += self.store.put_many(self._buffer)
+        self._buffer = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
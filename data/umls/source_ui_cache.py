@@ -0,0 +1,115 @@
+# data/umls/source_ui_cache.py
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+SOURCE_UI_CACHE_PATH = os.path.join("data", "umls", "source_ui_cache.sqlite")
+
+# SQLite limits the number of bound parameters per statement
+_SQL_BATCH = 400
+
+Key = Tuple[str, str]      # (sourceUi, rootSource)
+Value = Tuple[str, str]    # (name, CUI)
+
+
+class SourceUICache:
+    """
+    Persistent (sourceUi, rootSource) -> (name, CUI) lookup table.
+
+    Backed by SQLite so resolutions survive across runs, with an in-memory
+    LRU in front of it for the hot set. Unresolvable IDs are stored too
+    (CUI "N/A") so they are not searched for again.
+    """
+
+    def __init__(self, path: str = SOURCE_UI_CACHE_PATH, lru_size: int = 50_000):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.lru_size = lru_size
+        self._lock = threading.Lock()
+        self._lru = OrderedDict()
+        self.stats = {"lru_hits": 0, "db_hits": 0, "misses": 0, "stored": 0}
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS source_ui ("
+            " ui TEXT NOT NULL, sab TEXT NOT NULL, name TEXT NOT NULL, cui TEXT NOT NULL,"
+            " PRIMARY KEY (ui, sab)) WITHOUT ROWID"
+        )
+        self._conn.commit()
+
+    def _remember(self, key: Key, value: Value):
+        self._lru[key] = value
+        self._lru.move_to_end(key)
+        if len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def get_many(self, keys: Iterable[Key]) -> Dict[Key, Value]:
+        """Look up many keys at once: LRU first, then one batched query per chunk."""
+        found = {}
+        pending = []
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                value = self._lru.get(key)
+                if value is not None:
+                    self._lru.move_to_end(key)
+                    found[key] = value
+                    self.stats["lru_hits"] += 1
+                else:
+                    pending.append(key)
+
+            for start in range(0, len(pending), _SQL_BATCH):
+                chunk = pending[start:start + _SQL_BATCH]
+                clause = " OR ".join(["(ui = ? AND sab = ?)"] * len(chunk))
+                params = [part for key in chunk for part in key]
+                for ui, sab, name, cui in self._conn.execute(
+                    f"SELECT ui, sab, name, cui FROM source_ui WHERE {clause}", params
+                ):
+                    found[(ui, sab)] = (name, cui)
+                    self._remember((ui, sab), (name, cui))
+
+            db_hits = sum(1 for key in pending if key in found)
+            self.stats["db_hits"] += db_hits
+            self.stats["misses"] += len(pending) - db_hits
+        return found
+
+    def get(self, ui: str, sab: str) -> Optional[Value]:
+        return self.get_many([(ui, sab)]).get((ui, sab))
+
+    def put_many(self, items: Dict[Key, Value]):
+        """Store resolutions in a single transaction."""
+        if not items:
+            return
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO source_ui (ui, sab, name, cui) VALUES (?, ?, ?, ?)",
+                    [(ui, sab, name, cui) for (ui, sab), (name, cui) in items.items()],
+                )
+            for key, value in items.items():
+                self._remember(key, value)
+            self.stats["stored"] += len(items)
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM source_ui").fetchone()[0]
+
+    def hit_rate(self) -> float:
+        hits = self.stats["lru_hits"] + self.stats["db_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
+
+    def summary(self) -> str:
+        s = self.stats
+        return (
+            f"source-UI cache hit rate={self.hit_rate():.1%} "
+            f"(lru={s['lru_hits']}, db={s['db_hits']}, misses={s['misses']}, stored={s['stored']})"
+        )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
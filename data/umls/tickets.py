@@ -0,0 +1,203 @@
+# data/umls/tickets.py
+import threading
+import time
+from collections import deque
+
+TGT_LIFETIME = 8 * 60 * 60  # UTS ticket-granting tickets are valid for 8 hours
+ST_LIFETIME = 5 * 60        # service tickets expire 5 minutes after issue
+ST_SAFETY_MARGIN = 30       # don't hand out pooled STs this close to expiry
+PREFETCH_BACKOFF = 1.0      # first retry delay after a failed prefetch, doubled per consecutive failure
+PREFETCH_MAX_BACKOFF = 60.0
+
+
+class TicketManager:
+    """
+    Issues single-use UMLS service tickets (STs) from a prefetched pool.
+
+    Background threads keep up to `pool_size` fresh STs ready so a lookup
+    does not pay an extra auth round trip before every REST call. The TGT is
+    renewed `renew_margin` seconds before it expires, or immediately when the
+    auth server rejects it. A prefetch worker that fails backs off
+    exponentially; after `max_prefetch_failures` failures in a row
+    prefetching stops and get() issues tickets inline, which raises if auth
+    is still failing. The first inline success restarts prefetching, so an
+    outage doesn't end a long run.
+    """
+
+    def __init__(
+        self,
+        session,
+        auth_url: str,
+        api_key: str,
+        service: str,
+        pool_size: int = 16,
+        prefetch_workers: int = 4,
+        tgt_lifetime: float = TGT_LIFETIME,
+        st_lifetime: float = ST_LIFETIME,
+        renew_margin: float = 300.0,
+        timeout: float = 30.0,
+        max_prefetch_failures: int = 6,
+    ):
+        self.session = session
+        self.auth_url = auth_url
+        self.api_key = api_key
+        self.service = service
+        self.pool_size = pool_size
+        self.tgt_lifetime = tgt_lifetime
+        self.st_lifetime = st_lifetime
+        self.renew_margin = renew_margin
+        self.timeout = timeout
+        self.max_prefetch_failures = max_prefetch_failures
+
+        self.stats = {
+            "tickets_issued": 0,
+            "tickets_used": 0,
+            "tickets_expired": 0,
+            "tickets_rejected": 0,
+            "pool_misses": 0,
+            "auth_round_trips": 0,
+            "tgt_renewals": 0,
+            "prefetch_restarts": 0,
+        }
+        self._stats_lock = threading.Lock()
+        self._tgt_lock = threading.Lock()
+        self._pool = deque()
+        self._cond = threading.Condition()
+        self._inflight = 0
+        self._closed = False
+        self._prefetch_error = None  # set when prefetching gave up
+
+        self.tgt = None
+        self._tgt_deadline = 0.0
+        self._renew_tgt()
+
+        self.prefetch_workers = prefetch_workers if pool_size > 0 else 0
+        self._workers = []
+        self._start_workers()
+
+    def _start_workers(self):
+        # Workers from before a stop may still be finishing their backoff; top up to the target count
+        self._workers = [t for t in self._workers if t.is_alive()]
+        for i in range(len(self._workers), self.prefetch_workers):
+            t = threading.Thread(target=self._prefetch_loop, name=f"umls-st-prefetch-{i}", daemon=True)
+            t.start()
+            self._workers.append(t)
+
+    def _count(self, key: str, n: int = 1):
+        with self._stats_lock:
+            self.stats[key] += n
+
+    # === TGT handling
+    def _renew_tgt(self, stale: str = None):
+        """Fetch a new TGT unless another thread already replaced `stale`."""
+        with self._tgt_lock:
+            if stale is not None and self.tgt != stale:
+                return self.tgt
+            r = self.session.post(self.auth_url, data={"apikey": self.api_key}, timeout=self.timeout)
+            self._count("auth_round_trips")
+            if r.status_code != 201:
+                raise RuntimeError("Failed to authenticate with UMLS API")
+            if self.tgt is not None:
+                self._count("tgt_renewals")
+            self.tgt = r.headers["location"].split("/")[-1]
+            self._tgt_deadline = time.monotonic() + self.tgt_lifetime - self.renew_margin
+            return self.tgt
+
+    def _current_tgt(self) -> str:
+        tgt = self.tgt
+        if time.monotonic() >= self._tgt_deadline:
+            tgt = self._renew_tgt(stale=tgt)
+        return tgt
+
+    # === ST handling
+    def _issue(self) -> str:
+        """POST for a new service ticket, renewing the TGT once if it was rejected."""
+        for attempt in range(2):
+            tgt = self._current_tgt()
+            r = self.session.post(f"{self.auth_url}/{tgt}", data={"service": self.service}, timeout=self.timeout)
+            self._count("auth_round_trips")
+            if r.status_code == 200:
+                self._count("tickets_issued")
+                return r.text
+            if attempt == 0 and r.status_code in (400, 401, 404):
+                self._renew_tgt(stale=tgt)
+                continue
+            break
+        raise RuntimeError("Failed to obtain service ticket")
+
+    def _stopped(self) -> bool:
+        return self._closed or self._prefetch_error is not None
+
+    def _prefetch_loop(self):
+        failures = 0
+        while True:
+            with self._cond:
+                # Count in-flight requests so several workers don't overshoot the pool size
+                while not self._stopped() and len(self._pool) + self._inflight >= self.pool_size:
+                    self._cond.wait()
+                if self._stopped():
+                    return
+                self._inflight += 1
+            try:
+                ticket, error = self._issue(), None
+            except Exception as e:
+                ticket, error = None, e
+            with self._cond:
+                self._inflight -= 1
+                if ticket is not None:
+                    self._pool.append((ticket, time.monotonic()))
+                    failures = 0
+                else:
+                    failures += 1
+                    if failures >= self.max_prefetch_failures:
+                        # Persistent failure (e.g. a revoked key): stop every worker
+                        self._prefetch_error = error
+                self._cond.notify_all()
+                if ticket is None:
+                    # Back off, waking early on close()
+                    self._cond.wait_for(self._stopped, min(PREFETCH_BACKOFF * 2 ** (failures - 1), PREFETCH_MAX_BACKOFF))
+
+    def get(self) -> str:
+        """
+        Return a fresh single-use service ticket, issuing one inline if the
+        pool is empty.
+        """
+        now = time.monotonic()
+        with self._cond:
+            while self._pool:
+                ticket, issued = self._pool.popleft()
+                self._cond.notify_all()
+                if now - issued < self.st_lifetime - ST_SAFETY_MARGIN:
+                    self._count("tickets_used")
+                    return ticket
+                self._count("tickets_expired")
+        self._count("pool_misses")
+        ticket = self._issue()
+        self._count("tickets_used")
+        with self._cond:
+            if self._prefetch_error is not None and not self._closed:
+                # Auth works again after prefetching gave up
+                self._prefetch_error = None
+                self._count("prefetch_restarts")
+                self._start_workers()
+        return ticket
+
+    def reject(self):
+        """Record that the server refused a ticket handed out by get()."""
+        self._count("tickets_rejected")
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for t in self._workers:
+            t.join(timeout=self.timeout)
+
+    def summary(self) -> str:
+        s = dict(self.stats)
+        return (
+            f"tickets issued={s['tickets_issued']} used={s['tickets_used']} "
+            f"(pool misses={s['pool_misses']}, expired={s['tickets_expired']}, rejected={s['tickets_rejected']}), "
+            f"auth round trips={s['auth_round_trips']}, TGT renewals={s['tgt_renewals']}"
+            + (f", prefetch restarts={s['prefetch_restarts']}" if s["prefetch_restarts"] else "")
+        )
@@ -1,66 +1,173 @@
 # data/umls/uts_client.py
+import os
 import requests
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from data.umls.tickets import TicketManager
+from data.umls.source_ui_cache import SourceUICache
+from utils import profiling
+from typing import Iterable, Iterator, Optional, Tuple
 
 UMLS_AUTH_URL = "https://utslogin.nlm.nih.gov/cas/v1/api-key"
 UMLS_API_BASE = "https://uts-ws.nlm.nih.gov/rest"
 SERVICE = "http://umlsks.nlm.nih.gov"
 
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+REJECTED_TICKET_STATUSES = (401, 403)
+
 class UMLSClient:
-    def __init__(self, api_key: str):
+    def __init__(
+        self,
+        api_key: str,
+        auth_url: Optional[str] = None,
+        api_base: Optional[str] = None,
+        max_workers: int = 8,
+        max_retries: int = 5,
+        backoff_factor: float = 0.5,
+        timeout: float = 30.0,
+        ticket_pool_size: int = 16,
+        prefetch_workers: int = 4,
+        source_ui_cache: Optional[SourceUICache] = None,
+    ):
         self.api_key = api_key
-        self.tgt = self._get_tgt()
+        # UMLS_AUTH_URL / UMLS_API_BASE can redirect the client, e.g. to benchmarks/stub_umls
+        self.auth_url = auth_url or os.getenv("UMLS_AUTH_URL", UMLS_AUTH_URL)
+        self.api_base = api_base or os.getenv("UMLS_API_BASE", UMLS_API_BASE)
+        self.max_workers = max_workers
+        self.timeout = timeout
+        # One connection per thread that can be mid-request: the iter_concept_metadata workers,
+        # the source UI search pool they fan out to, and the ticket prefetchers
+        self.session = self._make_session(2 * max_workers + prefetch_workers, max_retries, backoff_factor)
+        self.tickets = TicketManager(
+            self.session,
+            self.auth_url,
+            api_key,
+            SERVICE,
+            pool_size=ticket_pool_size,
+            prefetch_workers=prefetch_workers,
+            timeout=timeout,
+        )
+        # A cache passed in belongs to the caller, who may share it across clients
+        self._owns_source_ui_cache = source_ui_cache is None
+        self.source_ui_cache = source_ui_cache if source_ui_cache is not None else SourceUICache()
+        self._search_pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="umls-search")
 
-    def _get_tgt(self):
-        """Get Ticket Granting Ticket (TGT) from UMLS."""
-        r = requests.post(UMLS_AUTH_URL, data={"apikey": self.api_key})
-        if r.status_code == 201:
-            return r.headers["location"].split("/")[-1]
-        else:
-            raise RuntimeError("Failed to authenticate with UMLS API")
+    def close(self):
+        self._search_pool.shutdown(wait=True)
+        self.tickets.close()
+        profiling.add_counters("umls_tickets", self.tickets.stats)
+        profiling.add_counters("umls_source_ui_cache", self.source_ui_cache.stats)
+        self.session.close()
+        if self._owns_source_ui_cache:
+            self.source_ui_cache.close()
 
-    def _get_st(self):
-        """Get Service Ticket (ST) using TGT."""
-        r = requests.post(
-            f"{UMLS_AUTH_URL}/{self.tgt}",
-            data={"service": SERVICE}
+    def summary(self) -> str:
+        return f"{self.tickets.summary()}; {self.source_ui_cache.summary()}"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @staticmethod
+    def _make_session(pool_size: int, max_retries: int, backoff_factor: float) -> requests.Session:
+        """Pooled session with exponential backoff on 429/5xx (honours Retry-After)."""
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset({"GET", "POST"}),
+            respect_retry_after_header=True,
+            raise_on_status=False,
         )
-        if r.status_code == 200:
-            return r.text
-        else:
-            raise RuntimeError("Failed to obtain service ticket")
-        
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, pool_block=True, max_retries=retry)
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        # Per-endpoint call counts and latencies when a run is being profiled
+        session.hooks["response"].append(profiling.http_hook)
+        return session
+
+    def _get(self, url: str, params: Optional[dict] = None) -> requests.Response:
+        """Ticketed GET; a rejected service ticket is replaced and the request retried once."""
+        params = dict(params or {})
+        for _ in range(2):
+            params["ticket"] = self.tickets.get()
+            r = self.session.get(url, params=params, timeout=self.timeout)
+            if r.status_code not in REJECTED_TICKET_STATUSES:
+                break
+            self.tickets.reject()
+        return r
+
+    def _get_json(self, url: str, params: Optional[dict] = None):
+        """Ticketed GET of a JSON payload; raises once retries on 429/5xx are exhausted."""
+        r = self._get(url, params)
+        if r.status_code in RETRY_STATUSES:
+            r.raise_for_status()
+        return r.json()
+
+    def _get_st(self):
+        """Get a Service Ticket (ST) from the prefetch pool."""
+        return self.tickets.get()
+
+    def _search_source_ui(self, ui: str, sabs: str):
+        """Map a source UI to (name, CUI) via /search; None when the request failed."""
+        params = {
+            "string": ui,
+            "inputType": "sourceUi",
+            "sabs": sabs,
+            "searchType": "exact",
+        }
+        resp = self._get(f"{self.api_base}/search/current", params)
+        if not resp.ok:
+            return None
+        results = resp.json().get("result", {}).get("results", [])
+        if results:
+            return results[0]["name"], results[0]["ui"]
+        return None, "N/A"
+
+    def resolve_entries(self, entries) -> list:
+        """
+        Format parent/descendant entries as "{(name), CUI}" strings.
+        Non-CUI source UIs are looked up in the persistent cache first; the
+        remaining misses are searched concurrently and stored in one batch.
+        """
+        keys = [(e.get("ui", "N/A"), e.get("rootSource", "N/A")) for e in entries]
+        lookup_set = {key for key in keys if not key[0].startswith("C")}
+        known = self.source_ui_cache.get_many(lookup_set)
+
+        misses = {}
+        for entry, key in zip(entries, keys):
+            if key in lookup_set and key not in known:
+                misses.setdefault(key, entry.get("name", "N/A"))
+        if misses:
+            futures = {key: self._search_pool.submit(self._search_source_ui, *key) for key in misses}
+            fresh = {}
+            for key, future in futures.items():
+                result = future.result()
+                if result is not None:
+                    name, cui = result
+                    fresh[key] = (name if name is not None else misses[key], cui)
+            self.source_ui_cache.put_many(fresh)
+            known.update(fresh)
+
+        formatted = []
+        for entry, (ui, sabs) in zip(entries, keys):
+            name = entry.get("name", "N/A")
+            if (ui, sabs) in known:
+                name, ui = known[(ui, sabs)]
+            formatted.append(f"{{({name}), {ui}}}")
+        return formatted
+
     def resolve_name_and_cui(self, entry) -> str:
-        ui = entry.get("ui", "N/A")
-        name = entry.get("name", "N/A")
-        sabs = entry.get("rootSource", "N/A")
-        if not ui.startswith("C"):
-            search_url = f"{UMLS_API_BASE}/search/current"
-            st = self._get_st()
-            params = {
-                "string": ui,
-                "inputType": "sourceUi",
-                "sabs": sabs,
-                "searchType": "exact",
-                "ticket": st,
-            }
-            resp = requests.get(search_url, params=params)
-            if resp.ok:
-                results = resp.json().get("result", {}).get("results", [])
-                if results:
-                    name = results[0]["name"] 
-                    cui = results[0]["ui"]
-                else:  
-                    cui = "N/A"
-                return f"{{({name}), {cui}}}"
-        return f"{{({name}), {ui}}}"            
+        return self.resolve_entries([entry])[0]
 
     def get_concept_metadata(self, cui: str) -> dict:
-        st = self._get_st()
-
         # === Step 1: Concept
-        concept_url = f"{UMLS_API_BASE}/content/current/CUI/{cui}"
-        concept = requests.get(concept_url, params={"ticket": st}).json().get("result", {})
+        concept_url = f"{self.api_base}/content/current/CUI/{cui}"
+        concept = self._get_json(concept_url).get("result", {})
         name = concept.get("name", "N/A")
         semantic = "; ".join([stype.get("name", "") for stype in concept.get("semanticTypes", [])])
 
@@ -68,8 +175,7 @@ class UMLSClient:
         def_url = concept.get("definitions")
         definition = "No description provided"
         if def_url and def_url != "NONE":
-            st = self._get_st()
-            defs = requests.get(def_url, params={"ticket": st}).json().get("result", [])
+            defs = self._get_json(def_url).get("result", [])
             msh_defs = [d for d in defs if d.get("rootSource") == "MSH"]
             if msh_defs:
                 definition = msh_defs[0].get("value", definition)
@@ -78,8 +184,7 @@ class UMLSClient:
 
         # === Step 3: Atoms → SourceDescriptor
         atoms_url = concept.get("atoms")
-        st = self._get_st()
-        atoms = requests.get(atoms_url, params={"ticket": st}).json().get("result", [])
+        atoms = self._get_json(atoms_url).get("result", [])
         src_desc_url = None
 
         for atom in atoms:
@@ -100,13 +205,12 @@ class UMLSClient:
 
         if src_desc_url:
             try:
-                st = self._get_st()
-                parent_entries = requests.get(f"{src_desc_url}/parents", params={"ticket": st}).json().get("result", [])
-                st = self._get_st()
-                descendant_entries = requests.get(f"{src_desc_url}/descendants", params={"ticket": st}).json().get("result", [])
+                parent_entries = self._get_json(f"{src_desc_url}/parents").get("result", [])
+                descendant_entries = self._get_json(f"{src_desc_url}/descendants").get("result", [])
 
-                parents = [self.resolve_name_and_cui(p) for p in parent_entries]
-                descendants = [self.resolve_name_and_cui(d) for d in descendant_entries]
+                resolved = self.resolve_entries(parent_entries + descendant_entries)
+                parents = resolved[:len(parent_entries)]
+                descendants = resolved[len(parent_entries):]
             except Exception as e:
                 print(f"[!] Failed to fetch parents/descendants for {cui}: {e}")
 
@@ -118,3 +222,34 @@ class UMLSClient:
             "parents": parents,
             "descendants": descendants,
         }
+
+    def iter_concept_metadata(
+        self, cuis: Iterable[str], max_workers: Optional[int] = None
+    ) -> Iterator[Tuple[str, Optional[dict], Optional[Exception]]]:
+        """
+        Fetch metadata for many CUIs concurrently over the pooled session.
+        Yields (cui, meta, error) in completion order so callers can persist
+        each result as soon as it arrives.
+        """
+        unique = list(dict.fromkeys(cuis))
+        if not unique:
+            return
+        workers = max(1, min(max_workers or self.max_workers, len(unique)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(self.get_concept_metadata, cui): cui for cui in unique}
+            for future in as_completed(futures):
+                cui = futures[future]
+                try:
+                    yield cui, future.result(), None
+                except Exception as e:
+                    yield cui, None, e
+
+    def get_concept_metadata_many(self, cuis: Iterable[str], max_workers: Optional[int] = None) -> dict:
+        """Batch version of get_concept_metadata. Returns {cui: meta}; failed CUIs are omitted."""
+        results = {}
+        for cui, meta, err in self.iter_concept_metadata(cuis, max_workers=max_workers):
+            if err is not None:
+                print(f"[!] Failed to fetch {cui}: {err}")
+                continue
+            results[cui] = meta
+        return results
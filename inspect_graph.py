@@ -1,51 +1,158 @@
+import argparse
+
+import numpy as np
 import torch
-from torch_geometric.data import Data
-from torch_geometric.data.data import DataEdgeAttr
-import networkx as nx
-import matplotlib.pyplot as plt
+from torch_geometric.utils import k_hop_subgraph, to_undirected
 
-GRAPH_PATH = "data/graph/ontology_graph.pt"
+from data.graph.graph_store import load_graph
 
-def main():
-    # Allowlist PyG objects for torch.load (required in PyTorch 2.6+)
-    torch.serialization.add_safe_globals([Data, DataEdgeAttr])
+GRAPH_PATH = "data/graph/ontology_graph"
 
-    # Load saved graph
-    graph = torch.load(GRAPH_PATH, weights_only=False)
 
-    # Convert to NetworkX for visualization
-    nx_graph = nx.Graph()
+def connected_components(edge_index: torch.Tensor, num_nodes: int) -> torch.Tensor:
+    """
+    Weakly connected component label per node (the smallest node id in it),
+    by min-label propagation with pointer jumping.
+    """
+    labels = torch.arange(num_nodes)
+    if edge_index.numel() == 0:
+        return labels
+    src, dst = to_undirected(edge_index, num_nodes=num_nodes)
+    while True:
+        # Pull the smallest label across every edge, then jump to the label's own label
+        updated = labels.scatter_reduce(0, dst, labels[src], reduce="amin")
+        updated = updated[updated]
+        if torch.equal(updated, labels):
+            return labels
+        labels = updated
 
-    # --- Add nodes with labels and colors ---
-    node_labels = getattr(graph, "node_labels", [str(i) for i in range(graph.num_nodes)])
-    node_colors = getattr(graph, "node_colors", torch.zeros(graph.num_nodes, dtype=torch.long))
 
-    for i in range(graph.num_nodes):
-        nx_graph.add_node(i, label=node_labels[i], color=node_colors[i].item())
+def graph_stats(graph) -> dict:
+    """Size, degree distribution, components, isolated nodes and semantic type counts, all from edge_index."""
+    n, edge_index = graph.num_nodes, graph.edge_index
+    out_deg = torch.bincount(edge_index[0], minlength=n)
+    in_deg = torch.bincount(edge_index[1], minlength=n)
+    degree = (out_deg + in_deg).numpy()
 
-    # --- Add edges ---
-    for src, dst in graph.edge_index.t().tolist():
-        nx_graph.add_edge(src, dst)
+    components = connected_components(edge_index, n)
+    sizes = torch.bincount(components, minlength=n)
+    sizes = sizes[sizes > 0].sort(descending=True).values
+
+    colors = graph.node_colors.numpy()
+    types = list(getattr(graph, "semantic_types", [])) or [str(c) for c in range(int(colors.max()) + 1 if n else 0)]
+    type_counts = dict(zip(types, np.bincount(colors, minlength=len(types)).tolist()))
+
+    # Degree histogram over power-of-two bins: 0, 1, 2-3, 4-7, ...
+    bins = np.where(degree > 0, np.floor(np.log2(np.maximum(degree, 1))).astype(int) + 1, 0)
+    histogram = {
+        ("0" if b == 0 else "1" if b == 1 else f"{2 ** (b - 1)}-{2 ** b - 1}"): int(c)
+        for b, c in enumerate(np.bincount(bins)) if c
+    }
+
+    labels = getattr(graph, "node_labels", None)
+    top = np.argsort(-degree, kind="stable")[:10]
+    return {
+        "nodes": n,
+        "edges": edge_index.size(1),
+        "self_loops": int((edge_index[0] == edge_index[1]).sum()),
+        "degree": {
+            "mean": float(degree.mean()) if n else 0.0,
+            "median": float(np.median(degree)) if n else 0.0,
+            "p99": float(np.percentile(degree, 99)) if n else 0.0,
+            "max": int(degree.max()) if n else 0,
+            "histogram": histogram,
+        },
+        "top_degree": [(labels[i] if labels is not None else int(i), int(degree[i])) for i in top],
+        "components": len(sizes),
+        "largest_components": sizes[:5].tolist(),
+        "isolated": int((degree == 0).sum()),
+        "semantic_types": dict(sorted(type_counts.items(), key=lambda kv: -kv[1])),
+    }
+
+
+def print_stats(stats: dict):
+    deg = stats["degree"]
+    print(f"[i] Nodes: {stats['nodes']}  Edges: {stats['edges']}  Self-loops: {stats['self_loops']}")
+    print(f"[i] Degree: mean {deg['mean']:.2f}, median {deg['median']:.0f}, p99 {deg['p99']:.0f}, max {deg['max']}")
+    print("    " + ", ".join(f"{b}: {c}" for b, c in deg["histogram"].items()))
+    print("[i] Highest degree: " + ", ".join(f"{label} [{d}]" for label, d in stats["top_degree"][:5]))
+    print(f"[i] Components: {stats['components']} (largest {stats['largest_components']}); isolated nodes: {stats['isolated']}")
+    print("[i] Semantic types:")
+    for name, count in stats["semantic_types"].items():
+        print(f"    {count:>8}  {name}")
+
+
+def khop_nodes(graph, cuis, hops: int = 1, max_nodes: int = 200, seed: int = 0) -> torch.Tensor:
+    """Nodes within `hops` of the given CUIs (either edge direction), sampled down to `max_nodes`."""
+    index = {cui: i for i, cui in enumerate(graph.cuis)}
+    missing = [cui for cui in cuis if cui not in index]
+    if missing:
+        print(f"[!] CUIs not in graph: {', '.join(missing)}")
+    centers = torch.tensor([index[cui] for cui in cuis if cui in index], dtype=torch.long)
+    if centers.numel() == 0:
+        raise ValueError("None of the requested CUIs are in the graph.")
+
+    edge_index = to_undirected(graph.edge_index, num_nodes=graph.num_nodes)
+    subset, _, _, _ = k_hop_subgraph(centers, hops, edge_index, num_nodes=graph.num_nodes)
+    if subset.numel() > max_nodes:
+        others = subset[~torch.isin(subset, centers)]
+        generator = torch.Generator().manual_seed(seed)
+        keep = others[torch.randperm(others.numel(), generator=generator)[:max(max_nodes - centers.numel(), 0)]]
+        subset = torch.cat([centers, keep]).unique()
+    return subset
 
-    # --- Layout ---
-    pos = nx.spring_layout(nx_graph, seed=42, k=0.3)  # `k` controls spacing
 
-    # --- Draw nodes with semantic-type colors ---
-    colors = [data["color"] for _, data in nx_graph.nodes(data=True)]
+def draw_subgraph(graph, subset: torch.Tensor, output_path: str):
+    """Draw the subgraph induced by `subset` and save it to `output_path` (no window is opened)."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import networkx as nx
+    from torch_geometric.utils import subgraph
+
+    edge_index, _ = subgraph(subset, graph.edge_index, relabel_nodes=True, num_nodes=graph.num_nodes)
+    nodes = subset.tolist()
+    nx_graph = nx.Graph()
+    nx_graph.add_nodes_from(range(len(nodes)))
+    nx_graph.add_edges_from(edge_index.t().tolist())
+
+    pos = nx.spring_layout(nx_graph, seed=42, k=0.3)  # `k` controls spacing
+    plt.figure(figsize=(12, 12))
     nx.draw(
         nx_graph, pos,
         with_labels=False,
-        node_color=colors,
+        node_color=graph.node_colors[subset].tolist(),
         cmap=plt.cm.tab20,  # 20-color discrete palette
-        node_size=500,
+        node_size=300,
         edge_color="gray",
         alpha=0.8
     )
-
-    # --- Draw labels separately ---
-    labels = nx.get_node_attributes(nx_graph, "label")
-    nx.draw_networkx_labels(nx_graph, pos, labels, font_size=6)
+    nx.draw_networkx_labels(nx_graph, pos, {i: graph.node_labels[n] for i, n in enumerate(nodes)}, font_size=6)
 
     plt.title("Ontology Graph (CUI + Name, Colored by Semantic Type)")
     plt.axis("off")
-    plt.show()
+    plt.savefig(output_path, dpi=150, bbox_inches="tight")
+    plt.close()
+    print(f"[✓] Saved {len(nodes)}-node subgraph with {edge_index.size(1)} edges to {output_path}")
+
+
+def main(graph_path: str = GRAPH_PATH, cuis=None, hops: int = 1, max_nodes: int = 200, output: str = "ontology_subgraph.png"):
+    """Print graph statistics; with `cuis`, also draw their k-hop neighborhood to `output`."""
+    graph = load_graph(graph_path)
+    if graph is None:
+        raise FileNotFoundError(f"No ontology graph at {graph_path}; run build_graph first.")
+
+    print_stats(graph_stats(graph))
+    if cuis:
+        draw_subgraph(graph, khop_nodes(graph, cuis, hops, max_nodes), output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect the ontology graph.")
+    parser.add_argument("--graph", default=GRAPH_PATH)
+    parser.add_argument("--cui", nargs="+", help="draw the k-hop neighborhood around these CUIs")
+    parser.add_argument("--hops", type=int, default=1)
+    parser.add_argument("--max-nodes", type=int, default=200)
+    parser.add_argument("--output", default="ontology_subgraph.png")
+    args = parser.parse_args()
+    main(args.graph, args.cui, args.hops, args.max_nodes, args.output)
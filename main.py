@@ -1,55 +1,81 @@
 # main.py
-import os, ast, torch
+import argparse
+import os
+import time
 import pandas as pd
 
 from dotenv import load_dotenv
 
-from preprocess.padchest_parser import load_padchest
-from preprocess.chexpert_parser import load_chexpert
-from data.cui_vocab import build_cui_vocab
-from data.graph.build_graph import build_graph
+from preprocess.padchest_parser import iter_padchest, PAD_CSV_PATH
+from preprocess.chexpert_parser import load_chexpert, CHEXPERT_DIR
+from preprocess.utils.meta_cache import META_CACHE_VERSION, MetaCacheWriter, load_meta_cache
+from preprocess.utils.image_manifest import verify_images
+from data.cui_vocab import build_cui_vocabs
+from data.graph.build_graph import GRAPH_CACHE_VERSION, build_graph
+from data.graph.graph_store import GRAPH_FORMAT_VERSION
+from data.graph.node_features import EMBEDDING_DIR, EMBEDDING_STORE_VERSION, load_encoder
 from data.umls.enrich_cache import enrich_metadata_cache
+from data.umls.metadata_store import MetadataStore, METADATA_CSV_PATH
 from inspect_graph import main as inspect_graph_main
+from utils.pipeline import Pipeline, Stage
+from utils.profiling import RunProfiler
 
 load_dotenv()
 api_key = os.getenv("UMLS_API_KEY")
 
 CACHE_DIR = os.path.join("cache")
-GRAPH_CACHE = "data/graph/ontology_graph.pt"
+GRAPH_CACHE = "data/graph/ontology_graph"
+VOCAB_DIR = os.path.join("data", "vocab")
+PADCHEST_CHUNKSIZE = 20_000
+PROFILE_DIR = "profiles"
 
-def load_or_preprocess(dataset_name: str, split: str = None) -> pd.DataFrame:
-    """Load from CSV cache or preprocess and cache."""
+def dataset_paths(dataset_name: str, split: str = None):
+    """(name suffix, meta cache directory, source CSV) of a dataset split."""
     suffix = f"{dataset_name}_{split}" if split else dataset_name
-    cache_path = os.path.join(CACHE_DIR, f"{suffix}-meta.csv")
-
-    if os.path.exists(cache_path):
-        print(f"[✓] Found cached {suffix} CSV.")
-        df = pd.read_csv(cache_path)
-        # Convert 'concepts' back to list
-        df["concepts"] = df["concepts"].apply(ast.literal_eval)
-        return df
-
-    print(f"[→] Preprocessing {suffix}...")
-
-    os.makedirs(CACHE_DIR, exist_ok=True)
+    cache_path = os.path.join(CACHE_DIR, f"{suffix}-meta")
 
     if dataset_name == "padchest":
-        df = load_padchest()
+        source_path = PAD_CSV_PATH
     elif dataset_name == "chexpert":
         if split not in ["train", "valid"]:
             raise ValueError("CheXpert split must be 'train' or 'valid'")
-        df = load_chexpert(split=split)
+        source_path = os.path.join(CHEXPERT_DIR, f"{split}.csv")
     else:
         raise ValueError(f"Unsupported dataset: {dataset_name}")
+    return suffix, cache_path, source_path
+
+def load_or_preprocess(dataset_name: str, split: str = None, export_csv: bool = False) -> pd.DataFrame:
+    """Load from the columnar cache, or preprocess and cache. Stale caches are rebuilt."""
+    suffix, cache_path, source_path = dataset_paths(dataset_name, split)
 
-    # Save to CSV with list as string
-    df.to_csv(cache_path)
-    print(f"[✓] Saved {suffix} CSV to {cache_path}")
+    df = load_meta_cache(cache_path, source_path)
+    if df is not None:
+        print(f"[✓] Found cached {suffix} metadata.")
+        return df
+
+    print(f"[→] Preprocessing {suffix}...")
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+
+    with MetaCacheWriter(cache_path, source_path) as writer:
+        if dataset_name == "padchest":
+            # Stream straight into the cache so the raw CSV is never fully in memory
+            for chunk in iter_padchest(chunksize=PADCHEST_CHUNKSIZE):
+                writer.append(chunk)
+        else:
+            writer.append(load_chexpert(split=split))
+    print(f"[✓] Saved {suffix} metadata ({writer.rows} rows) to {cache_path}")
+
+    df = load_meta_cache(cache_path)
+    if export_csv:
+        csv_path = f"{cache_path}.csv"
+        df.to_csv(csv_path)
+        print(f"[✓] Exported {suffix} CSV to {csv_path}")
     return df
 
 def verify_image_paths(df, dataset_name: str):
     total = len(df)
-    missing = df[~df["image_path"].apply(os.path.exists)]
+    missing = df[~verify_images(df["image_path"])]
     
     if dataset_name == "PadChest":
         print(f"{dataset_name} Images found:                {total - len(missing)}")
@@ -63,13 +89,14 @@ def verify_image_paths(df, dataset_name: str):
     return missing
 
 
-if __name__ == "__main__":
-    # Load or preprocess PadChest
-    padchest_df = load_or_preprocess("padchest")
+DATASETS = [("padchest", None), ("chexpert", "train"), ("chexpert", "valid")]
+META_CACHES = [dataset_paths(name, split)[1] for name, split in DATASETS]
+VOCAB_CSVS = [os.path.join(VOCAB_DIR, f"{name}_vocab.csv") for name in ("padchest", "chexpert", "combined")]
+
 
-    # Load or preprocess CheXpert train + valid
-    chexpert_train_df = load_or_preprocess("chexpert", split="train")
-    chexpert_valid_df = load_or_preprocess("chexpert", split="valid")
+# === Pipeline stages; each reads its inputs from disk so it can run in a worker process
+def summarize_datasets():
+    padchest_df, chexpert_train_df, chexpert_valid_df = (load_meta_cache(path) for path in META_CACHES)
 
     print("\n=== Dataset Summary ===")
     print(f"PadChest samples:      {len(padchest_df)}")
@@ -81,16 +108,77 @@ if __name__ == "__main__":
     verify_image_paths(chexpert_train_df, "CheXpert (train)")
     verify_image_paths(chexpert_valid_df, "CheXpert (valid)")
 
+def build_vocabs():
+    padchest_df, chexpert_train_df, chexpert_valid_df = (load_meta_cache(path) for path in META_CACHES)
     chexpert_df = pd.concat([chexpert_train_df, chexpert_valid_df])
- 
-    padchest_vocab = build_cui_vocab(padchest_df, source="padchest", api_key=api_key)
-    chexpert_vocab = build_cui_vocab(chexpert_df, source="chexpert", api_key=api_key)
-    enrich_metadata_cache(api_key=api_key)
 
-    if not os.path.exists(GRAPH_CACHE):
-        graph = build_graph("data/umls/cui_metadata_cache.csv", False, False)
-    else:
-        graph = torch.load(GRAPH_CACHE)
-        print(f"[✓] Loaded cached ontology graph from {GRAPH_CACHE}")
+    # One UMLS fetch for the CUIs missing from either source
+    build_cui_vocabs({"padchest": padchest_df, "chexpert": chexpert_df}, output_dir=VOCAB_DIR, api_key=api_key)
+
+def enrich_metadata():
+    store = MetadataStore()
+    enrich_metadata_cache(api_key=api_key, store=store)
+    # build_graph still consumes the CSV layout
+    store.export_csv(METADATA_CSV_PATH)
+
+def build_ontology_graph(encoder_path: str = None):
+    # Reuses the cached graph, extends it with newly enriched concepts, or rebuilds it.
+    # Node features are name + definition embeddings of the same rows, so they follow node
+    # order; only new or edited concepts are encoded. TEXT_ENCODER_PATH points at a local
+    # model directory, otherwise a hashing encoder is used.
+    build_graph(METADATA_CSV_PATH, add_sibling_edges="sampled", include_ancestors=True, output_path=GRAPH_CACHE,
+                encoder=load_encoder(encoder_path), features_dir=EMBEDDING_DIR)
+
+
+def make_pipeline(workers: int) -> Pipeline:
+    stages = [
+        Stage(f"preprocess_{dataset_paths(name, split)[0]}", load_or_preprocess,
+              inputs=[dataset_paths(name, split)[2]], outputs=[cache_path],
+              params={"dataset_name": name, "split": split}, version=META_CACHE_VERSION)
+        for (name, split), cache_path in zip(DATASETS, META_CACHES)
+    ]
+    stages += [
+        # Image files can appear or disappear without the caches changing
+        Stage("verify_images", summarize_datasets, inputs=META_CACHES, cache=False),
+        # Both stages add to the SQLite MetadataStore, which is left undeclared: it only grows,
+        # each stage fetches just what the store lacks, and a path can have only one writer.
+        Stage("build_vocabs", build_vocabs, inputs=META_CACHES, outputs=VOCAB_CSVS),
+        # Runs every time: a run can leave CUIs failed or unfetched while still writing the CSV,
+        # and when nothing is missing it is a single query plus the CSV export
+        Stage("enrich_metadata", enrich_metadata, inputs=VOCAB_CSVS, outputs=[METADATA_CSV_PATH], cache=False),
+        Stage("build_graph", build_ontology_graph, inputs=[METADATA_CSV_PATH], outputs=[GRAPH_CACHE, EMBEDDING_DIR],
+              params={"encoder_path": os.getenv("TEXT_ENCODER_PATH")},
+              version=[GRAPH_FORMAT_VERSION, GRAPH_CACHE_VERSION, EMBEDDING_STORE_VERSION]),
+        Stage("inspect_graph", inspect_graph_main, inputs=[GRAPH_CACHE], cache=False, in_process=True),
+    ]
+    return Pipeline(stages, workers=workers)
+
 
-    inspect_graph_main()
\ No newline at end of file
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Preprocess the datasets, enrich UMLS metadata and build the ontology graph.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Processes for independent stages (default: up to 4; 1 runs everything in this process)")
+    parser.add_argument("--force", nargs="*", metavar="STAGE", default=None,
+                        help="Re-run these stages even if unchanged; with no names, re-run everything")
+    parser.add_argument("--profile", action="store_true",
+                        help="Write a JSON run report (stage times, peak RSS, UMLS HTTP calls) to --profile-dir; "
+                             "implies --workers 1 unless given, so every stage is measured in this process")
+    parser.add_argument("--cprofile", action="store_true", help="With --profile, also dump cProfile stats")
+    parser.add_argument("--profile-dir", default=PROFILE_DIR)
+    args = parser.parse_args()
+
+    workers = args.workers or (1 if args.profile else min(4, os.cpu_count() or 1))
+    pipeline = make_pipeline(workers)
+    force, force_all = args.force or (), args.force is not None and not args.force
+
+    if args.profile:
+        run_id = time.strftime("%Y%m%d-%H%M%S")
+        profiler = RunProfiler(
+            report_path=os.path.join(args.profile_dir, f"run-{run_id}.json"),
+            cprofile_path=os.path.join(args.profile_dir, f"run-{run_id}.prof") if args.cprofile else None,
+            meta={"graph_cache": GRAPH_CACHE, "padchest_chunksize": PADCHEST_CHUNKSIZE, "workers": workers},
+        )
+        with profiler:
+            pipeline.run(force, force_all)
+    else:
+        pipeline.run(force, force_all)
@@ -0,0 +1,149 @@
+# models/gnn/concept_index.py
+"""
+Batched concept-embedding inference: run OntologyGNN once over the whole
+ontology graph, keep the node-embedding matrix on disk, and pool each
+sample's concept list with embedding_bag over CSR offsets.
+"""
+import hashlib
+import os
+from typing import Iterator, List, Optional
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+from data.columnar import read_manifest, save_array, write_manifest
+from data.graph.build_graph import CUIIndex
+from preprocess.utils.meta_cache import load_meta_arrays
+
+NODE_EMBEDDING_DIR = os.path.join("cache", "node_embeddings")
+
+
+def _tensor_digest(digest, tensor: torch.Tensor):
+    array = np.ascontiguousarray(tensor.detach().cpu().numpy())
+    digest.update(f"{array.dtype}{array.shape}".encode())
+    digest.update(array.reshape(-1).view(np.uint8))
+
+
+def embedding_key(model: torch.nn.Module, x: torch.Tensor, edge_index: torch.Tensor) -> str:
+    """Hash of the weights, node features and graph the embeddings were computed from."""
+    digest = hashlib.sha1()
+    for name, tensor in model.state_dict().items():
+        digest.update(name.encode())
+        _tensor_digest(digest, tensor)
+    _tensor_digest(digest, x)
+    _tensor_digest(digest, edge_index)
+    return digest.hexdigest()
+
+
+def node_embeddings(
+    model: torch.nn.Module,
+    x: torch.Tensor,
+    edge_index: torch.Tensor,
+    cache_dir: str = NODE_EMBEDDING_DIR,
+) -> torch.Tensor:
+    """
+    OntologyGNN output for every node, computed once per (weights, features,
+    graph) and memory-mapped from `cache_dir` afterwards.
+    """
+    key = embedding_key(model, x, edge_index)
+    path = os.path.join(cache_dir, "embeddings.npy") if cache_dir else None
+    manifest = read_manifest(cache_dir) if cache_dir and os.path.isdir(cache_dir) else None
+    if manifest is not None and manifest.get("key") == key:
+        print(f"[✓] Loaded cached node embeddings from {cache_dir}")
+        return torch.from_numpy(np.load(path, mmap_mode="c"))
+
+    was_training = model.training
+    model.eval()
+    with torch.inference_mode():
+        if hasattr(model, "precompute"):
+            # Aggregate the wide input features once (see OntologyGNN.precompute)
+            out = model(model.precompute(x, edge_index), edge_index, propagated=True)
+        else:
+            out = model(x, edge_index)
+    model.train(was_training)
+
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        save_array(path, out.numpy())
+        write_manifest(cache_dir, {"key": key, "num_nodes": out.size(0), "dim": out.size(1)})
+        print(f"[✓] Saved {out.size(0)} node embeddings to {cache_dir}")
+    return out
+
+
+class ConceptEmbeddingIndex:
+    """
+    Node-embedding lookup table keyed by CUI. Samples are pooled bags of
+    concepts given as CSR (offsets, CUI ids); CUIs not in the graph are
+    skipped and samples with no known concepts get a zero vector.
+    """
+
+    def __init__(self, embeddings: torch.Tensor, cuis: List[str], mode: str = "mean"):
+        self.embeddings = embeddings
+        self.cuis = list(cuis)
+        self.mode = mode
+        self._lookup = CUIIndex(self.cuis)
+
+    @property
+    def dim(self) -> int:
+        return self.embeddings.size(1)
+
+    def node_ids(self, cuis) -> np.ndarray:
+        """Node index per CUI, -1 where the CUI is not in the graph."""
+        return self._lookup(cuis)
+
+    def pool(self, offsets: np.ndarray, node_ids: np.ndarray) -> torch.Tensor:
+        """
+        Pool bags given by CSR `offsets` (length samples + 1) into `node_ids`;
+        ids of -1 are dropped from their bag.
+        """
+        offsets = np.asarray(offsets, dtype=np.int64)
+        node_ids = np.asarray(node_ids, dtype=np.int64)
+        known = node_ids >= 0
+        if not known.all():
+            # Re-derive the offsets over the known ids only
+            kept = np.concatenate([[0], np.cumsum(known)])
+            offsets = kept[offsets - offsets[0]]
+            node_ids = node_ids[known]
+        return F.embedding_bag(
+            torch.from_numpy(node_ids),
+            self.embeddings,
+            torch.from_numpy(offsets - offsets[0]),
+            mode=self.mode,
+            include_last_offset=True,
+        )
+
+    def embed_lists(self, concept_lists: List[List[str]]) -> torch.Tensor:
+        """Pooled embedding per list of CUIs, e.g. a preprocessed frame's `concepts` column."""
+        counts = np.fromiter(map(len, concept_lists), dtype=np.int64, count=len(concept_lists))
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        flat = [cui for concepts in concept_lists for cui in concepts]
+        return self.pool(offsets, self.node_ids(flat))
+
+    def iter_meta_cache(self, directory: str, batch_size: int = 65536) -> Iterator[torch.Tensor]:
+        """
+        Pooled embeddings for every sample of a columnar meta cache (see
+        preprocess/utils/meta_cache), `batch_size` samples at a time.
+        """
+        arrays = load_meta_arrays(directory)
+        # The cache stores ids into its own concept vocabulary; map that small table once
+        vocab_nodes = self.node_ids(arrays["concept_vocab"])
+        offsets, ids = arrays["concept_offsets"], arrays["concept_ids"]
+        rows = len(offsets) - 1
+        for start in range(0, rows, batch_size):
+            bounds = np.asarray(offsets[start:min(start + batch_size, rows) + 1])
+            yield self.pool(bounds, vocab_nodes[np.asarray(ids[bounds[0]:bounds[-1]])])
+
+    def embed_meta_cache(self, directory: str, batch_size: int = 65536) -> torch.Tensor:
+        return torch.cat(list(self.iter_meta_cache(directory, batch_size)))
+
+    @classmethod
+    def from_graph(
+        cls,
+        model: torch.nn.Module,
+        graph,
+        cache_dir: Optional[str] = NODE_EMBEDDING_DIR,
+        mode: str = "mean",
+    ) -> "ConceptEmbeddingIndex":
+        """Index over `model`'s embeddings of `graph` (needs graph.x and graph.cuis)."""
+        return cls(node_embeddings(model, graph.x, graph.edge_index, cache_dir), graph.cuis, mode)
@@ -1,19 +1,122 @@
 # models/gnn/ontology_gnn.py
+import warnings
+
 import torch
 from torch.nn import Linear, ReLU
 from torch_geometric.nn import GCNConv
+from torch_geometric.nn.conv.gcn_conv import gcn_norm
+
+
+def normalized_adjacency(edge_index, num_nodes, add_self_loops=True):
+    """
+    GCN-normalized adjacency D^-1/2 (A + I) D^-1/2 as a torch.sparse_csr
+    matrix with rows as targets, so `adj @ x` aggregates into each node.
+    """
+    edge_index, edge_weight = gcn_norm(edge_index, None, num_nodes, add_self_loops=add_self_loops)
+    adj = torch.sparse_coo_tensor(edge_index.flip(0), edge_weight, (num_nodes, num_nodes))
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message="Sparse CSR tensor support is in beta")
+        return adj.coalesce().to_sparse_csr()
+
+
+def propagate_features(x, adj, hops=1):
+    """A^hops x, e.g. SGC-style features for a linear model."""
+    for _ in range(hops):
+        x = adj @ x
+    return x
+
 
 class OntologyGNN(torch.nn.Module):
-    def __init__(self, in_dim=768, hidden_dim=256, out_dim=256, num_layers=2):
+    """
+    GCN over the ontology graph. With `cached_adjacency`, the normalized
+    adjacency is built once per edge_index and shared by every layer and
+    forward pass instead of being renormalized in each GCNConv call.
+    """
+
+    def __init__(self, in_dim=768, hidden_dim=256, out_dim=256, num_layers=2, cached_adjacency=False):
         super().__init__()
+        self.cached_adjacency = cached_adjacency
+        # The convs skip their own normalization when handed the precomputed adjacency
+        normalize = not cached_adjacency
         self.layers = torch.nn.ModuleList()
-        self.layers.append(GCNConv(in_dim, hidden_dim))
+        self.layers.append(GCNConv(in_dim, hidden_dim, normalize=normalize))
         for _ in range(num_layers - 2):
-            self.layers.append(GCNConv(hidden_dim, hidden_dim))
-        self.layers.append(GCNConv(hidden_dim, out_dim))
+            self.layers.append(GCNConv(hidden_dim, hidden_dim, normalize=normalize))
+        self.layers.append(GCNConv(hidden_dim, out_dim, normalize=normalize))
         self.act = ReLU()
+        self._adj = None
+        self._adj_source = None
+
+    def adjacency(self, edge_index, num_nodes):
+        """The cached normalized adjacency for `edge_index`, built on first use."""
+        # Keyed on the tensor object itself (held alive here, so its memory can't be reused)
+        if self._adj_source is not edge_index or self._adj.size(0) != num_nodes:
+            self._adj = normalized_adjacency(edge_index, num_nodes)
+            self._adj_source = edge_index
+        return self._adj
+
+    def _graph(self, x, edge_index):
+        if edge_index.is_sparse_csr:
+            if not self.cached_adjacency:
+                raise ValueError("A precomputed adjacency needs OntologyGNN(cached_adjacency=True)")
+            return edge_index
+        if self.cached_adjacency:
+            return self.adjacency(edge_index, x.size(0))
+        return edge_index
+
+    def forward(self, x, edge_index, propagated=False):
+        """
+        `edge_index` may also be a precomputed normalized_adjacency().
+        With `propagated`, `x` is already A·x (see precompute()) and the first
+        layer only applies its weights.
+        """
+        graph = self._graph(x, edge_index)
+        if propagated:
+            first = self.layers[0]
+            x = first.lin(x)
+            if first.bias is not None:
+                x = x + first.bias
+        else:
+            x = self.layers[0](x, graph)
+        for conv in self.layers[1:]:
+            x = conv(self.act(x), graph)
+        return x
+
+    @torch.no_grad()
+    def precompute(self, x, edge_index):
+        """
+        A·x for inference with fixed node features: the first GCN layer is
+        A·(x W) = (A·x) W, so its sparse aggregation over the wide input
+        features can be done once and reused via forward(..., propagated=True).
+        """
+        if edge_index.is_sparse_csr:
+            adj = edge_index
+        elif self.cached_adjacency:
+            adj = self.adjacency(edge_index, x.size(0))
+        else:
+            adj = normalized_adjacency(edge_index, x.size(0))
+        return propagate_features(x, adj)
+
+    @torch.no_grad()
+    def inference(self, x, edge_index, batch_size=65536):
+        """
+        Layer-wise full-graph inference for final embeddings: each layer runs
+        over all nodes before the next, with x W computed in row chunks and
+        aggregated through the sparse normalized adjacency, so no per-edge
+        messages or autograd state are kept.
+        """
+        if edge_index.is_sparse_csr:
+            adj = edge_index
+        elif self.cached_adjacency:
+            adj = self.adjacency(edge_index, x.size(0))
+        else:
+            adj = normalized_adjacency(edge_index, x.size(0))
 
-    def forward(self, x, edge_index):
-        for conv in self.layers[:-1]:
-            x = self.act(conv(x, edge_index))
-        return self.layers[-1](x, edge_index)
+        for i, conv in enumerate(self.layers):
+            h = torch.cat([conv.lin(x[start:start + batch_size]) for start in range(0, x.size(0), batch_size)])
+            x = adj @ h
+            if conv.bias is not None:
+                x = x + conv.bias
+            if i < len(self.layers) - 1:
+                x = self.act(x)
+        return x
@@ -0,0 +1,138 @@
+# models/gnn/sampling.py
+"""
+Neighbor-sampled mini-batches for OntologyGNN. PyG's NeighborLoader needs
+pyg-lib or torch-sparse, so sampling runs on a plain CSR of incoming edges.
+Each batch is a Data subgraph whose first `batch_size` nodes are the seeds,
+like NeighborLoader output.
+"""
+from typing import Callable, List, Optional
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader
+from torch_geometric.data import Data
+
+
+class CSRNeighborSampler:
+    """
+    Samples up to `num_neighbors[l]` incoming neighbors per node at hop l,
+    uniformly with replacement for high-degree nodes (duplicates collapse).
+    """
+
+    def __init__(self, edge_index: torch.Tensor, num_nodes: int, num_neighbors: List[int]):
+        src, dst = edge_index.numpy()
+        order = np.argsort(dst, kind="stable")
+        self.col = np.ascontiguousarray(src[order])
+        self.rowptr = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(dst, minlength=num_nodes), out=self.rowptr[1:])
+        self.num_nodes = num_nodes
+        self.num_neighbors = list(num_neighbors)
+        # Global -> local id map shared by all batches; each batch resets only the entries it set
+        self._local = None
+
+    def _sample_hop(self, targets: np.ndarray, fanout: int, rng: np.random.Generator):
+        start, deg = self.rowptr[targets], self.rowptr[targets + 1] - self.rowptr[targets]
+        take = deg if fanout < 0 else np.minimum(deg, fanout)
+        total = int(take.sum())
+        within = np.arange(total) - np.repeat(np.cumsum(take) - take, take)
+        # Nodes with more neighbors than the fan-out draw random ones instead
+        deg_rep = np.repeat(deg, take)
+        offset = np.where(np.repeat(deg > take, take), rng.integers(0, np.maximum(deg_rep, 1)), within)
+        return self.col[np.repeat(start, take) + offset], np.repeat(targets, take)
+
+    def sample(self, seeds: np.ndarray, rng: Optional[np.random.Generator] = None):
+        """Sampled node ids (seeds first) and the local edge_index among them."""
+        rng = rng if rng is not None else np.random.default_rng()
+        seeds = np.asarray(seeds, dtype=np.int64)
+        nodes = seeds
+        if self._local is None:
+            self._local = np.full(self.num_nodes, -1, dtype=np.int64)
+        local = self._local
+        local[seeds] = np.arange(len(seeds))
+
+        frontier, srcs, dsts = seeds, [], []
+        try:
+            for fanout in self.num_neighbors:
+                src, dst = self._sample_hop(frontier, fanout, rng)
+                new = np.unique(src[local[src] < 0])
+                local[new] = np.arange(len(nodes), len(nodes) + len(new))
+                nodes = np.concatenate([nodes, new])
+                srcs.append(local[src])
+                dsts.append(local[dst])
+                frontier = new
+        finally:
+            local[nodes] = -1
+
+        # Duplicate draws for high-degree nodes become one edge; unique over a packed key
+        # gives the same (src, dst)-sorted result as torch.unique(dim=1), much faster
+        n = np.int64(len(nodes))
+        keys = np.unique(np.concatenate(srcs) * n + np.concatenate(dsts))
+        return torch.from_numpy(nodes), torch.from_numpy(np.stack([keys // n, keys % n]))
+
+
+class CSRNeighborLoader(DataLoader):
+    """
+    DataLoader over seed nodes that yields sampled subgraphs:
+    Data(x, edge_index, n_id, batch_size[, y]). Sampling runs in the
+    DataLoader workers when `num_workers` > 0.
+    """
+
+    def __init__(
+        self,
+        data: Data,
+        num_neighbors: List[int],
+        input_nodes: Optional[torch.Tensor] = None,
+        batch_size: int = 1024,
+        shuffle: bool = False,
+        num_workers: int = 0,
+        **kwargs,
+    ):
+        self.data = data
+        self.neighbor_sampler = CSRNeighborSampler(data.edge_index, data.num_nodes, num_neighbors)
+        seeds = input_nodes if input_nodes is not None else torch.arange(data.num_nodes)
+        kwargs.setdefault("persistent_workers", num_workers > 0)
+        super().__init__(
+            seeds.tolist(),
+            batch_size=batch_size,
+            shuffle=shuffle,
+            num_workers=num_workers,
+            collate_fn=self._collate,
+            **kwargs,
+        )
+
+    def _collate(self, seeds: List[int]) -> Data:
+        # torch seeds every worker differently, so draw the NumPy seed from it
+        rng = np.random.default_rng(int(torch.randint(0, 2**62, ()).item()))
+        n_id, edge_index = self.neighbor_sampler.sample(np.asarray(seeds), rng)
+        batch = Data(x=self.data.x[n_id], edge_index=edge_index, n_id=n_id, batch_size=len(seeds))
+        if getattr(self.data, "y", None) is not None:
+            batch.y = self.data.y[n_id]
+        return batch
+
+
+def train_sampled(
+    model: torch.nn.Module,
+    loader: CSRNeighborLoader,
+    optimizer: torch.optim.Optimizer,
+    loss_fn: Callable,
+    epochs: int = 1,
+) -> List[float]:
+    """
+    Mini-batch training: `loss_fn(out, batch)` gets the outputs for the
+    seed nodes only. Returns the mean loss per epoch.
+    """
+    model.train()
+    history = []
+    for epoch in range(epochs):
+        total, seen = 0.0, 0
+        for batch in loader:
+            optimizer.zero_grad()
+            out = model(batch.x, batch.edge_index)[:batch.batch_size]
+            loss = loss_fn(out, batch)
+            loss.backward()
+            optimizer.step()
+            total += loss.item() * batch.batch_size
+            seen += batch.batch_size
+        history.append(total / max(seen, 1))
+        print(f"[i] Epoch {epoch + 1}/{epochs}: loss {history[-1]:.4f} over {seen} seed nodes")
+    return history
@@ -1,10 +1,30 @@
 # preprocess/chexpert_parser.py
 import os
+import numpy as np
 import pandas as pd
 from preprocess.utils.cui_mappings import CHEXPERT_CUI_MAP
 
-def load_chexpert(split):
-    file_path = os.path.join("datasets", "CheXpert", f"{split}.csv")
+CHEXPERT_DIR = os.path.join("datasets", "CheXpert")
+
+def extract_concepts(df: pd.DataFrame) -> list:
+    """Per-row CUI lists for labels marked positive (1) or uncertain (-1)."""
+    labels = [label for label in CHEXPERT_CUI_MAP if label in df.columns]
+    if not labels:
+        return [[] for _ in range(len(df))]
+
+    hits = df[labels].isin([1, -1]).to_numpy()
+    cuis = np.array([CHEXPERT_CUI_MAP[label] for label in labels], dtype=object)
+
+    # Encode each row's label pattern as a bitmask; only a few hundred distinct
+    # patterns occur, so each CUI list is built once per pattern, not per row.
+    bits = np.left_shift(1, np.arange(len(labels), dtype=np.int64))
+    masks = hits.astype(np.int64) @ bits
+    patterns, inverse = np.unique(masks, return_inverse=True)
+    pattern_cuis = [cuis[(pattern & bits) != 0].tolist() for pattern in patterns]
+    return [list(pattern_cuis[i]) for i in inverse]
+
+def load_chexpert(split, root: str = CHEXPERT_DIR):
+    file_path = os.path.join(root, f"{split}.csv")
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"CheXpert CSV not found at {file_path}")
 
@@ -12,21 +32,10 @@ def load_chexpert(split):
 
     # Drop rows with missing or empty reports
     df = df[df["Report"].notna() & df["Report"].str.strip().ne("")]
-    
-    def extract_cuis(row):
-        cuis = []
-        for label, cui in CHEXPERT_CUI_MAP.items():
-            value = row.get(label, 0)
-            if value in [1, -1]:  # positive or uncertain
-                cuis.append(cui)
-        return list(set(cuis))
-
-    def resolve_image_path(row):
-        return os.path.join("datasets", "CheXpert", row["Path"])
 
     return pd.DataFrame({
-        "image_path": df.apply(resolve_image_path, axis=1),
-        "concepts": df.apply(extract_cuis, axis=1),
+        "image_path": root + os.sep + df["Path"].astype(str),
+        "concepts": extract_concepts(df),
         "report": df["Report"].tolist(),
         "source": "chexpert"
     })
@@ -1,46 +1,73 @@
 # preprocess/padchest_parser.py
-import os, ast
+import os
 import pandas as pd
 
 PAD_CSV_PATH = os.path.join("datasets", "PadChest", "PADCHEST_chest_x_ray_images_labels_160K_01.02.19.csv")
 BASE_IMAGE_DIR = os.path.join("datasets", "PadChest")
 
-def load_padchest():
-    if not os.path.exists(PAD_CSV_PATH):
-        raise FileNotFoundError(f"PadChest CSV not found at {PAD_CSV_PATH}")
-    
-    df = pd.read_csv(PAD_CSV_PATH, low_memory=False)
-
-    def extract_cuis(row):
-        label_cui_raw = row.get("labelCUIS")
-        labels_raw = row.get("Labels")
-
-        # If labelCUIS is empty/missing
-        if pd.isna(label_cui_raw) or str(label_cui_raw).strip() in ["", "[]"]:
-            try:
-                labels = ast.literal_eval(labels_raw)
-                if isinstance(labels, list) and "normal" in [l.lower() for l in labels]:
-                    return ["C0205307"]
-            except:
-                pass
-            return []
-
-        try:
-            cell = str(label_cui_raw).replace("'", '"').replace(' ', ', ')
-            cuis = list(set(ast.literal_eval(cell)))
-            return cuis if cuis else []
-        except Exception:
-            return []
-
-    def resolve_image_path(row):
-        return os.path.join(BASE_IMAGE_DIR, str(row["ImageDir"]), row["ImageID"])
-
-    # Apply transformations
-    processed_df = pd.DataFrame({
-        "image_path": df.apply(resolve_image_path, axis=1),
-        "concepts": df.apply(extract_cuis, axis=1),
+NORMAL_CUI = "C0205307"
+
+# Only these columns are used; reading them as strings skips type inference
+PADCHEST_COLUMNS = ["ImageID", "ImageDir", "Labels", "labelCUIS", "Report"]
+PADCHEST_DTYPES = {col: str for col in PADCHEST_COLUMNS}
+DEFAULT_CHUNKSIZE = 20_000
+
+# labelCUIS cells look like "['C0205307' 'C0032227']": every quoted token is a CUI
+_QUOTED_TOKEN = r"'([^']*)'"
+# A list element that is exactly 'normal' (case-insensitive) in the Labels repr
+_NORMAL_LABEL = r"(?i)(?:^\s*\[|,)\s*'normal'\s*(?:,|\]\s*$)"
+
+def extract_concepts(df: pd.DataFrame) -> list:
+    """
+    Per-row CUI lists from labelCUIS in one regex pass. Rows without any
+    labelCUIS fall back to the normal CUI when Labels contains 'normal'.
+    """
+    raw = df["labelCUIS"].fillna("").astype(str)
+    empty = raw.str.strip().isin(["", "[]"]).to_numpy()
+
+    concepts = [[] for _ in range(len(df))]
+    tokens = raw[~empty].str.findall(_QUOTED_TOKEN)
+    for pos, cuis in zip((~empty).nonzero()[0], tokens):
+        concepts[pos] = list(dict.fromkeys(cuis))
+
+    labels = df["Labels"][empty].fillna("").astype(str)
+    for pos in empty.nonzero()[0][labels.str.contains(_NORMAL_LABEL, regex=True).to_numpy()]:
+        concepts[pos] = [NORMAL_CUI]
+    return concepts
+
+def process_padchest(df: pd.DataFrame, image_dir: str = BASE_IMAGE_DIR) -> pd.DataFrame:
+    """Turn raw PadChest rows into the (image_path, concepts, report, source) frame."""
+    image_paths = image_dir + os.sep + df["ImageDir"].astype(str) + os.sep + df["ImageID"].astype(str)
+
+    return pd.DataFrame({
+        "image_path": image_paths,
+        "concepts": extract_concepts(df),
         "report": df["Report"].fillna("").astype(str),
         "source": "padchest"
     })
 
-    return processed_df
+def iter_padchest(
+    csv_path: str = PAD_CSV_PATH,
+    image_dir: str = BASE_IMAGE_DIR,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+):
+    """
+    Stream the PadChest CSV in `chunksize` rows, yielding processed frames.
+    Peak memory depends on the chunk size, not on the file size.
+    """
+    if not os.path.exists(csv_path):
+        raise FileNotFoundError(f"PadChest CSV not found at {csv_path}")
+
+    with pd.read_csv(csv_path, usecols=PADCHEST_COLUMNS, dtype=PADCHEST_DTYPES, chunksize=chunksize) as reader:
+        for chunk in reader:
+            yield process_padchest(chunk, image_dir)
+
+def load_padchest(csv_path: str = PAD_CSV_PATH, image_dir: str = BASE_IMAGE_DIR, chunksize: int = None):
+    if chunksize:
+        return pd.concat(iter_padchest(csv_path, image_dir, chunksize))
+
+    if not os.path.exists(csv_path):
+        raise FileNotFoundError(f"PadChest CSV not found at {csv_path}")
+
+    df = pd.read_csv(csv_path, usecols=PADCHEST_COLUMNS, dtype=PADCHEST_DTYPES)
+    return process_padchest(df, image_dir)
@@ -0,0 +1,187 @@
+# preprocess/utils/inverted_index.py
+"""
+CUI -> dataset rows inverted index, the transpose of a meta cache's concept
+CSR. It is written into each meta cache directory:
+  inv_offsets.npy   int64 [num_concepts + 1] offsets into inv_rows per concept vocab id
+  inv_rows.npy      int64 sorted row ids per concept
+"""
+import os
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+from torch.utils.data import Sampler
+
+from data.columnar import load_array, read_string_table
+
+
+def build_inverted_index(concept_offsets: np.ndarray, concept_ids: np.ndarray, num_concepts: int):
+    """(offsets, rows) listing each concept's rows in ascending order, with repeated CUIs in a row counted once."""
+    counts = np.diff(concept_offsets)
+    rows = np.repeat(np.arange(len(counts), dtype=np.int64), counts)
+    # One sort over (concept, row) keys orders rows within each concept and exposes duplicates
+    keys = np.unique(np.asarray(concept_ids, dtype=np.int64) * max(len(counts), 1) + rows)
+    concept, rows = np.divmod(keys, max(len(counts), 1))
+    offsets = np.zeros(num_concepts + 1, dtype=np.int64)
+    np.cumsum(np.bincount(concept, minlength=num_concepts), out=offsets[1:])
+    return offsets, rows
+
+
+def union(postings: Sequence[np.ndarray]) -> np.ndarray:
+    postings = [p for p in postings if len(p)]
+    if not postings:
+        return np.empty(0, dtype=np.int64)
+    return np.unique(np.concatenate(postings))
+
+
+def intersection(postings: Sequence[np.ndarray]) -> np.ndarray:
+    if not postings:
+        return np.empty(0, dtype=np.int64)
+    # Shortest first keeps every intermediate result small
+    postings = sorted(postings, key=len)
+    result = np.asarray(postings[0])
+    for p in postings[1:]:
+        if len(result) == 0:
+            break
+        result = result[np.isin(result, p, assume_unique=True)]
+    return result
+
+
+def descendant_cuis(graph, cuis: Iterable[str], max_depth: Optional[int] = None) -> List[str]:
+    """The given CUIs plus everything below them along the graph's hierarchy edges."""
+    from data.graph.build_graph import HIERARCHY, CUIIndex
+
+    index = CUIIndex(graph.cuis)
+    nodes = index(list(cuis))
+    nodes = nodes[nodes >= 0]
+    hierarchy = graph.edge_type == HIERARCHY
+    src, dst = graph.edge_index[0][hierarchy].numpy(), graph.edge_index[1][hierarchy].numpy()
+    order = np.argsort(src, kind="stable")
+    children = dst[order]
+    ptr = np.zeros(graph.num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=graph.num_nodes), out=ptr[1:])
+
+    seen = np.zeros(graph.num_nodes, dtype=bool)
+    seen[nodes] = True
+    frontier, depth = np.unique(nodes), 0
+    while len(frontier) and (max_depth is None or depth < max_depth):
+        counts = ptr[frontier + 1] - ptr[frontier]
+        within = np.arange(int(counts.sum())) - np.repeat(np.cumsum(counts) - counts, counts)
+        reached = np.unique(children[np.repeat(ptr[frontier], counts) + within])
+        frontier = reached[~seen[reached]]
+        seen[frontier] = True
+        depth += 1
+
+    cuis_array = np.asarray(graph.cuis, dtype=object)
+    return cuis_array[np.flatnonzero(seen)].tolist()
+
+
+class ConceptRowIndex:
+    """
+    Memory-mapped inverted index of one meta cache (or several, see
+    concat()). Row ids are positions in the cached frame.
+    """
+
+    def __init__(self, offsets: np.ndarray, rows: np.ndarray, vocab: List[str], num_rows: int):
+        self.offsets = offsets
+        self.rows_by_concept = rows
+        self.vocab = list(vocab)
+        self.num_rows = num_rows
+        self._ids = {cui: i for i, cui in enumerate(self.vocab)}
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "ConceptRowIndex":
+        concept_offsets = load_array(os.path.join(directory, "concept_offsets.npy"), mmap=mmap)
+        return cls(
+            load_array(os.path.join(directory, "inv_offsets.npy"), mmap=mmap),
+            load_array(os.path.join(directory, "inv_rows.npy"), mmap=mmap),
+            read_string_table(os.path.join(directory, "concept_vocab"), mmap=mmap),
+            len(concept_offsets) - 1,
+        )
+
+    @classmethod
+    def concat(cls, indexes: Sequence["ConceptRowIndex"]) -> "ConceptRowIndex":
+        """One index over frames concatenated in this order (e.g. PadChest then CheXpert)."""
+        vocab: Dict[str, int] = {}
+        ids, rows, row_offset = [], [], 0
+        for index in indexes:
+            global_ids = np.array([vocab.setdefault(cui, len(vocab)) for cui in index.vocab], dtype=np.int64)
+            counts = np.diff(index.offsets)
+            ids.append(np.repeat(global_ids, counts))
+            rows.append(np.asarray(index.rows_by_concept) + row_offset)
+            row_offset += index.num_rows
+        ids = np.concatenate(ids) if ids else np.empty(0, dtype=np.int64)
+        rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+        # Row offsets grow with each index, so a stable sort by concept keeps rows ascending
+        order = np.argsort(ids, kind="stable")
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(ids, minlength=len(vocab)), out=offsets[1:])
+        return cls(offsets, rows[order], list(vocab), row_offset)
+
+    def __contains__(self, cui: str) -> bool:
+        return cui in self._ids
+
+    def rows(self, cui: str) -> np.ndarray:
+        """Sorted rows containing `cui` (empty if it never occurs)."""
+        i = self._ids.get(cui)
+        if i is None:
+            return np.empty(0, dtype=np.int64)
+        return np.asarray(self.rows_by_concept[self.offsets[i]:self.offsets[i + 1]])
+
+    def count(self, cui: str) -> int:
+        i = self._ids.get(cui)
+        return 0 if i is None else int(self.offsets[i + 1] - self.offsets[i])
+
+    def any_of(self, cuis: Iterable[str]) -> np.ndarray:
+        return union([self.rows(cui) for cui in cuis])
+
+    def all_of(self, cuis: Iterable[str]) -> np.ndarray:
+        return intersection([self.rows(cui) for cui in cuis])
+
+    def expanded(self, cui: str, graph, max_depth: Optional[int] = None) -> np.ndarray:
+        """Rows with `cui` or any of its descendants in the ontology graph."""
+        return self.any_of(descendant_cuis(graph, [cui], max_depth))
+
+
+class BalancedConceptSampler(Sampler):
+    """
+    Yields row ids for class-balanced batches: each draw picks a class
+    uniformly, then a random row from that class's postings, so a batch
+    costs O(batch_size) whatever the class sizes. Classes are CUIs, or with
+    `graph`, CUIs expanded to their ontology descendants.
+    """
+
+    def __init__(
+        self,
+        index: ConceptRowIndex,
+        cuis: Sequence[str],
+        num_samples: int,
+        graph=None,
+        max_depth: Optional[int] = None,
+        seed: int = 0,
+    ):
+        postings = [index.expanded(cui, graph, max_depth) if graph is not None else index.rows(cui) for cui in cuis]
+        empty = [cui for cui, p in zip(cuis, postings) if len(p) == 0]
+        if empty:
+            print(f"[!] No rows for {len(empty)} classes; they are left out of sampling: {', '.join(empty[:10])}")
+        postings = [p for p in postings if len(p)]
+        if not postings:
+            raise ValueError("None of the requested classes has any rows.")
+        self.class_sizes = np.array([len(p) for p in postings], dtype=np.int64)
+        self.class_offsets = np.concatenate([[0], np.cumsum(self.class_sizes)])
+        self.class_rows = np.concatenate(postings)
+        self.num_samples = num_samples
+        self.seed = seed
+        self.epoch = 0
+
+    def __len__(self) -> int:
+        return self.num_samples
+
+    def sample(self, n: int, rng: np.random.Generator) -> np.ndarray:
+        classes = rng.integers(0, len(self.class_sizes), n)
+        picks = (rng.random(n) * self.class_sizes[classes]).astype(np.int64)
+        return self.class_rows[self.class_offsets[classes] + picks]
+
+    def __iter__(self) -> Iterator[int]:
+        rng = np.random.default_rng([self.seed, self.epoch])
+        self.epoch += 1
+        return iter(self.sample(self.num_samples, rng).tolist())
@@ -0,0 +1,152 @@
+# preprocess/utils/meta_cache.py
+"""
+Columnar cache for preprocessed dataset frames.
+
+Each cache is a directory of memory-mappable files:
+  image_path / report / source   string tables (offsets + UTF-8 blob)
+  concept_offsets.npy            CSR row offsets into concept_ids (int64, rows + 1)
+  concept_ids.npy                integer ids into the concept_vocab string table (int32)
+  index.npy                      the frame's original row index
+  inv_offsets.npy / inv_rows.npy CUI -> rows inverted index (see preprocess/utils/inverted_index)
+  manifest.json                  format version, row count and source CSV stamp
+"""
+import os
+import shutil
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from data.columnar import (
+    StringTableWriter,
+    file_stamp,
+    load_array,
+    read_manifest,
+    read_string_table,
+    save_array,
+    stamp_matches,
+    write_manifest,
+    write_string_table,
+)
+from preprocess.utils.inverted_index import build_inverted_index
+
+# Bump when the parsers change what they produce, so old caches are rebuilt
+META_CACHE_VERSION = 2
+STRING_COLUMNS = ("image_path", "report", "source")
+
+
+class MetaCacheWriter:
+    """
+    Builds a cache directory chunk by chunk. Files are written to a temporary
+    directory and renamed into place on close(), so readers never see a
+    partial cache.
+    """
+
+    def __init__(self, directory: str, source_path: str):
+        self.directory = directory
+        self.tmp_dir = f"{directory}.tmp"
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+        os.makedirs(self.tmp_dir)
+
+        # Stamp before reading: if the source changes mid-build the cache is stale next run
+        self.source_stamp = file_stamp(source_path)
+        self.rows = 0
+        self._strings = {col: StringTableWriter(os.path.join(self.tmp_dir, col)) for col in STRING_COLUMNS}
+        self._vocab = {}
+        self._concept_counts = []
+        self._concept_ids = []
+        self._index = []
+
+    def append(self, df: pd.DataFrame):
+        for col in STRING_COLUMNS:
+            self._strings[col].extend(df[col].astype(str).tolist())
+
+        concepts = df["concepts"].tolist()
+        vocab = self._vocab
+        self._concept_counts.append(np.fromiter(map(len, concepts), dtype=np.int64, count=len(concepts)))
+        self._concept_ids.append(np.fromiter(
+            (vocab.setdefault(cui, len(vocab)) for row in concepts for cui in row), dtype=np.int32
+        ))
+        self._index.append(np.asarray(df.index, dtype=np.int64))
+        self.rows += len(df)
+
+    def close(self):
+        for writer in self._strings.values():
+            writer.close()
+
+        counts = np.concatenate(self._concept_counts) if self._concept_counts else np.empty(0, dtype=np.int64)
+        offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        ids = np.concatenate(self._concept_ids) if self._concept_ids else np.empty(0, dtype=np.int32)
+        index = np.concatenate(self._index) if self._index else np.empty(0, dtype=np.int64)
+
+        save_array(os.path.join(self.tmp_dir, "concept_offsets.npy"), offsets)
+        save_array(os.path.join(self.tmp_dir, "concept_ids.npy"), ids)
+        save_array(os.path.join(self.tmp_dir, "index.npy"), index)
+        inv_offsets, inv_rows = build_inverted_index(offsets, ids, len(self._vocab))
+        save_array(os.path.join(self.tmp_dir, "inv_offsets.npy"), inv_offsets)
+        save_array(os.path.join(self.tmp_dir, "inv_rows.npy"), inv_rows)
+        write_string_table(os.path.join(self.tmp_dir, "concept_vocab"), self._vocab)
+        write_manifest(self.tmp_dir, {
+            "version": META_CACHE_VERSION,
+            "rows": self.rows,
+            "num_concepts": len(self._vocab),
+            "source": self.source_stamp,
+        })
+
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.replace(self.tmp_dir, self.directory)
+
+    def abort(self):
+        for writer in self._strings.values():
+            writer.abort()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def is_fresh(directory: str, source_path: Optional[str] = None) -> bool:
+    """True if the cache exists, has the current format version and matches the source CSV."""
+    manifest = read_manifest(directory)
+    if manifest is None or manifest.get("version") != META_CACHE_VERSION:
+        return False
+    return source_path is None or stamp_matches(manifest.get("source"), source_path)
+
+
+def load_meta_arrays(directory: str, mmap: bool = True) -> dict:
+    """Memory-mapped CSR view of a cache: concept_offsets, concept_ids, concept_vocab, index."""
+    return {
+        "concept_offsets": load_array(os.path.join(directory, "concept_offsets.npy"), mmap=mmap),
+        "concept_ids": load_array(os.path.join(directory, "concept_ids.npy"), mmap=mmap),
+        "concept_vocab": read_string_table(os.path.join(directory, "concept_vocab"), mmap=mmap),
+        "index": load_array(os.path.join(directory, "index.npy"), mmap=mmap),
+    }
+
+
+def load_meta_cache(directory: str, source_path: Optional[str] = None) -> Optional[pd.DataFrame]:
+    """Rebuild the preprocessed frame from a cache; None if it is missing or stale."""
+    if not is_fresh(directory, source_path):
+        return None
+
+    arrays = load_meta_arrays(directory)
+    vocab = np.array(arrays["concept_vocab"], dtype=object)
+    cuis = vocab[arrays["concept_ids"]].tolist() if len(vocab) else []
+    bounds = arrays["concept_offsets"].tolist()
+    concepts = [cuis[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+    columns = {col: read_string_table(os.path.join(directory, col)) for col in STRING_COLUMNS}
+    return pd.DataFrame(
+        {
+            "image_path": columns["image_path"],
+            "concepts": concepts,
+            "report": columns["report"],
+            "source": columns["source"],
+        },
+        index=pd.Index(np.asarray(arrays["index"])),
+    )
@@ -0,0 +1,154 @@
+# tests/test_build_graph.py
+from collections import deque
+
+import numpy as np
+import pandas as pd
+import pytest
+import torch
+
+from benchmarks.synthetic import make_ontology_csv
+from data.graph.build_graph import ancestor_pairs, build_graph, sampled_sibling_pairs, sibling_pairs
+from data.graph.node_features import HashingEncoder
+
+
+def random_links(num_nodes: int, num_links: int, seed: int = 0):
+    """Random (parent, child) links without self-links or repeats."""
+    rng = np.random.default_rng(seed)
+    parent = rng.integers(0, num_nodes, size=num_links)
+    child = rng.integers(0, num_nodes, size=num_links)
+    keep = parent != child
+    keys = np.unique(parent[keep] * num_nodes + child[keep])
+    return keys // num_nodes, keys % num_nodes
+
+
+def pair_set(edges: np.ndarray) -> set:
+    return set(zip(edges[0].tolist(), edges[1].tolist()))
+
+
+def test_sampled_siblings_are_unique_symmetric_siblings():
+    # A few hubs with many children, so both small and sampled families occur
+    parent, child = random_links(200, 1500, seed=1)
+    parent = parent % 40
+    keys = np.unique(parent * 200 + child)
+    parent, child = keys // 200, keys % 200
+    full = pair_set(sibling_pairs(parent, child, 200))
+
+    for max_siblings in (1, 3, 16):
+        edges = sampled_sibling_pairs(parent, child, max_siblings, seed=7)
+        pairs = pair_set(edges)
+        assert len(pairs) == edges.shape[1], "duplicate sibling pairs"
+        assert all(src != dst for src, dst in pairs)
+        assert pairs == {(dst, src) for src, dst in pairs}
+        assert pairs <= full
+
+
+def test_sampled_siblings_keep_small_families_whole():
+    parent, child = random_links(60, 150, seed=2)
+    edges = sampled_sibling_pairs(parent, child, max_siblings=10**6)
+    assert pair_set(edges) == pair_set(sibling_pairs(parent, child, 60))
+    assert edges.shape[1] == len(pair_set(edges))
+
+
+def test_sampled_siblings_only_draw_for_selected_links():
+    parent, child = random_links(100, 600, seed=3)
+    only = child >= 80
+    edges = sampled_sibling_pairs(parent, child, 4, seed=0, only=only)
+    pairs = pair_set(edges)
+    assert len(pairs) == edges.shape[1]
+    assert pairs == {(dst, src) for src, dst in pairs}
+    # Every pair involves a selected child
+    assert all(src >= 80 or dst >= 80 for src, dst in pairs)
+
+
+def brute_force_ancestors(parent, child, num_nodes: int, max_hops: int = None) -> set:
+    """(ancestor, node) pairs at shortest distance 2..max_hops, by BFS up from every node."""
+    parents_of = [[] for _ in range(num_nodes)]
+    for p, c in zip(parent.tolist(), child.tolist()):
+        parents_of[c].append(p)
+    pairs = set()
+    for node in range(num_nodes):
+        distance = {node: 0}
+        queue = deque([node])
+        while queue:
+            current = queue.popleft()
+            for p in parents_of[current]:
+                if p not in distance:
+                    distance[p] = distance[current] + 1
+                    queue.append(p)
+        pairs.update(
+            (anc, node) for anc, d in distance.items()
+            if d >= 2 and (max_hops is None or d <= max_hops)
+        )
+    return pairs
+
+
+@pytest.mark.parametrize("max_hops", [None, 2, 3])
+@pytest.mark.parametrize("seed", [0, 1])
+def test_ancestor_pairs_match_brute_force(seed, max_hops):
+    # Random links include cycles, which must neither loop nor yield self-pairs
+    parent, child = random_links(80, 160, seed=seed)
+    edges = ancestor_pairs(parent, child, 80, max_hops)
+    assert edges.shape[1] == len(pair_set(edges)), "duplicate ancestor pairs"
+    assert pair_set(edges) == brute_force_ancestors(parent, child, 80, max_hops)
+
+
+def test_ancestor_pairs_of_a_chain():
+    parent, child = np.arange(0, 4), np.arange(1, 5)
+    assert pair_set(ancestor_pairs(parent, child, 5)) == {
+        (0, 2), (0, 3), (0, 4), (1, 3), (1, 4), (2, 4)
+    }
+    assert ancestor_pairs(parent[:0], child[:0], 5).shape == (2, 0)
+
+
+def typed_edges(graph) -> set:
+    return set(zip(*graph.edge_index.tolist(), graph.edge_type.tolist()))
+
+
+def write_prefix(tmp_path, rows: int = None) -> str:
+    """
+    The synthetic ontology reversed, so later rows are parents of earlier
+    ones, like the parents enrichment appends; `rows` keeps only a prefix.
+    """
+    full = pd.read_csv(make_ontology_csv(str(tmp_path / "ontology.csv"), concepts=300, seed=4))
+    full = full.iloc[::-1].reset_index(drop=True)
+    path = str(tmp_path / "vocab.csv")
+    (full if rows is None else full.iloc[:rows]).to_csv(path, index=False)
+    return path
+
+
+@pytest.mark.parametrize("siblings", [False, True])
+def test_incremental_build_matches_fresh_build(tmp_path, capsys, siblings):
+    options = dict(add_sibling_edges=siblings, include_ancestors=True, features_dir=None)
+    build_graph(write_prefix(tmp_path, rows=200), output_path=str(tmp_path / "graph"), **options)
+    vocab = write_prefix(tmp_path)
+    capsys.readouterr()
+
+    extended = build_graph(vocab, output_path=str(tmp_path / "graph"), **options)
+    assert "Extended ontology graph by 100 nodes" in capsys.readouterr().out
+    fresh = build_graph(vocab, output_path=str(tmp_path / "fresh"), incremental=False, **options)
+
+    assert extended.num_nodes == fresh.num_nodes == 300
+    assert extended.cuis == fresh.cuis
+    assert typed_edges(extended) == typed_edges(fresh)
+    assert extended.edge_index.size(1) == len(typed_edges(extended))
+
+
+def test_incremental_sampled_siblings_keep_existing_edges(tmp_path):
+    options = dict(add_sibling_edges="sampled", max_siblings=2, features_dir=None)
+    old = build_graph(write_prefix(tmp_path, rows=200), output_path=str(tmp_path / "graph"), **options)
+    extended = build_graph(write_prefix(tmp_path), output_path=str(tmp_path / "graph"), **options)
+
+    assert typed_edges(old) <= typed_edges(extended)
+    assert extended.edge_index.size(1) == len(typed_edges(extended))
+    assert int(extended.edge_index.max()) == 299
+
+
+def test_incremental_build_reuses_features(tmp_path):
+    encoder = HashingEncoder(dim=16)
+    options = dict(add_sibling_edges=False, encoder=encoder, features_dir=str(tmp_path / "features"))
+    build_graph(write_prefix(tmp_path, rows=200), output_path=str(tmp_path / "graph"), **options)
+    extended = build_graph(write_prefix(tmp_path), output_path=str(tmp_path / "graph"), **options)
+    fresh = build_graph(write_prefix(tmp_path), output_path=str(tmp_path / "fresh"), incremental=False, **options)
+
+    assert extended.x.shape == (300, 16)
+    assert torch.equal(extended.x, fresh.x)
@@ -0,0 +1,83 @@
+# tests/test_metadata_store.py
+import pandas as pd
+import pytest
+
+from data.umls.metadata_store import COLUMNS, MetadataStore
+
+
+def concept(cui: str, parents=(), descendants=(), definition: str = "A definition") -> dict:
+    return {
+        "cui": cui,
+        "name": f"Name of {cui}",
+        "definition": definition,
+        "semantic_type": "Finding",
+        "parents": [f"{{(Name of {p}), {p}}}" for p in parents],
+        "descendants": [f"{{(Name of {d}), {d}}}" for d in descendants],
+    }
+
+
+@pytest.fixture
+def store(tmp_path):
+    with MetadataStore(str(tmp_path / "metadata.sqlite"), legacy_csv=None) as store:
+        yield store
+
+
+def test_round_trip_keeps_insertion_and_entry_order(store):
+    metas = [
+        concept("C3", parents=["C1", "C2"]),
+        concept("C1", descendants=["C3"]),
+        concept("C2", parents=["C9"], descendants=["C3"]),
+    ]
+    assert store.put_many(metas) == 3
+
+    assert store.cuis() == ["C3", "C1", "C2"]
+    assert list(store.get_many().values()) == metas
+    assert store.get_many(["C2", "C7", "C3"]) == {"C2": metas[2], "C3": metas[0]}
+    assert store.get("C7") is None
+    assert "C1" in store and "C7" not in store
+
+
+def test_put_replaces_a_concept_and_its_entries(store):
+    store.put(concept("C1", parents=["C2", "C3"]))
+    store.put(concept("C1", parents=["C4"], definition="Edited"))
+
+    assert len(store) == 1
+    assert store.get("C1") == concept("C1", parents=["C4"], definition="Edited")
+
+
+def test_missing_and_missing_parents(store):
+    store.put_many([
+        concept("C1", parents=["C2", "C3"]),
+        concept("C2", parents=["C4"]),
+    ])
+    # Entries that never resolved to a CUI aren't parents to fetch
+    store.put({**concept("C5"), "parents": ["{(Unknown), N/A}", "free text"]})
+
+    assert store.missing(["C3", "C1", "C4", "C3"]) == ["C3", "C4"]
+    assert store.missing_parents() == ["C3", "C4"]
+    assert store.missing_parents(["C2"]) == ["C4"]
+    assert store.missing_parents(["C5"]) == []
+
+
+def test_batch_writer_flushes_on_size_and_exit(store):
+    with store.writer(batch_size=2) as writer:
+        for i in range(5):
+            writer.put(concept(f"C{i}"))
+        assert len(store) == 4
+    assert writer.written == 5
+    assert store.cuis() == [f"C{i}" for i in range(5)]
+
+
+def test_legacy_csv_is_imported_and_exported(tmp_path):
+    metas = [concept("C1", descendants=["C2"]), concept("C2", parents=["C1"], definition="")]
+    legacy = pd.DataFrame(metas, columns=COLUMNS)
+    for rel in ("parents", "descendants"):
+        legacy[rel] = legacy[rel].apply(str)
+    legacy_csv = str(tmp_path / "cui_metadata_cache.csv")
+    legacy.to_csv(legacy_csv, index=False)
+
+    with MetadataStore(str(tmp_path / "metadata.sqlite"), legacy_csv=legacy_csv) as store:
+        assert list(store.get_many().values()) == metas
+        exported = store.export_csv(str(tmp_path / "export.csv"))
+
+    pd.testing.assert_frame_equal(pd.read_csv(exported), pd.read_csv(legacy_csv))
@@ -0,0 +1,68 @@
+# tests/test_parsers.py
+"""Column-wise CheXpert/PadChest parsers against the original row-wise ones (benchmarks/bench_parsers)."""
+import os
+
+import pandas as pd
+
+from benchmarks.bench_parsers import assert_parity, legacy_chexpert, legacy_padchest
+from preprocess.chexpert_parser import load_chexpert
+from preprocess.padchest_parser import load_padchest
+
+CHEXPERT_CSV = """\
+Path,Report,No Finding,Cardiomegaly,Edema,Pleural Effusion,Support Devices
+CheXpert-v1.0/train/patient00001/study1/view1_frontal.jpg,No acute findings.,1,,,,
+CheXpert-v1.0/train/patient00002/study1/view1_frontal.jpg,Enlarged heart; possible edema.,,1,-1,0,
+CheXpert-v1.0/train/patient00002/study2/view1_frontal.jpg,,,1,,,
+CheXpert-v1.0/train/patient00003/study1/view2_lateral.jpg,   ,,,1,,
+CheXpert-v1.0/train/patient00004/study1/view1_frontal.jpg,Line in place. Small effusion.,0,0,0,-1,1
+CheXpert-v1.0/train/patient00005/study1/view1_frontal.jpg,Unremarkable.,,,,,
+"""
+
+PADCHEST_CSV = """\
+ImageID,ImageDir,Labels,labelCUIS,Report
+a.png,0,"['pleural effusion', 'cardiomegaly']","['C0032227' 'C0018800']",derrame pleural
+b.png,1,['normal'],,normal
+c.png,1,"['abnormal']",[],
+d.png,2,"['Normal']",[],sin hallazgos
+e.png,2,"['nodule', 'nodule']","['C0028259' 'C0028259']",nodulo
+f.png,3,,,
+g.png,3,"['normal', 'COPD signs']","['C0024117']",signos de EPOC
+"""
+
+
+def _write(path, text: str) -> str:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
+    return str(path)
+
+
+def test_chexpert_matches_row_wise(tmp_path):
+    root = str(tmp_path / "CheXpert")
+    csv_path = _write(os.path.join(root, "train.csv"), CHEXPERT_CSV)
+
+    new, old = load_chexpert("train", root=root), legacy_chexpert(csv_path, root)
+
+    assert_parity(new, old, "chexpert")
+    # Blank and whitespace-only reports are dropped
+    assert len(new) == 4
+
+
+def test_padchest_matches_row_wise(tmp_path):
+    csv_path = _write(tmp_path / "PadChest" / "padchest.csv", PADCHEST_CSV)
+    image_dir = os.path.dirname(csv_path)
+
+    new, old = load_padchest(csv_path, image_dir=image_dir), legacy_padchest(csv_path, image_dir)
+
+    assert_parity(new, old, "padchest")
+    assert new["concepts"].tolist()[:4] == [["C0032227", "C0018800"], ["C0205307"], [], ["C0205307"]]
+
+
+def test_padchest_chunked_matches_single_pass(tmp_path):
+    csv_path = _write(tmp_path / "PadChest" / "padchest.csv", PADCHEST_CSV)
+    image_dir = os.path.dirname(csv_path)
+
+    whole = load_padchest(csv_path, image_dir=image_dir)
+    chunked = load_padchest(csv_path, image_dir=image_dir, chunksize=3)
+
+    pd.testing.assert_frame_equal(chunked, whole)
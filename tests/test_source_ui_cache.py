@@ -0,0 +1,49 @@
+# tests/test_source_ui_cache.py
+from data.umls.source_ui_cache import SourceUICache
+
+
+def test_resolutions_survive_reopening(tmp_path):
+    path = str(tmp_path / "source_ui.sqlite")
+    cache = SourceUICache(path)
+    cache.put_many({
+        ("D001", "MSH"): ("Abdomen", "C0000726"),
+        ("X9", "SNOMEDCT_US"): ("Unknown thing", "N/A"),
+    })
+    cache.close()
+
+    cache = SourceUICache(path)
+    try:
+        assert len(cache) == 2
+        assert cache.get("D001", "MSH") == ("Abdomen", "C0000726")
+        # Unresolvable IDs are remembered too
+        assert cache.get("X9", "SNOMEDCT_US") == ("Unknown thing", "N/A")
+        assert cache.get("D001", "SNOMEDCT_US") is None
+        assert cache.stats == {"lru_hits": 0, "db_hits": 2, "misses": 1, "stored": 0}
+    finally:
+        cache.close()
+
+
+def test_get_many_serves_the_lru_before_the_database(tmp_path):
+    cache = SourceUICache(str(tmp_path / "source_ui.sqlite"), lru_size=2)
+    items = {(f"D{i}", "MSH"): (f"Name {i}", f"C{i:07d}") for i in range(3)}
+    cache.put_many(items)
+
+    # Only the two most recent puts fit in the LRU; the first comes from SQLite
+    found = cache.get_many(list(items) * 2 + [("D9", "MSH")])
+    cache.close()
+
+    assert found == items
+    assert cache.stats["lru_hits"] == 2
+    assert cache.stats["db_hits"] == 1
+    assert cache.stats["misses"] == 1
+    assert cache.hit_rate() == 3 / 4
+
+
+def test_batches_larger_than_the_parameter_limit():
+    cache = SourceUICache(":memory:", lru_size=0)
+    items = {(f"D{i}", "MSH"): (f"Name {i}", f"C{i:07d}") for i in range(1000)}
+    cache.put_many(items)
+    try:
+        assert cache.get_many(items) == items
+    finally:
+        cache.close()
@@ -0,0 +1,115 @@
+# tests/test_tickets.py
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from data.umls.tickets import TicketManager
+
+AUTH_URL = "https://auth.test/cas/v1/api-key"
+
+
+class FakeAuth:
+    """Stands in for the UTS auth server: TGTs at AUTH_URL, STs at AUTH_URL/<tgt>."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tgts = 0
+        self.tickets = 0
+        self.failing = False  # refuse every service ticket
+        self.revoked = set()  # TGTs answered with 401
+
+    def post(self, url, data=None, timeout=None):
+        with self.lock:
+            if url == AUTH_URL:
+                self.tgts += 1
+                return SimpleNamespace(status_code=201, text="", headers={"location": f"{AUTH_URL}/TGT-{self.tgts}"})
+            tgt = url.rsplit("/", 1)[-1]
+            if tgt in self.revoked:
+                return SimpleNamespace(status_code=401, text="", headers={})
+            if self.failing:
+                return SimpleNamespace(status_code=500, text="", headers={})
+            self.tickets += 1
+            return SimpleNamespace(status_code=200, text=f"ST-{self.tickets}", headers={})
+
+
+def wait_until(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def auth():
+    return FakeAuth()
+
+
+def make_manager(auth, **kwargs) -> TicketManager:
+    return TicketManager(auth, AUTH_URL, "key", "http://service", **kwargs)
+
+
+def test_prefetched_tickets_are_served_from_the_pool(auth):
+    tickets = make_manager(auth, pool_size=4, prefetch_workers=2)
+    try:
+        wait_until(lambda: len(tickets._pool) == 4)
+        served = [tickets.get() for _ in range(8)]
+    finally:
+        tickets.close()
+
+    assert len(set(served)) == 8
+    assert tickets.stats["tickets_used"] == 8
+    assert tickets.stats["pool_misses"] < 8
+    # The pool never holds more than pool_size tickets
+    assert auth.tickets <= 8 + 4
+
+
+def test_without_a_pool_every_ticket_is_issued_inline(auth):
+    tickets = make_manager(auth, pool_size=0)
+    served = [tickets.get() for _ in range(3)]
+    tickets.close()
+
+    assert served == ["ST-1", "ST-2", "ST-3"]
+    assert tickets.stats["pool_misses"] == 3
+    assert tickets._workers == []
+
+
+def test_expired_pooled_tickets_are_skipped(auth):
+    tickets = make_manager(auth, pool_size=2, prefetch_workers=1, st_lifetime=0)
+    try:
+        wait_until(lambda: len(tickets._pool) == 2)
+        tickets.get()
+    finally:
+        tickets.close()
+
+    assert tickets.stats["tickets_expired"] >= 2
+    assert tickets.stats["pool_misses"] == 1
+
+
+def test_rejected_tgt_is_renewed(auth):
+    tickets = make_manager(auth, pool_size=0)
+    auth.revoked.add(tickets.tgt)
+
+    assert tickets.get() == "ST-1"
+    assert tickets.tgt == "TGT-2"
+    assert tickets.stats["tgt_renewals"] == 1
+
+
+def test_prefetching_restarts_after_an_outage(auth):
+    auth.failing = True
+    tickets = make_manager(auth, pool_size=2, prefetch_workers=2, max_prefetch_failures=1)
+    try:
+        wait_until(lambda: tickets._prefetch_error is not None)
+        # While auth is down, get() issues inline and surfaces the failure
+        with pytest.raises(RuntimeError):
+            tickets.get()
+
+        auth.failing = False
+        assert tickets.get().startswith("ST-")
+        assert tickets.stats["prefetch_restarts"] == 1
+        wait_until(lambda: len(tickets._pool) == 2)
+    finally:
+        tickets.close()
+
+    assert "prefetch restarts=1" in tickets.summary()
@@ -0,0 +1,277 @@
+# utils/pipeline.py
+"""
+A small DAG runner for main.py. Stages declare the files/directories they
+read and write; a stage runs after every stage that writes one of its
+inputs (or that it names in `after`). Independent stages run in a process
+pool.
+
+A stage is skipped when its key (function and its source, version,
+params and input content hashes) matches the last successful run and its outputs are still as that
+run left them. State is saved after every stage, so an interrupted run
+resumes from the last completed stage. Content hashes are memoized by
+size/mtime, so unchanged files are not re-read on every run.
+"""
+import concurrent.futures as cf
+import hashlib
+import inspect
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+from data.columnar import file_stamp
+from utils import profiling
+
+PIPELINE_STATE = os.path.join("cache", "pipeline_state.json")
+PIPELINE_STATE_VERSION = 1
+
+
+@dataclass
+class Stage:
+    """
+    One pipeline step, called as `fn(**params)`. Stages in a process pool
+    need a picklable, module-level `fn`; `in_process` stages run in the
+    parent instead. `cache=False` stages run every time.
+
+    Editing `fn` itself reruns the stage. Changes it can't see (helpers, the
+    on-disk format of its outputs) need `version`: tie it to the format
+    constants its outputs are read back with, so a bump reruns the stage.
+    """
+
+    name: str
+    fn: Callable
+    inputs: Sequence[str] = ()
+    outputs: Sequence[str] = ()
+    after: Sequence[str] = ()
+    params: Dict = field(default_factory=dict)
+    cache: bool = True
+    in_process: bool = False
+    version: object = None
+
+
+def _source_digest(fn: Callable) -> Optional[str]:
+    try:
+        return hashlib.sha1(inspect.getsource(fn).encode("utf-8")).hexdigest()
+    except (OSError, TypeError):
+        return None
+
+
+def _timed_call(fn: Callable, params: dict) -> float:
+    start = time.perf_counter()
+    fn(**params)
+    return time.perf_counter() - start
+
+
+class Pipeline:
+    def __init__(self, stages: Iterable[Stage], state_path: str = PIPELINE_STATE, workers: int = os.cpu_count() or 1):
+        self.stages: Dict[str, Stage] = {}
+        for s in stages:
+            if s.name in self.stages:
+                raise ValueError(f"Duplicate stage name: {s.name}")
+            self.stages[s.name] = s
+        self.state_path = state_path
+        self.workers = workers
+        self.deps = self._dependencies()
+        self.order = self._topological_order()
+        self._state = self._load_state()
+        self._keys: Dict[str, str] = {}
+
+    # === Graph
+    def _dependencies(self) -> Dict[str, set]:
+        writers = {}
+        for s in self.stages.values():
+            for path in map(os.path.normpath, s.outputs):
+                if path in writers:
+                    raise ValueError(f"{path} is written by both {writers[path]} and {s.name}")
+                writers[path] = s.name
+        deps = {}
+        for s in self.stages.values():
+            unknown = [name for name in s.after if name not in self.stages]
+            if unknown:
+                raise ValueError(f"Stage {s.name} runs after unknown stages: {unknown}")
+            produced = {writers[os.path.normpath(p)] for p in s.inputs if os.path.normpath(p) in writers}
+            deps[s.name] = (produced | set(s.after)) - {s.name}
+        return deps
+
+    def _topological_order(self) -> List[str]:
+        order, visiting, done = [], set(), set()
+
+        def visit(name):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Stage dependency cycle through {name}")
+            visiting.add(name)
+            for dep in sorted(self.deps[name]):
+                visit(dep)
+            visiting.discard(name)
+            done.add(name)
+            order.append(name)
+
+        for name in self.stages:
+            visit(name)
+        return order
+
+    # === State and hashing
+    def _load_state(self) -> dict:
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = None
+        if not state or state.get("version") != PIPELINE_STATE_VERSION:
+            state = {"version": PIPELINE_STATE_VERSION, "stages": {}, "stamps": {}}
+        return state
+
+    def _save_state(self):
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._state, f, indent=1)
+        os.replace(tmp_path, self.state_path)
+
+    def _file_digest(self, path: str) -> str:
+        stat = os.stat(path)
+        stamp = self._state["stamps"].get(path)
+        if stamp and stamp["size"] == stat.st_size and stamp["mtime_ns"] == stat.st_mtime_ns:
+            return stamp["sha1"]
+        stamp = file_stamp(path)
+        self._state["stamps"][path] = stamp
+        return stamp["sha1"]
+
+    def digest(self, path: str) -> Optional[str]:
+        """Content hash of a file, or of every file under a directory; None if missing."""
+        path = os.path.normpath(path)
+        if os.path.isfile(path):
+            return self._file_digest(path)
+        if not os.path.isdir(path):
+            return None
+        h = hashlib.sha1()
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                full = os.path.join(root, name)
+                h.update(os.path.relpath(full, path).encode("utf-8"))
+                h.update(self._file_digest(full).encode("ascii"))
+        return h.hexdigest()
+
+    def _key(self, s: Stage) -> str:
+        fn = f"{getattr(s.fn, '__module__', '')}.{getattr(s.fn, '__qualname__', repr(s.fn))}"
+        payload = {
+            "fn": fn,
+            "source": _source_digest(s.fn),
+            "version": s.version,
+            "params": s.params,
+            "inputs": {p: self.digest(p) for p in s.inputs},
+            # A stage that now declares other outputs has to run to produce them
+            "outputs": sorted(os.path.normpath(p) for p in s.outputs),
+        }
+        return hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def _is_current(self, s: Stage, key: str) -> bool:
+        record = self._state["stages"].get(s.name)
+        if not s.cache or record is None or record["key"] != key:
+            return False
+        return all(self.digest(p) == h for p, h in record["outputs"].items())
+
+    # === Execution
+    def run(self, force: Optional[Iterable[str]] = None, force_all: bool = False) -> Dict[str, str]:
+        """
+        Run stages that are out of date; returns {stage: "ran" | "skipped" |
+        "failed" | "blocked"}. Raises RuntimeError after running everything
+        it can if any stage failed.
+        """
+        force = set(force or ())
+        unknown = force - set(self.stages)
+        if unknown:
+            raise ValueError(f"Unknown stages: {sorted(unknown)}")
+
+        status: Dict[str, str] = {}
+        pending = list(self.order)
+        running: Dict[cf.Future, str] = {}
+        start = time.perf_counter()
+        pool = cf.ProcessPoolExecutor(max_workers=self.workers) if self.workers > 1 else None
+        try:
+            while pending or running:
+                progressed = True
+                while progressed:
+                    progressed = False
+                    # Hand ready stages to the pool before blocking on in-process ones
+                    for name in sorted(pending, key=lambda n: self.stages[n].in_process):
+                        dep_status = [status.get(d) for d in self.deps[name]]
+                        if any(st in ("failed", "blocked") for st in dep_status):
+                            print(f"[!] {name}: not run, an upstream stage failed")
+                            status[name] = "blocked"
+                        elif all(st in ("ran", "skipped") for st in dep_status):
+                            self._start(name, force_all or name in force, pool, running, status)
+                        else:
+                            continue
+                        pending.remove(name)
+                        progressed = True
+                if running:
+                    finished, _ = cf.wait(running, return_when=cf.FIRST_COMPLETED)
+                    for future in finished:
+                        name = running.pop(future)
+                        try:
+                            self._finish(name, future.result(), status)
+                        except Exception as e:
+                            self._fail(name, e, status)
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=True, cancel_futures=True)
+            self._save_state()
+
+        counts = {st: sum(1 for v in status.values() if v == st) for st in ("ran", "skipped", "failed", "blocked")}
+        print(
+            f"[i] Pipeline: {counts['ran']} ran, {counts['skipped']} unchanged"
+            + (f", {counts['failed']} failed, {counts['blocked']} blocked" if counts["failed"] else "")
+            + f" in {time.perf_counter() - start:.1f}s"
+        )
+        failed = [name for name, st in status.items() if st == "failed"]
+        if failed:
+            raise RuntimeError(f"Pipeline stages failed: {', '.join(failed)}")
+        return status
+
+    def _start(self, name: str, forced: bool, pool, running: Dict[cf.Future, str], status: Dict[str, str]):
+        s = self.stages[name]
+        key = self._key(s)
+        if not forced and self._is_current(s, key):
+            print(f"[✓] {name}: unchanged, skipped")
+            status[name] = "skipped"
+            return
+        # Forget the previous run until this one completes
+        self._state["stages"].pop(name, None)
+        self._keys[name] = key
+        print(f"[→] {name}")
+        if pool is None or s.in_process:
+            try:
+                with profiling.stage(name):
+                    elapsed = _timed_call(s.fn, s.params)
+                self._finish(name, elapsed, status)
+            except Exception as e:
+                self._fail(name, e, status)
+        else:
+            running[pool.submit(_timed_call, s.fn, s.params)] = name
+
+    def _finish(self, name: str, elapsed: float, status: Dict[str, str]):
+        s = self.stages[name]
+        outputs = {os.path.normpath(p): self.digest(p) for p in s.outputs}
+        missing = [p for p, h in outputs.items() if h is None]
+        if missing:
+            raise RuntimeError(f"{name} did not write {', '.join(missing)}")
+        if s.cache:
+            self._state["stages"][name] = {
+                "key": self._keys.pop(name),
+                "outputs": outputs,
+                "finished": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "seconds": elapsed,
+            }
+            self._save_state()
+        profiling.add_counters("pipeline_stage_seconds", {name: elapsed})
+        print(f"[✓] {name}: done in {elapsed:.1f}s")
+        status[name] = "ran"
+
+    def _fail(self, name: str, error: Exception, status: Dict[str, str]):
+        print(f"[!] {name} failed: {type(error).__name__}: {error}")
+        status[name] = "failed"
@@ -0,0 +1,329 @@
+# utils/profiling.py
+"""
+Run instrumentation for main.py: wall time and peak RSS per stage, UMLS HTTP
+calls per endpoint (count, status codes, bytes, latency histogram), named
+counters, and an optional cProfile dump, written as one JSON run report.
+
+Nothing is recorded unless a RunProfiler is active, so stage() and the
+HTTP hook cost next to nothing in normal runs:
+
+    with RunProfiler("profiles/run.json"):
+        with stage("padchest"):
+            ...
+"""
+import cProfile
+import json
+import os
+import platform
+import re
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+import numpy as np
+
+# Memory readings come from /proc where it exists, else `resource` (Unix) or
+# psutil (if installed, e.g. on Windows); without any of them they are None
+try:
+    import resource
+except ImportError:
+    resource = None
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Path segments that carry identifiers (CUIs, source UIs, tickets) are folded
+# so calls group by endpoint, e.g. "GET /rest/content/current/CUI/{id}/atoms"
+_ID_SEGMENT = re.compile(r"(?!v\d+$).*\d")
+
+_active: Optional["RunProfiler"] = None
+
+
+def active() -> Optional["RunProfiler"]:
+    return _active
+
+
+def _rss_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        pass
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    return None
+
+
+def _peak_rss_bytes() -> Optional[int]:
+    """High-water RSS since the last reset_peak_rss() (or process start); None if unavailable."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource is not None:
+        # ru_maxrss is KiB on Linux, bytes on macOS, and can't be reset
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    if psutil is not None:
+        # Peak working set on Windows; elsewhere psutil only has the current RSS
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss)
+    return None
+
+
+def _mb(nbytes: Optional[int]) -> Optional[float]:
+    return nbytes / 2**20 if nbytes is not None else None
+
+
+def reset_peak_rss() -> bool:
+    """Reset the kernel's RSS high-water mark (Linux); False where that isn't possible."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def endpoint(method: str, url: str) -> str:
+    path = urlparse(url).path
+    segments = ["{id}" if _ID_SEGMENT.match(s) else s for s in path.split("/")]
+    return f"{method} {'/'.join(segments)}"
+
+
+class _Stage:
+    def __init__(self, name: str, parent: Optional["_Stage"]):
+        self.name = name
+        self.path = f"{parent.path}/{name}" if parent is not None else name
+        self.parent = parent
+        self.start = time.perf_counter()
+        self.cpu_start = time.process_time()
+        self.rss_start = _rss_bytes()
+        self.peak = None
+
+
+class _EndpointStats:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.bytes = 0
+        self.statuses: Dict[int, int] = defaultdict(int)
+
+    def summary(self) -> dict:
+        ms = np.asarray(self.latencies) * 1000.0
+        counts = np.bincount(np.searchsorted(LATENCY_BUCKETS_MS, ms), minlength=len(LATENCY_BUCKETS_MS) + 1)
+        labels = [f"<={b}ms" for b in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"]
+        p50, p95, p99 = np.percentile(ms, [50, 95, 99]) if len(ms) else (0.0, 0.0, 0.0)
+        return {
+            "count": len(ms),
+            "bytes": self.bytes,
+            "total_s": float(ms.sum() / 1000.0),
+            "mean_ms": float(ms.mean()) if len(ms) else 0.0,
+            "p50_ms": float(p50),
+            "p95_ms": float(p95),
+            "p99_ms": float(p99),
+            "max_ms": float(ms.max()) if len(ms) else 0.0,
+            "statuses": {str(k): v for k, v in sorted(self.statuses.items())},
+            "histogram": {label: int(c) for label, c in zip(labels, counts)},
+        }
+
+
+class RunProfiler:
+    """
+    Collects the run report while active (as a context manager). Stages
+    nest; each records wall and CPU time, RSS at entry/exit and peak RSS
+    within the stage (None where the platform offers no memory reading).
+    With `cprofile_path`, the whole run is also profiled with cProfile and
+    the stats dumped there (open with pstats or snakeviz).
+    """
+
+    def __init__(self, report_path: Optional[str] = None, cprofile_path: Optional[str] = None, meta: dict = None):
+        self.report_path = report_path
+        self.cprofile_path = cprofile_path
+        self.meta = dict(meta or {})
+        self.stages: List[dict] = []
+        self.http: Dict[str, _EndpointStats] = defaultdict(_EndpointStats)
+        self.counters: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._resettable = False
+        self._profile = None
+        self._ended = None
+
+    # === Lifecycle
+    def __enter__(self):
+        global _active
+        if _active is not None:
+            raise RuntimeError("Another RunProfiler is already active")
+        _active = self
+        self._resettable = reset_peak_rss()
+        self._started = time.time()
+        self._root = _Stage("run", None)
+        if self.cprofile_path:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        return self
+
+    def __exit__(self, *exc):
+        global _active
+        if self._profile is not None:
+            self._profile.disable()
+            os.makedirs(os.path.dirname(self.cprofile_path) or ".", exist_ok=True)
+            self._profile.dump_stats(self.cprofile_path)
+        self._fold_peak(None)
+        self._ended = (time.perf_counter(), time.process_time())
+        _active = None
+        if self.report_path:
+            self.write(self.report_path)
+            print(f"[✓] Run report written to {self.report_path}")
+            if self.cprofile_path:
+                print(f"[✓] cProfile stats written to {self.cprofile_path}")
+
+    # === Stages
+    def _stack(self) -> List[_Stage]:
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def _fold_peak(self, into: Optional[_Stage]):
+        """Credit the high-water mark so far to `into` and every stage around it."""
+        peak = _peak_rss_bytes()
+        if peak is None:
+            return
+        while into is not None:
+            into.peak = max(into.peak or 0, peak)
+            into = into.parent
+        self._root.peak = max(self._root.peak or 0, peak)
+
+    @contextmanager
+    def stage(self, name: str):
+        stack = self._stack()
+        parent = stack[-1] if stack else None
+        if self._resettable:
+            # Resetting the kernel's high-water mark would lose the enclosing
+            # stages' peak, so fold it into them first
+            self._fold_peak(parent)
+            reset_peak_rss()
+        current = _Stage(name, parent)
+        stack.append(current)
+        try:
+            yield current
+        finally:
+            stack.pop()
+            self._fold_peak(current)
+            record = {
+                "stage": current.path,
+                "wall_s": time.perf_counter() - current.start,
+                "cpu_s": time.process_time() - current.cpu_start,
+                "rss_start_mb": _mb(current.rss_start),
+                "rss_end_mb": _mb(_rss_bytes()),
+                "peak_rss_mb": _mb(current.peak),
+            }
+            with self._lock:
+                self.stages.append(record)
+
+    # === HTTP and counters
+    def record_http(self, method: str, url: str, status: int, seconds: float, nbytes: int):
+        key = endpoint(method, url)
+        with self._lock:
+            stats = self.http[key]
+            stats.latencies.append(seconds)
+            stats.bytes += nbytes
+            stats.statuses[status] += 1
+
+    def add_counters(self, group: str, values: Dict[str, float]):
+        with self._lock:
+            totals = self.counters.setdefault(group, {})
+            for key, value in values.items():
+                totals[key] = totals.get(key, 0) + value
+
+    # === Report
+    def report(self) -> dict:
+        with self._lock:
+            http = {key: stats.summary() for key, stats in sorted(self.http.items())}
+            stages = list(self.stages)
+            counters = {group: dict(values) for group, values in self.counters.items()}
+        wall_end, cpu_end = self._ended or (time.perf_counter(), time.process_time())
+        return {
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self._started)),
+            "wall_s": wall_end - self._root.start,
+            "cpu_s": cpu_end - self._root.cpu_start,
+            "peak_rss_mb": _mb(self._root.peak),
+            "per_stage_peak_rss": self._resettable,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "meta": self.meta,
+            "stages": stages,
+            "http": http,
+            "http_total": {
+                "count": sum(s["count"] for s in http.values()),
+                "bytes": sum(s["bytes"] for s in http.values()),
+                "total_s": sum(s["total_s"] for s in http.values()),
+            },
+            "counters": counters,
+            "cprofile": self.cprofile_path,
+        }
+
+    def write(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+        os.replace(tmp_path, path)
+
+
+@contextmanager
+def stage(name: str):
+    """Time a pipeline stage under the active RunProfiler; a no-op otherwise."""
+    profiler = _active
+    if profiler is None:
+        yield None
+        return
+    with profiler.stage(name) as current:
+        yield current
+
+
+def timed(name: Optional[str] = None):
+    """Decorator form of stage(); defaults to the function's qualified name."""
+    def decorate(fn):
+        label = name or fn.__qualname__
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def http_hook(response, *args, **kwargs):
+    """requests response hook recording the call with the active RunProfiler."""
+    profiler = _active
+    if profiler is None:
+        return
+    start = time.perf_counter()
+    if kwargs.get("stream"):
+        nbytes = int(response.headers.get("Content-Length", 0))
+    else:
+        # Reads the body now rather than right after the hook; requests would read it anyway
+        nbytes = len(response.content)
+    # elapsed runs to the response headers (urllib3 retries and backoff included); add the body read
+    seconds = response.elapsed.total_seconds() + time.perf_counter() - start
+    profiler.record_http(response.request.method, response.url, response.status_code, seconds, nbytes)
+
+
+def add_counters(group: str, values: Dict[str, float]):
+    profiler = _active
+    if profiler is not None:
+        profiler.add_counters(group, values)